@@ -1,13 +1,51 @@
 #!/usr/bin/env python3
 
-from fastapi import APIRouter, Depends, File, UploadFile
+import json
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
+from app.services.jobs import ProcessJob, process_jobs
 from app.services.session_service import SessionService
+from app.services.vocabulary import VocabularyService, export_words
+from app.services.word_stats import WordStatsService
 from app.models import database, schemas
 
 router = APIRouter()
 
+MAX_WORDS_PAGE_SIZE = 5000
+MAX_EXAMPLES = 100
+MAX_TOP_WORDS = 1000
+JOB_EVENTS_HEARTBEAT = 15
+# word list rows encoded per chunk of the streamed response
+WORDS_STREAM_CHUNK = 500
+
+
+def _get_job(job_id: str) -> ProcessJob:
+    job = process_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+
+def _stream_word_list(page: dict):
+    """Encode a word list page as a WordListResponse, a chunk of rows at a time."""
+    yield '{"words":['
+
+    words = page["words"]
+    for start in range(0, len(words), WORDS_STREAM_CHUNK):
+        items = (
+            json.dumps({"word": word, "frequency": frequency, "is_removed": bool(is_removed)}, ensure_ascii=False)
+            for word, frequency, is_removed in words[start : start + WORDS_STREAM_CHUNK]
+        )
+        yield ("," if start else "") + ",".join(items)
+
+    yield f'],"total":{page["total"]},"next_cursor":{json.dumps(page["next_cursor"])}}}'
+
 
 @router.post("/upload", response_model=schemas.SessionResponse)
 async def upload_subtitle(file: UploadFile = File(...), db: AsyncSession = Depends(database.get_db)):
@@ -24,35 +62,112 @@ async def upload_subtitle(file: UploadFile = File(...), db: AsyncSession = Depen
     )
 
 
-@router.post("/session/{session_id}/process", response_model=schemas.ProcessResponse)
+@router.post("/upload/batch", response_model=schemas.SessionResponse)
+async def upload_subtitle_batch(files: list[UploadFile] = File(...), db: AsyncSession = Depends(database.get_db)):
+    service = SessionService(db)
+
+    result = await service.upload_batch(files)
+
+    return schemas.SessionResponse(**result)
+
+
+@router.get("/session/{session_id}/files", response_model=schemas.SessionFileListResponse)
+async def get_session_files(session_id: str, db: AsyncSession = Depends(database.get_db)):
+    service = SessionService(db)
+
+    files = await service.get_files(session_id)
+
+    return schemas.SessionFileListResponse(files=[schemas.SessionFileItem.model_validate(file) for file in files])
+
+
+@router.post("/session/{session_id}/process", response_model=schemas.ProcessResponse, status_code=202)
 async def process_session(
     session_id: str, request: schemas.ProcessRequest, db: AsyncSession = Depends(database.get_db)
 ):
     service = SessionService(db)
 
-    await service.process_file(session_id, request.style)
+    styles = request.styles or ([request.style] if request.style else None)
+    job = await service.start_processing(session_id, styles)
+
+    return schemas.ProcessResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.ProcessResponse)
+async def get_job(job_id: str):
+    job = _get_job(job_id)
+
+    return schemas.ProcessResponse(**job.to_dict())
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Server-Sent Events with the job state, sent on every change until the job is done."""
+    job = _get_job(job_id)
+
+    async def events():
+        while True:
+            # the job can finish while an event is sent: stop after sending the final state, not on seeing it
+            state = job.to_dict()
+            yield f"data: {json.dumps(state)}\n\n"
+            if state["status"] in ("done", "failed"):
+                return
+
+            # also sends the unchanged state now and then, which keeps proxies from closing the connection;
+            # a job that finished meanwhile won't change again
+            if not job.done:
+                await job.wait_changed(JOB_EVENTS_HEARTBEAT)
+            if await request.is_disconnected():
+                return
 
-    return schemas.ProcessResponse()
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @router.get("/session/{session_id}/words", response_model=schemas.WordListResponse)
-async def get_session_words(session_id: str, db: AsyncSession = Depends(database.get_db)):
+async def get_session_words(
+    session_id: str,
+    request: Request,
+    order: Literal["frequency", "alphabetical"] = "frequency",
+    removed: Optional[bool] = None,
+    prefix: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_WORDS_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_db),
+):
     service = SessionService(db)
 
-    word_items = await service.get_words(session_id)
+    session = await service.get_session(session_id)
+    etag = service.get_words_etag(session, order, removed, prefix, limit, cursor)
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    page = await service.get_words(session_id, order, removed, prefix, limit, cursor)
+
+    return StreamingResponse(_stream_word_list(page), media_type="application/json", headers={"ETag": etag})
+
+
+@router.get("/session/{session_id}/words/{word}/examples", response_model=schemas.WordExamplesResponse)
+async def get_word_examples(
+    session_id: str,
+    word: str,
+    limit: int = Query(5, ge=1, le=MAX_EXAMPLES),
+    db: AsyncSession = Depends(database.get_db),
+):
+    service = SessionService(db)
 
-    return schemas.WordListResponse(words=word_items, total=len(word_items))
+    result = await service.get_examples(session_id, word, limit)
 
+    return schemas.WordExamplesResponse(**result)
 
-@router.patch("/session/{session_id}/words")
+
+@router.patch("/session/{session_id}/words", response_model=schemas.WordUpdateResponse)
 async def update_session_words(
     session_id: str, request: schemas.WordUpdateRequest, db: AsyncSession = Depends(database.get_db)
 ):
     service = SessionService(db)
 
-    await service.update_words(session_id, request.removed_words)
+    result = await service.update_words(session_id, request.removed_words, request.restored_words, request.version)
 
-    return {"success": True, "updated": len(request.removed_words)}
+    return schemas.WordUpdateResponse(updated=result["updated"], version=result["version"])
 
 
 @router.post("/session/{session_id}/finalize", response_model=schemas.FinalizeResponse)
@@ -61,8 +176,54 @@ async def finalize_session(session_id: str, db: AsyncSession = Depends(database.
 
     result = await service.finalize(session_id)
 
-    top_words = result["top_words"]
-    learned_words = result["learned_words"]
-    rows = result["rows"]
+    return schemas.FinalizeResponse(
+        top_words=result["top_words"], learned_count=result["learned_count"], total_count=result["total_count"]
+    )
+
+
+@router.post("/vocabulary/import", response_model=schemas.VocabularyImportResponse)
+async def import_vocabulary(
+    request: Request,
+    language: str = "en",
+    format: Literal["text", "csv"] = "text",
+    db: AsyncSession = Depends(database.get_db),
+):
+    """Mark the words of a word list sent as the request body as learned; see VocabularyService.import_words."""
+    service = VocabularyService(db)
+
+    result = await service.import_words(settings.DEFAULT_USER, language, request.stream(), format)
+
+    return schemas.VocabularyImportResponse(**result)
+
+
+@router.get("/vocabulary/export")
+async def export_vocabulary(format: Literal["text", "csv"] = "text"):
+    media_type = "text/csv" if format == "csv" else "text/plain"
+    filename = f"vocabulary.{'csv' if format == 'csv' else 'txt'}"
+
+    return StreamingResponse(
+        export_words(settings.DEFAULT_USER, format),
+        media_type=f"{media_type}; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/stats/words", response_model=schemas.WordStatsListResponse)
+async def get_top_words(
+    limit: int = Query(50, ge=1, le=MAX_TOP_WORDS), learned: bool = False, db: AsyncSession = Depends(database.get_db)
+):
+    """The words met most often over all sessions; unknown ones by default."""
+    service = WordStatsService(db)
+
+    words = await service.top_words(settings.DEFAULT_USER, limit, learned)
+
+    return schemas.WordStatsListResponse(words=words)
+
+
+@router.get("/stats/words/{word}", response_model=schemas.WordStatsItem)
+async def get_word_stats(word: str, db: AsyncSession = Depends(database.get_db)):
+    service = WordStatsService(db)
+
+    result = await service.get_word(settings.DEFAULT_USER, word)
 
-    return schemas.FinalizeResponse(top_words=top_words, learned_count=len(learned_words), total_count=len(rows))
+    return schemas.WordStatsItem(**result)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""Caches shared by the analysis pipeline."""
+
+import hashlib
+import os
+import pickle
+import struct
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entries and counts hits and misses.
+
+    With a path, the entries can be saved to and loaded from disk so they survive restarts.
+    """
+
+    def __init__(self, maxsize: int, path: Optional[Path] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._dirty = True
+
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self):
+        if self.path is None or not self.path.exists():
+            return
+
+        try:
+            with open(self.path, "rb") as f:
+                items = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # a stale or truncated cache file is just a cold cache
+            return
+
+        # items are stored least recently used first
+        for key, value in items[-self.maxsize :]:
+            self._data[key] = value
+
+    def save(self, min_interval: float = 0):
+        """Write the entries to path if they changed and the last save is min_interval seconds old."""
+        if self.path is None or not self._dirty or time.monotonic() - self._saved_at < min_interval:
+            return
+
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(list(self._data.items()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        # atomic, so workers saving the same cache never leave a half-written file
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+
+class AnalysisCache:
+    """Word counts of analysed subtitles, stored as one compressed file per key.
+
+    File layout (zlib compressed): magic, word count n, n little-endian uint32
+    counts, then the n words UTF-8 encoded and separated by newlines. Once the
+    directory grows beyond max_bytes the least recently used files are removed.
+
+    The size of the directory is kept as a running total, so a write only lists
+    the directory when the total exceeds max_bytes. Files other processes write
+    are counted from the next listing on.
+    """
+
+    MAGIC = b"SSWC"
+    HEADER = struct.Struct("<4sI")
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # bytes in the directory, None until it is first listed
+        self._total = None
+
+    def get(self, *key) -> Optional[dict[str, int]]:
+        data = self.get_bytes(*key)
+        if data is None:
+            return None
+
+        try:
+            return self._decode(data)
+        except (struct.error, UnicodeDecodeError):
+            return None
+
+    def put(self, word_counts: dict[str, int], *key):
+        self.put_bytes(self._encode(word_counts), *key)
+
+    def get_bytes(self, *key) -> Optional[bytes]:
+        """Other data about the same files, e.g. where their words occur, sharing the size limit."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = zlib.decompress(f.read())
+            # mtime doubles as the last access time for eviction
+            os.utime(path)
+        except (OSError, zlib.error):
+            return None
+
+        return data
+
+    def put_bytes(self, data: bytes, *key):
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        data = zlib.compress(data)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp_path, path)
+
+        if self._total is None:
+            self._evict()
+            return
+
+        self._total += len(data) - replaced
+        if self._total > self.max_bytes:
+            self._evict()
+
+    def _path(self, key) -> Path:
+        digest = hashlib.sha256("\0".join(str(part) for part in key).encode("utf-8")).hexdigest()
+        return self.directory / f"{digest}.bin"
+
+    def _encode(self, word_counts: dict[str, int]) -> bytes:
+        n = len(word_counts)
+        return b"".join(
+            [
+                self.HEADER.pack(self.MAGIC, n),
+                struct.pack(f"<{n}I", *word_counts.values()),
+                "\n".join(word_counts).encode("utf-8"),
+            ]
+        )
+
+    def _decode(self, data: bytes) -> Optional[dict[str, int]]:
+        magic, n = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC:
+            return None
+
+        counts = struct.unpack_from(f"<{n}I", data, self.HEADER.size)
+        words = data[self.HEADER.size + 4 * n :].decode("utf-8").split("\n") if n else []
+        return dict(zip(words, counts))
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".bin"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+        self._total = total
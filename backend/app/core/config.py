@@ -2,6 +2,8 @@
 """Configuration management for subscout backend."""
 
 from pathlib import Path
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -16,6 +18,11 @@ class Settings(BaseSettings):
     CACHE_DIR: Path = HOME_DIR / "cache"
 
     DATABASE_URL: str = f"sqlite+aiosqlite:///{HOME_DIR}/subscout.db"
+    # how long a connection waits for another one to release its write lock
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # page cache per connection
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
 
     ALLOWED_ORIGINS: list[str] = [
         "http://localhost:5173",  # Vite dev server
@@ -24,12 +31,72 @@ class Settings(BaseSettings):
     ]
 
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 64 * 1024
     ALLOWED_EXTENSIONS: set[str] = {".srt", ".ass"}
+    # batch uploads: subtitles, or zip archives of them; MAX_UPLOAD_SIZE applies to each subtitle
+    MAX_BATCH_FILES: int = 50
 
     SESSION_EXPIRY_HOURS: int = 24
+    # seconds between sweeps for expired sessions; 0 disables the sweeper
+    SESSION_SWEEP_INTERVAL: int = 3600
+    # sessions deleted per round, and session_words rows per DELETE statement
+    SESSION_SWEEP_BATCH: int = 50
+    SESSION_SWEEP_CHUNK_ROWS: int = 2000
+    # seconds the sweeper waits between two statements, leaving the database to live requests
+    SESSION_SWEEP_PAUSE: float = 0.05
+    # free pages returned to the file system after a sweep; needs a database with auto_vacuum=INCREMENTAL
+    SESSION_SWEEP_VACUUM_PAGES: int = 1000
+
+    # Subtitle analysis runs in a process pool; 0 runs it in a thread of the API process.
+    WORKER_PROCESSES: int = 2
+    # Jobs allowed to wait for a free worker before new ones are rejected.
+    WORKER_QUEUE_SIZE: int = 8
+    # languages whose backends each worker loads at startup; the others load on first use, which
+    # keeps idle workers small and starts them faster, e.g. ["en"] for English-only deployments
+    PRELOAD_LANGUAGES: list[str] = ["en", "jp"]
+    # cues sent to a worker at a time while processing a session
+    PROCESS_BATCH_CUES: int = 500
+    # seconds finished processing jobs stay available to /jobs
+    JOB_RETENTION_SECONDS: int = 3600
+    # seconds between the heartbeats a server process records for the sessions it is processing; a
+    # session whose heartbeat is JOB_STALE_SECONDS old lost its process and is marked as failed
+    JOB_HEARTBEAT_INTERVAL: int = 15
+    JOB_STALE_SECONDS: int = 60
+
+    # English lemmatization: "accurate" tags parts of speech for WordNet, "fast" looks the
+    # tokens up in a lexicon built from WordNet's morphology, without a tagger; see benchmarks.lemmas
+    ENGLISH_ANALYZER: Literal["accurate", "fast"] = "accurate"
+
+    # (token, POS) -> (lemma, is word) memo of the English pipeline
+    LEMMA_CACHE_SIZE: int = 200_000
+    # keep the memo in CACHE_DIR across restarts, in a file per lang.analyzer_key()
+    LEMMA_CACHE_PERSIST: bool = True
+    # seconds between saves while processing; workers also save when they shut down
+    LEMMA_CACHE_SAVE_INTERVAL: int = 60
+
+    # word counts of analysed files, keyed by content hash; least recently used files are evicted first
+    ANALYSIS_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+    # fill in the definitions of new words from the tables `python -m app.core.lexicon` builds in CACHE_DIR:
+    # WordNet glosses for English, and for Japanese a JMdict file (e.g. JMdict_e.gz) when given
+    ENRICH_DEFINITIONS: bool = True
+    JMDICT_PATH: Optional[Path] = None
+
+    # how process_file drops the words a user has learned: "memory" keeps each user's
+    # vocabulary in an in-process index, "sql" filters with an anti-join in the database
+    KNOWN_WORDS_FILTER: Literal["memory", "sql"] = "memory"
 
     DEFAULT_USER: str = "default"
 
+    # vocabulary import: word list lines lemmatized and written per batch
+    VOCABULARY_IMPORT_BATCH: int = 5000
+    # vocabulary export: rows fetched from the database cursor at a time
+    VOCABULARY_EXPORT_BATCH: int = 2000
+
+    LOG_LEVEL: str = "INFO"
+    # longest message, extra field or traceback written to the log, in characters
+    LOG_MAX_FIELD_LENGTH: int = 2000
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Process pool for the CPU-bound parts of subtitle analysis."""
+
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.util
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from app.core.config import settings
+from app.core import lang
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorBusyError(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+_pool = None
+_pending = 0
+# used when WORKER_PROCESSES is 0; a single thread because the language resources are shared
+_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="subtitle-analysis")
+
+
+def _init_worker():
+    lang.warm_up()
+    # pool workers skip atexit handlers but run multiprocessing finalizers when they shut down
+    multiprocessing.util.Finalize(None, lang.save_resources, kwargs={"force": True}, exitpriority=10)
+
+
+def _capacity() -> int:
+    return parallelism() + settings.WORKER_QUEUE_SIZE
+
+
+def _create_pool() -> ProcessPoolExecutor:
+    # spawn instead of fork: the API process runs an event loop and database threads
+    return ProcessPoolExecutor(
+        max_workers=settings.WORKER_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+async def start() -> list[dict]:
+    """Start the workers and wait until each of them has loaded the backends of PRELOAD_LANGUAGES.
+
+    Logs and returns what loading them cost each process, see lang.backend_report().
+    """
+    global _pool
+
+    loop = asyncio.get_running_loop()
+    if settings.WORKER_PROCESSES <= 0:
+        reports = [await loop.run_in_executor(_thread, lang.warm_up)]
+    else:
+        if _pool is None:
+            _pool = _create_pool()
+        # the initializer has warmed each worker up before it runs a call
+        calls = (loop.run_in_executor(_pool, lang.backend_report) for _ in range(settings.WORKER_PROCESSES))
+        reports = list({report["pid"]: report for report in await asyncio.gather(*calls)}.values())
+
+    for report in reports:
+        logger.info("language backends loaded", extra=report)
+    return reports
+
+
+def shutdown():
+    global _pool
+
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+    if settings.WORKER_PROCESSES <= 0:
+        _thread.submit(lang.save_resources, force=True).result()
+
+
+async def run(fn, *args, **kwargs):
+    """Run fn in a worker and await its result without blocking the event loop.
+
+    fn and its arguments must be picklable. Raises ExecutorBusyError instead of
+    queueing once WORKER_QUEUE_SIZE calls are already waiting.
+    """
+    global _pending
+
+    if _pending >= _capacity():
+        raise ExecutorBusyError(f"{_pending} calls are already running or queued")
+
+    _pending += 1
+    try:
+        return await submit(fn, *args, **kwargs)
+    finally:
+        _pending -= 1
+
+
+async def submit(fn, *args, **kwargs):
+    """Like run(), without the queue limit, for callers that bound their own concurrency."""
+    global _pool
+
+    loop = asyncio.get_running_loop()
+    call = partial(fn, *args, **kwargs)
+
+    if settings.WORKER_PROCESSES <= 0:
+        return await loop.run_in_executor(_thread, call)
+
+    if _pool is None:
+        _pool = _create_pool()
+    pool = _pool
+
+    try:
+        return await loop.run_in_executor(pool, call)
+    except BrokenProcessPool:
+        # a worker died (e.g. killed by the OOM killer); replace the pool for the next call
+        if _pool is pool:
+            _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def parallelism() -> int:
+    """Number of calls that can run at the same time."""
+    return max(settings.WORKER_PROCESSES, 1)
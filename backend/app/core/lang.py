@@ -1,115 +1,330 @@
 #!/usr/bin/env python3
 
-import re
-import nltk
-import enchant
-import fugashi
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import wordnet
+import importlib
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterable
+
+from app.core.config import settings
+from app.core.lexicon import ENGLISH_LEXICON_VERSION
+
+# bump whenever a change makes the pipeline return different words for the same file;
+# it is part of the analysis cache key and of the file name of the English lemma memo
+ANALYZER_VERSION = 3
+
+
+def analyzer_key() -> str:
+    """Identifies the words the pipeline returns for a file, for the analysis cache and the lemma memo."""
+    return f"{ANALYZER_VERSION}:{settings.ENGLISH_ANALYZER}:{ENGLISH_LEXICON_VERSION}"
+
 
 LANGUAGE = {
     "en": "en",
     "jp": "jp",
 }
 
+# language -> "module:class" of its backend, a Language subclass; the module is imported on first use,
+# so a process only pays the imports (NLTK, enchant, fugashi...) and memory of the languages it handles
+BACKENDS = {
+    "en": "app.core.languages.english:English",
+    "jp": "app.core.languages.japanese:Japanese",
+}
+
+# scripts told apart by the detector; the script of a character is SCRIPT_TABLE[ord(character)]
+OTHER, LATIN, KANA, HAN, HANGUL, CYRILLIC, GREEK, ARABIC, HEBREW, THAI = map(chr, range(10))
+
+_SCRIPT_RANGES = [
+    (0x0041, 0x005A, LATIN),
+    (0x0061, 0x007A, LATIN),
+    (0x00C0, 0x024F, LATIN),
+    (0x0370, 0x03FF, GREEK),
+    (0x0400, 0x04FF, CYRILLIC),
+    (0x0590, 0x05FF, HEBREW),
+    (0x0600, 0x06FF, ARABIC),
+    (0x0E00, 0x0E7F, THAI),
+    (0x1100, 0x11FF, HANGUL),
+    (0x3040, 0x30FF, KANA),
+    (0x3130, 0x318F, HANGUL),
+    (0x31F0, 0x31FF, KANA),
+    (0x3400, 0x4DBF, HAN),
+    (0x4E00, 0x9FFF, HAN),
+    (0xAC00, 0xD7AF, HANGUL),
+    (0xF900, 0xFAFF, HAN),
+    (0xFF66, 0xFF9F, KANA),
+]
+
+
+def _build_script_table() -> str:
+    table = [OTHER] * 0x10000
+    for first, last, script in _SCRIPT_RANGES:
+        table[first : last + 1] = [script] * (last - first + 1)
+    # the prolonged sound mark and the iteration marks are written with kana
+    table[0x30FC] = table[0x309D] = table[0x309E] = table[0x30FD] = table[0x30FE] = KANA
+    return "".join(table)
+
+
+# for str.translate(): characters beyond the Basic Multilingual Plane are left as they are
+SCRIPT_TABLE = _build_script_table()
+
+# the language of a text written mostly in a script other than Latin; kana and han are decided together
+_SCRIPT_LANGUAGES = {
+    HANGUL: "ko",
+    CYRILLIC: "ru",
+    GREEK: "el",
+    ARABIC: "ar",
+    HEBREW: "he",
+    THAI: "th",
+}
+
+# share of the letters a script other than Latin needs, so that Latin headers and style names don't count
+SCRIPT_SHARE = 0.1
+# chance of the sample deciding differently than the whole text would
+DETECTION_ERROR = 0.001
+DETECTION_BLOCK_CHARS = 512
+
+
+def _script_decided(count: int, letters: int) -> bool:
+    # Hoeffding bound: the share of the whole text is within margin of the sample's share
+    margin = math.sqrt(math.log(2 / DETECTION_ERROR) / (2 * letters))
+    return abs(count / letters - SCRIPT_SHARE) > margin
 
-def is_japanese(content):
-    all_count = len(content)
-    if all_count == 0:
-        return False
 
-    match_count = re.findall(r"[\u2E80-\u9FFF]", content)
-    return len(match_count) / all_count > 0.1
+def check_language(content: str) -> str:
+    """Return the language of content from the scripts of its letters.
 
+    Blocks of content are visited in a fixed pseudo-random order, so a long
+    header doesn't decide alone, and counting stops as soon as the leading
+    script is clearly above or below SCRIPT_SHARE. Text that is mostly Latin is
+    English; other scripts map to languages that may not be supported.
+    """
+    blocks = list(range(0, len(content), DETECTION_BLOCK_CHARS))
+    random.Random(len(content)).shuffle(blocks)
 
-def check_language(content):
-    if is_japanese(content):
-        return LANGUAGE["jp"]
-    else:
+    counts = Counter()
+    letters = 0
+    for start in blocks:
+        classes = content[start : start + DETECTION_BLOCK_CHARS].translate(SCRIPT_TABLE)
+        for script in (LATIN, KANA, HAN, *_SCRIPT_LANGUAGES):
+            counts[script] += classes.count(script)
+        letters = sum(counts.values())
+
+        if letters >= 64:
+            leading = max(counts[KANA] + counts[HAN], *(counts[script] for script in _SCRIPT_LANGUAGES))
+            if _script_decided(leading, letters):
+                break
+
+    if letters == 0:
         return LANGUAGE["en"]
 
+    cjk = counts[KANA] + counts[HAN]
+    script, count = max(((script, counts[script]) for script in _SCRIPT_LANGUAGES), key=lambda item: item[1])
+    if max(cjk, count) / letters <= SCRIPT_SHARE:
+        return LANGUAGE["en"]
+    if count > cjk:
+        return _SCRIPT_LANGUAGES[script]
+    # Chinese is written without kana
+    return LANGUAGE["jp"] if counts[KANA] > cjk * 0.05 else "zh"
 
-def init_language(content, subtitle_path):
-    language = check_language(content)
 
-    if language == "en":
-        return English(content, subtitle_path)
-    elif language == "jp":
-        return Japanese(content, subtitle_path)
-    else:
-        raise Exception(f"invalid language {language}")
+# language -> backend class and resources built by it, shared by every instance in this process
+_classes = {}
+_resources = {}
+# language -> what loading its backend cost this process, see backend_report()
+_loads = {}
 
 
-class Language:
-    def __init__(self, content, subtitle_path):
-        self.content = content
-        self.subtitle_path = subtitle_path
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # peak instead of current, in bytes on macOS and kilobytes elsewhere
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def get_resources(language) -> dict:
+    resources = _resources.get(language)
+    if resources is None:
+        language_class = get_language_class(language)
+        rss = _rss_bytes()
+        start = time.perf_counter()
+        resources = _resources[language] = language_class.load_resources()
+        _loads[language]["load_seconds"] = time.perf_counter() - start
+        _loads[language]["rss_bytes"] += _rss_bytes() - rss
+    return resources
+
 
-    def split_into_words(self) -> set:
-        infos = {}
-        for token in self.get_tokens():
-            if token not in infos:
-                infos[token] = 0
+def warm_up(languages=None) -> dict:
+    """Load the backends of languages, PRELOAD_LANGUAGES by default, so that requests only pay for tokenization.
 
-            infos[token] += 1
+    Returns backend_report().
+    """
+    for language in settings.PRELOAD_LANGUAGES if languages is None else languages:
+        get_resources(language)
+    return backend_report()
 
-        return [word for word, _ in sorted(infos.items(), key=lambda items: -items[1])]
 
+def backend_report() -> dict:
+    """What the backends loaded by this process cost it: import and resource loading time, and memory."""
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": _rss_bytes(),
+        "backends": {
+            language: {key: round(value, 3) if isinstance(value, float) else value for key, value in load.items()}
+            for language, load in _loads.items()
+        },
+    }
 
-class English(Language):
-    def __init__(self, content, subtitle_path):
-        super().__init__(content, subtitle_path)
 
-        self.name = LANGUAGE["en"]
-        self.re_word = re.compile(r"[a-zA-Z]")
-        self.enchant_dict = enchant.Dict("en_US")
-        self.lemmatizer = WordNetLemmatizer()
+def save_resources(force: bool = False):
+    """Persist what the languages of this process have learned, e.g. memo caches.
+
+    Unless forced, resources saved less than LEMMA_CACHE_SAVE_INTERVAL seconds ago are skipped.
+    """
+    min_interval = 0 if force else settings.LEMMA_CACHE_SAVE_INTERVAL
+    for language, resources in _resources.items():
+        get_language_class(language).save_resources(resources, min_interval)
+
+
+def cache_stats() -> dict:
+    return {
+        language: get_language_class(language).cache_stats(resources) for language, resources in _resources.items()
+    }
+
+
+def init_language(language):
+    return get_language_class(language)(get_resources(language))
+
+
+def count_words(language, texts_by_group: dict) -> tuple[dict, dict]:
+    """Count the words of one batch of texts, per group; the unit of work sent to the worker pool.
+
+    Groups are e.g. the ASS styles of the cues. Returns group -> word counts and
+    a report for the metrics of the API process: seconds per stage, including
+    loading the backend if this batch was the first of its language, and the
+    hits and misses of each cache during the batch.
+    """
+    return _analyze(
+        language, lambda analyzer: {group: analyzer.count_words(texts) for group, texts in texts_by_group.items()}
+    )
+
+
+def index_words(language, texts: list[str], groups: list) -> tuple[tuple[dict, dict], dict]:
+    """Like count_words() for texts labelled with their group, also returning where each word occurs.
+
+    Returns (group -> word counts, word -> indexes of the texts it occurs in) and the report.
+    """
+    return _analyze(language, lambda analyzer: analyzer.index_words(texts, groups))
+
+
+def _analyze(language, work) -> tuple:
+    stages = {}
+    if language not in _resources:
+        start = time.perf_counter()
+        get_resources(language)
+        stages["backend_load"] = time.perf_counter() - start
+
+    before = _cache_lookups(language)
+    analyzer = init_language(language)
+    result = work(analyzer)
+    save_resources()
+
+    caches = {
+        name: {"hits": hits - before.get(name, (0, 0))[0], "misses": misses - before.get(name, (0, 0))[1]}
+        for name, (hits, misses) in _cache_lookups(language).items()
+    }
+    return result, {"stages": {**stages, **analyzer.timings}, "caches": caches}
+
+
+def _cache_lookups(language) -> dict:
+    stats = get_language_class(language).cache_stats(get_resources(language))
+    return {name: (cache["hits"], cache["misses"]) for name, cache in stats.items()}
+
+
+def get_language_class(language):
+    """The backend class of language, imported on first use."""
+    language_class = _classes.get(language)
+    if language_class is not None:
+        return language_class
+
+    if language not in BACKENDS:
+        raise Exception(f"invalid language {language}")
+
+    module_name, _, class_name = BACKENDS[language].partition(":")
+    rss = _rss_bytes()
+    start = time.perf_counter()
+    language_class = _classes[language] = getattr(importlib.import_module(module_name), class_name)
+    _loads[language] = {"import_seconds": time.perf_counter() - start, "rss_bytes": _rss_bytes() - rss}
+    return language_class
+
+
+class Language:
+    # texts tokenized and tagged together
+    BATCH_SIZE = 256
 
-    def is_word(self, token):
-        return len(token) > 1 and self.enchant_dict.check(token) and self.re_word.match(token)
+    def __init__(self, resources):
+        self.resources = resources
+        # stage -> seconds spent by this instance
+        self.timings = Counter()
 
-    def _get_wordnet_pos(self, tag):
-        """Map POS tag to first character lemmatize() accepts"""
-        if tag.startswith("J"):
-            return wordnet.ADJ
-        elif tag.startswith("V"):
-            return wordnet.VERB
-        elif tag.startswith("N"):
-            return wordnet.NOUN
-        elif tag.startswith("R"):
-            return wordnet.ADV
-        else:
-            return wordnet.NOUN
+    @contextmanager
+    def timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += time.perf_counter() - start
 
-    def get_tokens(self) -> list:
-        tokens = nltk.tokenize.word_tokenize(self.content)
-        tagged_tokens = nltk.pos_tag(tokens)
+    @staticmethod
+    def load_resources() -> dict:
+        raise NotImplementedError
 
-        for token, tag in tagged_tokens:
-            if token.endswith(".") and token.count(".") == 1:
-                token = token.replace(".", "")
+    @staticmethod
+    def save_resources(resources, min_interval: float = 0):
+        pass
 
-            wordnet_pos = self._get_wordnet_pos(tag)
-            lemma = self.lemmatizer.lemmatize(token.lower(), pos=wordnet_pos)
+    @staticmethod
+    def cache_stats(resources) -> dict:
+        return {}
 
-            if not self.is_word(lemma):
-                continue
+    def count_words(self, texts: Iterable[str]) -> dict[str, int]:
+        """Return word -> number of occurrences in texts, most frequent first.
 
-            yield lemma
+        texts is consumed in batches, so it can be a generator over a file of any length.
+        """
+        counts = Counter()
+        texts = iter(texts)
+        while batch := list(islice(texts, self.BATCH_SIZE)):
+            for tokens in self.get_tokens(batch):
+                counts.update(tokens)
 
+        return dict(counts.most_common())
 
-class Japanese(Language):
-    def __init__(self, content, subtitle_path):
-        super().__init__(content, subtitle_path)
+    def index_words(self, texts: list[str], groups: list) -> tuple[dict, dict]:
+        """Count the words of texts per group, groups[i] being the group of texts[i], and note where they occur.
 
-        self.name = LANGUAGE["jp"]
-        self.tagger = fugashi.Tagger()
+        Returns group -> word counts, most frequent first, and word -> ascending
+        indexes of the texts it occurs in.
+        """
+        counts = {}
+        postings = {}
+        for start in range(0, len(texts), self.BATCH_SIZE):
+            for number, tokens in enumerate(self.get_tokens(texts[start : start + self.BATCH_SIZE]), start):
+                counts.setdefault(groups[number], Counter()).update(tokens)
+                for word in dict.fromkeys(tokens):
+                    postings.setdefault(word, []).append(number)
 
-    def is_word(self, token):
-        return is_japanese(token)
+        return {group: dict(group_counts.most_common()) for group, group_counts in counts.items()}, postings
 
-    def get_tokens(self) -> list:
-        for word in self.tagger(self.content):
-            token = word.feature.lemma if word.feature.lemma else word.surface
-            if self.is_word(token):
-                yield token
+    def get_tokens(self, texts: list[str]) -> list[list[str]]:
+        """Return the words of each text."""
+        raise NotImplementedError
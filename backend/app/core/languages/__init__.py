@@ -0,0 +1 @@
+"""Language backends, imported by app.core.lang the first time their language is needed."""
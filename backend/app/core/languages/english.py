@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""English: NLTK tokenizer, then a POS tagger and WordNet or a lexicon for the lemmas, and enchant for the spelling."""
+
+import re
+from pathlib import Path
+from typing import Iterator, Optional
+
+import nltk
+import enchant
+from nltk.stem import WordNetLemmatizer
+from nltk.corpus import wordnet
+from nltk.tag.perceptron import PerceptronTagger
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core import lang
+from app.core.lang import LANGUAGE, Language
+from app.core.lexicon import load_english_lexicon
+
+
+def _lemma_cache_path() -> Optional[Path]:
+    """Where the lemma memo is kept across restarts: its entries hold for one analyzer key only."""
+    if not settings.LEMMA_CACHE_PERSIST:
+        return None
+
+    return settings.CACHE_DIR / f"lemma_cache-{lang.analyzer_key().replace(':', '-')}.pickle"
+
+
+class English(Language):
+    def __init__(self, resources):
+        super().__init__(resources)
+
+        self.name = LANGUAGE["en"]
+        self.re_word = re.compile(r"[a-zA-Z]")
+        self.enchant_dict = resources["enchant_dict"]
+        self.lemmatizer = resources["lemmatizer"]
+        self.tagger = resources["tagger"]
+        self.lexicon = resources["lexicon"]
+        self.lemma_cache = resources["lemma_cache"]
+
+    @staticmethod
+    def load_resources(analyzer: str = None) -> dict:
+        """analyzer is "accurate" (POS tagger and WordNet) or "fast" (lexicon lookup), ENGLISH_ANALYZER by default."""
+        analyzer = analyzer or settings.ENGLISH_ANALYZER
+
+        lemma_cache = LRUCache(settings.LEMMA_CACHE_SIZE, _lemma_cache_path())
+        lemma_cache.load()
+
+        lemmatizer = WordNetLemmatizer()
+        tagger = None
+        lexicon = None
+        if analyzer == "fast":
+            lexicon = load_english_lexicon(settings.CACHE_DIR)
+            nltk.tokenize.word_tokenize("Warming up the tokenizer.")
+        else:
+            tagger = PerceptronTagger()
+            # wordnet and punkt are read lazily on first use
+            wordnet.ensure_loaded()
+            tagger.tag(nltk.tokenize.word_tokenize("Warming up the tagger."))
+
+        return {
+            "enchant_dict": enchant.Dict("en_US"),
+            "lemmatizer": lemmatizer,
+            "tagger": tagger,
+            "lexicon": lexicon,
+            "lemma_cache": lemma_cache,
+        }
+
+    @staticmethod
+    def save_resources(resources, min_interval: float = 0):
+        resources["lemma_cache"].save(min_interval)
+
+    @staticmethod
+    def cache_stats(resources) -> dict:
+        return {"lemma_cache": resources["lemma_cache"].stats()}
+
+    def is_word(self, token):
+        return len(token) > 1 and self.enchant_dict.check(token) and self.re_word.match(token)
+
+    def _get_wordnet_pos(self, tag):
+        """Map POS tag to first character lemmatize() accepts"""
+        if tag.startswith("J"):
+            return wordnet.ADJ
+        elif tag.startswith("V"):
+            return wordnet.VERB
+        elif tag.startswith("N"):
+            return wordnet.NOUN
+        elif tag.startswith("R"):
+            return wordnet.ADV
+        else:
+            return wordnet.NOUN
+
+    def get_tokens(self, texts: list[str]) -> list[list[str]]:
+        with self.timed("tokenize"):
+            sentences = [nltk.tokenize.word_tokenize(text) for text in texts]
+
+        if self.lexicon is not None:
+            with self.timed("lemmatize"):
+                return [list(self._get_lemmas((token, None) for token in sentence)) for sentence in sentences]
+
+        with self.timed("pos_tag"):
+            # same as nltk.pos_tag_sents, which would load a new PerceptronTagger on every call
+            tagged_sentences = self.tagger.tag_sents(sentences)
+        with self.timed("lemmatize"):
+            return [list(self._get_lemmas(sentence)) for sentence in tagged_sentences]
+
+    def lemmatize(self, token: str, tag: Optional[str]) -> str:
+        """Lemma of a lowercase token: by its POS tag when there is one, else from the lexicon."""
+        if tag is None:
+            return self.lexicon.get(token) or token
+        return self.lemmatizer.lemmatize(token, pos=self._get_wordnet_pos(tag))
+
+    def _get_lemmas(self, tagged_tokens) -> Iterator[str]:
+        for token, tag in tagged_tokens:
+            if token.endswith(".") and token.count(".") == 1:
+                token = token.replace(".", "")
+
+            key = (token.lower(), None if tag is None else self._get_wordnet_pos(tag))
+            entry = self.lemma_cache.get(key)
+            if entry is None:
+                lemma = self.lemmatize(key[0], tag)
+                entry = (lemma, bool(self.is_word(lemma)))
+                self.lemma_cache.put(key, entry)
+
+            lemma, is_word = entry
+            if not is_word:
+                continue
+
+            yield lemma
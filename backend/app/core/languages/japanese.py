@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Japanese: fugashi (MeCab with UniDic) tokenizes, tags and lemmatizes in one pass."""
+
+from typing import Iterator
+
+import fugashi
+
+from app.core.lang import HAN, KANA, LANGUAGE, SCRIPT_TABLE, Language
+
+
+class Japanese(Language):
+    # UniDic parts of speech of content words; particles, auxiliaries, symbols and affixes are left out
+    CONTENT_POS = {"名詞", "代名詞", "動詞", "形容詞", "形状詞", "副詞"}
+
+    def __init__(self, resources):
+        super().__init__(resources)
+
+        self.name = LANGUAGE["jp"]
+        self.tagger = resources["tagger"]
+
+    @staticmethod
+    def load_resources() -> dict:
+        return {"tagger": fugashi.Tagger()}
+
+    def is_word(self, token):
+        # written in kana or kanji, which leaves out romaji and numbers tagged as nouns
+        classes = token.translate(SCRIPT_TABLE)
+        return KANA in classes or HAN in classes
+
+    def get_tokens(self, texts: list[str]) -> list[list[str]]:
+        with self.timed("fugashi"):
+            return [list(self._get_lemmas(text)) for text in texts]
+
+    def _get_lemmas(self, text: str) -> Iterator[str]:
+        # fugashi tags and lemmatizes while it tokenizes
+        for word in self.tagger(text):
+            feature = word.feature
+            if feature.pos1 not in self.CONTENT_POS or feature.pos2 == "数詞":
+                continue
+
+            token = feature.lemma if feature.lemma else word.surface
+            if self.is_word(token):
+                yield token
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""String tables in memory-mapped files: inflection -> lemma, for lemmatizing without a POS tagger,
+and word -> definition, for enriching the words table from local dictionaries.
+
+File format: MAGIC, uint32 entry count, uint32 offsets of the count + 1 entries,
+then the entries, "key\\tvalue\\n" in UTF-8, sorted by key.
+
+Build the definition tables once with (from the backend directory):
+
+    python -m app.core.lexicon --jmdict JMdict_e.gz
+"""
+
+import argparse
+import gzip
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Optional
+from xml.etree import ElementTree
+
+from app.core.config import settings
+
+# bump when build_english_lemmas changes; it is part of the file name
+ENGLISH_LEXICON_VERSION = 1
+# bump when a definitions builder changes; it is part of the file names
+DEFINITIONS_VERSION = 1
+# senses kept per word, most used first
+DEFINITION_SENSES = 3
+
+# WordNet's morphy rules, as (inflection suffix, lemma suffix) per part of speech
+MORPHY_SUBSTITUTIONS = {
+    "n": [
+        ("s", ""),
+        ("ses", "s"),
+        ("ves", "f"),
+        ("xes", "x"),
+        ("zes", "z"),
+        ("ches", "ch"),
+        ("shes", "sh"),
+        ("men", "man"),
+        ("ies", "y"),
+    ],
+    "v": [("s", ""), ("ies", "y"), ("es", "e"), ("es", ""), ("ed", "e"), ("ed", ""), ("ing", "e"), ("ing", "")],
+    "a": [("er", ""), ("est", ""), ("er", "e"), ("est", "e")],
+    "r": [],
+}
+# the exception list of each part of speech in the WordNet database
+EXCEPTION_FILES = {"n": "noun.exc", "v": "verb.exc", "a": "adj.exc", "r": "adv.exc"}
+
+
+class Lexicon:
+    """A read-only string table, e.g. form -> lemma, searched in place in a memory-mapped file.
+
+    Opening one costs a header read whatever the size, and worker processes
+    mapping the same file share its pages.
+    """
+
+    # the byte order is part of the magic: the offsets are stored as native uint32
+    MAGIC = b"SSLX" + sys.byteorder[0].encode("ascii")
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_size = len(self.MAGIC) + 4
+        if self._mmap[: len(self.MAGIC)] != self.MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a lexicon")
+
+        (self.count,) = struct.unpack_from("<I", self._mmap, len(self.MAGIC))
+        offsets_end = header_size + 4 * (self.count + 1)
+        self._offsets = memoryview(self._mmap)[header_size:offsets_end].cast("I")
+        self._entries = offsets_end
+
+    def __len__(self):
+        return self.count
+
+    def _form(self, index: int) -> bytes:
+        start = self._entries + self._offsets[index]
+        return self._mmap[start : self._mmap.find(b"\t", start)]
+
+    def get(self, form: str) -> Optional[str]:
+        key = form.encode("utf-8")
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._form(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == self.count or self._form(low) != key:
+            return None
+
+        start = self._entries + self._offsets[low] + len(key) + 1
+        end = self._entries + self._offsets[low + 1] - 1
+        return self._mmap[start:end].decode("utf-8")
+
+    @classmethod
+    def write(cls, path: Path, table: dict[str, str]):
+        """Write key -> value; keys can't contain tabs or newlines."""
+        entries = [f"{key}\t{value}\n".encode("utf-8") for key, value in sorted(table.items())]
+        # sorting the strings and the encoded keys agree, UTF-8 keeps the code point order
+        offsets = array("I", [0])
+        for entry in entries:
+            offsets.append(offsets[-1] + len(entry))
+
+        # workers building the same lexicon at once each write their own file
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(cls.MAGIC)
+            f.write(struct.pack("<I", len(entries)))
+            f.write(offsets.tobytes())
+            for entry in entries:
+                f.write(entry)
+        os.replace(tmp_path, path)
+
+
+def _usage(wordnet, lemma: str, pos: str) -> int:
+    """How often lemma is used with pos in the tagged corpora WordNet counts come from."""
+    return sum(entry.count() for entry in wordnet.lemmas(lemma, pos))
+
+
+def _exceptions(wordnet, pos: str) -> dict[str, list[str]]:
+    """The exception list of pos, inflected form -> lemmas, e.g. "geese" -> ["goose"]."""
+    with wordnet.open(EXCEPTION_FILES[pos]) as f:
+        return {terms[0]: terms[1:] for terms in (line.split() for line in f) if terms}
+
+
+def _morphy(form: str, pos: str, lemma_names: set, exceptions: dict) -> list[str]:
+    """Every lemma WordNet's morphy finds for form in one part of speech, e.g. "saw" -> ["saw", "see"] for verbs.
+
+    The same rules as wordnet.morphy, which only returns the first of them.
+    """
+    if form in exceptions:
+        forms = exceptions[form]
+    else:
+        forms = [
+            form[: len(form) - len(inflection)] + ending
+            for inflection, ending in MORPHY_SUBSTITUTIONS[pos]
+            if form.endswith(inflection)
+        ]
+
+    return [lemma for lemma in dict.fromkeys([form, *forms]) if lemma in lemma_names]
+
+
+def build_english_lemmas(wordnet) -> dict[str, str]:
+    """Map every inflected form WordNet's morphy knows to one lemma, without knowing the part of speech.
+
+    Candidate forms are the lemmas of each part of speech with the morphy rules
+    applied backwards, plus the exception lists; morphy checks each of them.
+    When a form has several lemmas, e.g. "left" (leave, left) or "saw" (see,
+    saw), the one used most often in WordNet's tagged corpora wins, and the
+    form itself on a tie. Only public NLTK interfaces are used: the lemma names
+    and the exception files of the WordNet database.
+    """
+    candidates = {}
+    for pos, substitutions in MORPHY_SUBSTITUTIONS.items():
+        all_names = set(wordnet.all_lemma_names(pos))
+        exceptions = _exceptions(wordnet, pos)
+        forms = set(exceptions)
+        for name in all_names:
+            if "_" in name:
+                continue
+            forms.add(name)
+            for inflection, ending in substitutions:
+                if name.endswith(ending):
+                    forms.add(name[: len(name) - len(ending)] + inflection)
+
+        for form in forms:
+            for lemma in _morphy(form, pos, all_names, exceptions):
+                candidates.setdefault(form, set()).add((lemma, pos))
+
+    lemmas = {}
+    for form, readings in candidates.items():
+        names = {lemma for lemma, _ in readings}
+        if names == {form}:
+            continue
+        if len(names) == 1:
+            lemmas[form] = names.pop()
+            continue
+
+        usage = {}
+        for lemma, pos in readings:
+            usage[lemma] = usage.get(lemma, 0) + _usage(wordnet, lemma, pos)
+        best = max(usage.values())
+        if usage.get(form) != best:
+            lemmas[form] = min(lemma for lemma, count in usage.items() if count == best)
+
+    return lemmas
+
+
+def load_english_lexicon(directory: Path) -> Lexicon:
+    """Open the English lexicon in directory, building it from WordNet first if needed (about 12 seconds, once)."""
+    path = directory / f"english_lexicon_v{ENGLISH_LEXICON_VERSION}.bin"
+    try:
+        return Lexicon(path)
+    except (FileNotFoundError, ValueError):
+        pass
+
+    from nltk.corpus import wordnet
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Lexicon.write(path, build_english_lemmas(wordnet))
+    return Lexicon(path)
+
+
+# WordNet part of speech -> label of its senses in a definition
+_WORDNET_POS_LABELS = {"n": "n.", "v": "v.", "a": "adj.", "s": "adj.", "r": "adv."}
+_WHITESPACE = re.compile(r"\s+")
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+def build_english_definitions(wordnet) -> dict[str, str]:
+    """Map every single-word WordNet lemma to the glosses of its most used senses, e.g. "n. ...; v. ..."."""
+    senses = {}
+    for synset in wordnet.all_synsets():
+        definition = f"{_WORDNET_POS_LABELS[synset.pos()]} {_WHITESPACE.sub(' ', synset.definition())}"
+        for lemma in synset.lemmas():
+            if "_" not in lemma.name():
+                senses.setdefault(lemma.name().lower(), []).append((lemma.count(), definition))
+
+    definitions = {}
+    for word, word_senses in senses.items():
+        # sorting is stable: senses used equally often keep WordNet's order
+        ranked = dict.fromkeys(definition for _, definition in sorted(word_senses, key=lambda sense: -sense[0]))
+        definitions[word] = "; ".join(list(ranked)[:DEFINITION_SENSES])
+
+    return definitions
+
+
+def build_japanese_definitions(path: Path) -> dict[str, str]:
+    """Map the spellings and readings of the entries of a JMdict file (optionally gzipped) to their English glosses.
+
+    When entries share a spelling, one marked as common (a *_pri element) wins over the others, else the first.
+    """
+    definitions = {}
+    common = set()
+    with (gzip.open if path.suffix == ".gz" else open)(path, "rb") as f:
+        # entry by entry; the DTD's entities are declared in the file itself
+        for _, element in ElementTree.iterparse(f):
+            if element.tag != "entry":
+                continue
+
+            senses = []
+            for sense in element.findall("sense"):
+                glosses = [
+                    gloss.text
+                    for gloss in sense.findall("gloss")
+                    if gloss.text and gloss.get(_XML_LANG, "eng") == "eng"
+                ]
+                if glosses:
+                    senses.append(", ".join(glosses))
+            if senses:
+                definition = _WHITESPACE.sub(" ", "; ".join(senses[:DEFINITION_SENSES]))
+                for spelling, key, priority in (("k_ele", "keb", "ke_pri"), ("r_ele", "reb", "re_pri")):
+                    for entry in element.findall(spelling):
+                        word = entry.findtext(key)
+                        is_common = entry.find(priority) is not None
+                        if word and (word not in definitions or (is_common and word not in common)):
+                            definitions[word] = definition
+                            if is_common:
+                                common.add(word)
+
+            element.clear()
+
+    return definitions
+
+
+def _definitions_path(directory: Path, language: str) -> Path:
+    return directory / f"definitions_{language}_v{DEFINITIONS_VERSION}.bin"
+
+
+def definition_key(language: str, word: str) -> str:
+    """The form the dictionary of language lists word under.
+
+    UniDic lemmas of Japanese words carry a gloss or a part of speech after a
+    hyphen, e.g. "テレビ-television" or "私-代名詞"; JMdict has "テレビ" and "私".
+    """
+    if language == "jp":
+        return word.split("-", 1)[0] or word
+
+    return word
+
+
+# language -> opened definitions table; languages whose table isn't built yet are looked for again next time
+_definitions = {}
+
+
+def get_definitions(language: str) -> Optional[Lexicon]:
+    """Open the definitions table of language in CACHE_DIR, or None until it is built."""
+    if language not in _definitions:
+        try:
+            _definitions[language] = Lexicon(_definitions_path(settings.CACHE_DIR, language))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    return _definitions[language]
+
+
+def build_definitions(directory: Path, jmdict: Optional[Path] = None) -> dict[str, int]:
+    """Build the definitions tables: English from WordNet, Japanese from jmdict when given. Returns their sizes."""
+    from nltk.corpus import wordnet
+
+    directory.mkdir(parents=True, exist_ok=True)
+    tables = {"en": build_english_definitions(wordnet)}
+    if jmdict is not None:
+        tables["jp"] = build_japanese_definitions(jmdict)
+
+    for language, table in tables.items():
+        Lexicon.write(_definitions_path(directory, language), table)
+
+    return {language: len(table) for language, table in tables.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the definition tables used to enrich the words table.")
+    parser.add_argument("--jmdict", type=Path, default=settings.JMDICT_PATH, help="JMdict_e file, optionally gzipped")
+    parser.add_argument("--directory", type=Path, default=settings.CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    for language, count in build_definitions(args.directory, args.jmdict).items():
+        print(f"{language}: {count} words", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
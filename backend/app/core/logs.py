@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Structured logging for the app.* loggers: one JSON object per line, every field size-bounded."""
+
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+
+from app.core.config import settings
+
+# attributes every LogRecord has; anything else was passed in extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def _bound(value, limit: int):
+    """Return value as is if it is small, else as a string cut to limit characters."""
+    if isinstance(value, (bool, int, float)) or value is None:
+        return value
+
+    if not isinstance(value, str):
+        try:
+            text = json.dumps(value, ensure_ascii=False, default=str)
+        except ValueError:
+            text = str(value)
+        if len(text) <= limit:
+            return value
+        value = text
+
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}... ({len(value) - limit} more characters)"
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, max_field_length: int):
+        super().__init__()
+        self.max_field_length = max_field_length
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": _bound(record.getMessage(), self.max_field_length),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = _bound(value, self.max_field_length)
+
+        if record.exc_info:
+            # keep the end of the traceback, where the error is
+            exception = self.formatException(record.exc_info)
+            if len(exception) > self.max_field_length:
+                exception = f"...{exception[-self.max_field_length :]}"
+            entry["exception"] = exception
+
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging():
+    """Send the app.* loggers to stderr as JSON lines; calling it again changes nothing."""
+    logger = logging.getLogger("app")
+    if any(isinstance(handler.formatter, JsonFormatter) for handler in logger.handlers):
+        return
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter(settings.LOG_MAX_FIELD_LENGTH))
+    logger.addHandler(handler)
+    logger.setLevel(settings.LOG_LEVEL)
+    logger.propagate = False
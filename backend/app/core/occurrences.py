@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Where the words of an analysed subtitle occur: the cues of each word, and where their text is in the file.
+
+Cue numbers, offsets and timestamps are uint32 arrays, stored little-endian:
+four bytes per occurrence and sixteen per cue.
+"""
+
+import struct
+import sys
+from array import array
+from typing import NamedTuple
+
+# per cue: start, end (milliseconds), offset, length (bytes of its text in the stored file)
+CUE_FIELDS = 4
+CUE_SIZE = 4 * CUE_FIELDS
+
+
+def to_bytes(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_bytes(data: bytes, typecode: str = "I") -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def read_cue(cues: bytes, number: int) -> array:
+    """The fields of one cue of an encoded cue table."""
+    return from_bytes(cues[number * CUE_SIZE : (number + 1) * CUE_SIZE])
+
+
+class FileIndex(NamedTuple):
+    """The cues of one file, of every style, and word -> ascending numbers of the cues it occurs in."""
+
+    cues: array  # CUE_FIELDS values per cue
+    cue_styles: array  # per cue, its position in styles
+    styles: list  # style names; SRT cues have the style None
+    postings: dict
+
+    def cue_count(self) -> int:
+        return len(self.cues) // CUE_FIELDS
+
+    def cues_of_styles(self, styles) -> set:
+        """Numbers of the cues of the given styles."""
+        numbers = {number for number, style in enumerate(self.styles) if style in styles}
+        return {cue for cue, style in enumerate(self.cue_styles) if style in numbers}
+
+
+MAGIC = b"SSOI"
+HEADER = struct.Struct("<4sIII")
+
+
+def encode(index: FileIndex) -> bytes:
+    words = list(index.postings)
+    lengths = array("I", (len(index.postings[word]) for word in words))
+    return b"".join(
+        [
+            HEADER.pack(MAGIC, index.cue_count(), len(index.styles), len(words)),
+            to_bytes(index.cues),
+            to_bytes(index.cue_styles),
+            to_bytes(lengths),
+            *(to_bytes(index.postings[word]) for word in words),
+            "\n".join("" if style is None else style for style in index.styles).encode("utf-8"),
+            b"\n",
+            "\n".join(words).encode("utf-8"),
+        ]
+    )
+
+
+def decode(data: bytes) -> FileIndex:
+    """Raises ValueError for data encode() didn't write."""
+    if len(data) < HEADER.size:
+        raise ValueError("not an occurrence index")
+    magic, cue_count, style_count, word_count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not an occurrence index")
+
+    position = HEADER.size
+
+    def take(count: int) -> array:
+        nonlocal position
+        if position + 4 * count > len(data):
+            raise ValueError("truncated occurrence index")
+        values = from_bytes(data[position : position + 4 * count])
+        position += 4 * count
+        return values
+
+    cues = take(CUE_FIELDS * cue_count)
+    cue_styles = take(cue_count)
+    lengths = take(word_count)
+    postings = [take(length) for length in lengths]
+
+    names = data[position:].decode("utf-8").split("\n")
+    styles = [name or None for name in names[:style_count]]
+    # the styles are followed by a newline even when there are none
+    words = names[max(style_count, 1) :] if word_count else []
+    if len(styles) != style_count or len(words) != word_count:
+        raise ValueError("truncated occurrence index")
+
+    return FileIndex(cues, cue_styles, styles, dict(zip(words, postings)))
@@ -1,90 +1,409 @@
 #!/usr/bin/env python3
 
-import io
+import codecs
+import hashlib
+import re
 import uuid
+from collections import Counter
 from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional
 
-import ass
-
+from app.core.cache import AnalysisCache
 from app.core.config import settings
-from app.core import lang
+from app.core import lang, occurrences
 
+analysis_cache = AnalysisCache(settings.CACHE_DIR / "analysis", settings.ANALYSIS_CACHE_MAX_BYTES)
 
-def upload(filename: str, content):
-    session_id = str(uuid.uuid4())
 
-    filepath = settings.UPLOAD_DIR / f"{session_id}_{filename}"
-    with open(filepath, "wb") as f:
-        f.write(content)
+class Upload:
+    """Writes an uploaded subtitle to UPLOAD_DIR chunk by chunk.
+
+    The content is hashed as it arrives, its encoding is sniffed from the first
+    bytes and the file is stored transcoded to UTF-8. Language detection samples
+    the first LANGUAGE_SAMPLE_CHARS characters.
+    """
+
+    SNIFF_BYTES = 64 * 1024
+    LANGUAGE_SAMPLE_CHARS = 64 * 1024
+
+    def __init__(self, filename: str, session_id: str = None, position: int = None):
+        self.session_id = session_id or str(uuid.uuid4())
+        self.filename = filename
+        # files of a batch share the session id and may share names, e.g. from different folders of a zip
+        prefix = self.session_id if position is None else f"{self.session_id}_{position:03d}"
+        self.filepath = settings.UPLOAD_DIR / f"{prefix}_{filename}"
+        self.size = 0
+        self.encoding = None
+
+        self._file = open(self.filepath, "wb")
+        self._hash = hashlib.sha256()
+        self._head = b""
+        self._decoder = None
+        self._sample = []
+        self._sample_chars = 0
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        self._hash.update(chunk)
+
+        if self._decoder is None:
+            # hold the first bytes back until there are enough to tell the encoding
+            self._head += chunk
+            if len(self._head) < self.SNIFF_BYTES:
+                return
+            chunk, self._head = self._head, b""
+            self._start_decoding(chunk)
+
+        self._write_text(self._decoder.decode(chunk))
+
+    def finish(self) -> dict:
+        if self._decoder is None:
+            self._start_decoding(self._head)
+            self._write_text(self._decoder.decode(self._head))
+        self._write_text(self._decoder.decode(b"", final=True))
+        self._file.close()
+
+        language = lang.check_language("".join(self._sample))
+
+        styles = None
+        if Path(self.filename).suffix.lower() == ".ass":
+            styles = _extract_styles_from_ass(self.filepath)
+
+        return {
+            "session_id": self.session_id,
+            "language": language,
+            "styles": styles,
+            "filepath": self.filepath,
+            "content_hash": self._hash.hexdigest(),
+            "encoding": self.encoding,
+        }
+
+    def abort(self):
+        self._file.close()
+        self.filepath.unlink(missing_ok=True)
+
+    def _start_decoding(self, head: bytes):
+        self.encoding = _sniff_encoding(head)
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+
+    def _write_text(self, text: str):
+        if not text:
+            return
+
+        if self._sample_chars < self.LANGUAGE_SAMPLE_CHARS:
+            sample = text[: self.LANGUAGE_SAMPLE_CHARS - self._sample_chars]
+            self._sample.append(sample)
+            self._sample_chars += len(sample)
+
+        self._file.write(text.encode("utf-8"))
 
-    # TODO detect encoding
-    try:
-        content_str = content.decode("utf-8")
-    except UnicodeDecodeError:
-        content_str = content.decode("utf-8-sig")
 
-    language = lang.check_language(content_str)
+def _sniff_encoding(head: bytes) -> str:
+    # the utf-8-sig and utf-16 decoders strip their BOM
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
 
-    styles = None
-    file_ext = Path(filename).suffix.lower()
-    if file_ext == ".ass":
-        styles = _extract_styles_from_ass(content_str)
+    for encoding in ("utf-8", "cp932"):
+        try:
+            # not final: the head may end in the middle of a multi-byte character
+            codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            pass
 
-    return {
-        "session_id": session_id,
-        "language": language,
-        "styles": styles,
-        "filepath": filepath,
-    }
+    return "cp1252"
 
 
-def get_words_from_subtitle(subtitle_path: Path, style: str = None) -> tuple[list[str], list[str]]:
-    content = _parse_subtitle(subtitle_path, style)
-    print(content)
+def is_ass(subtitle_path: Path) -> bool:
+    return subtitle_path.name.lower().endswith(".ass")
 
-    language_processor = lang.init_language(content, subtitle_path)
-    return language_processor.split_into_words()
 
+def merge_counts(word_counts: Iterable[dict[str, int]]) -> dict[str, int]:
+    merged = Counter()
+    for counts in word_counts:
+        merged.update(counts)
+
+    return dict(merged.most_common())
+
+
+def get_cached_words(content_hash: str, styles: Optional[list[str]] = None) -> Optional[dict[str, int]]:
+    """Return the word counts of an earlier analysis of the same content, or None.
+
+    Without styles these are the counts of every cue; with styles (of an ASS file),
+    the merged counts of those styles, or None unless each of them is cached.
+    """
+    if content_hash is None:
+        return None
+    if not styles:
+        return analysis_cache.get(content_hash, None, lang.analyzer_key())
+
+    style_counts = []
+    for style in styles:
+        word_counts = analysis_cache.get(content_hash, "style", style, lang.analyzer_key())
+        if word_counts is None:
+            return None
+        style_counts.append(word_counts)
+
+    return merge_counts(style_counts)
+
+
+def finish_analysis(
+    subtitle_path: Path, style_counts: dict, content_hash: Optional[str], styles: Optional[list[str]] = None
+) -> dict[str, int]:
+    """Cache the counts of one pass over a file and return the counts of the given styles.
+
+    style_counts maps the style of the cues (None in SRT files) to their word
+    counts; it gains an empty entry for each style an ASS file declares without
+    using it. Each style is cached on its own, so choosing or combining styles
+    later only merges cached counts. Without styles, or for SRT files, returns
+    the counts of every cue. Styles the file doesn't have count as empty: the
+    files of a batch needn't share their styles.
+    """
+    if is_ass(subtitle_path):
+        for style in _extract_styles_from_ass(subtitle_path):
+            style_counts.setdefault(style, {})
+
+    total = merge_counts(style_counts.values())
+    if content_hash is not None:
+        for style, word_counts in style_counts.items():
+            if style is not None:
+                analysis_cache.put(word_counts, content_hash, "style", style, lang.analyzer_key())
+        analysis_cache.put(total, content_hash, None, lang.analyzer_key())
+
+    if not styles or not is_ass(subtitle_path):
+        return total
+
+    return merge_counts(style_counts.get(style, {}) for style in styles)
+
+
+def get_cached_index(content_hash: str) -> Optional[occurrences.FileIndex]:
+    """Return where the words of an earlier analysis of the same content occur, or None."""
+    if content_hash is None:
+        return None
+
+    data = analysis_cache.get_bytes(content_hash, "occurrences", lang.analyzer_key())
+    if data is None:
+        return None
+
+    try:
+        return occurrences.decode(data)
+    except ValueError:
+        return None
 
-def _parse_subtitle(subtitle_path: Path, style: str = None) -> tuple[list[str], list[str]]:
+
+def cache_index(file_index: occurrences.FileIndex, content_hash: str):
+    if content_hash is not None:
+        analysis_cache.put_bytes(occurrences.encode(file_index), content_hash, "occurrences", lang.analyzer_key())
+
+
+class Cue(NamedTuple):
+    start: int  # milliseconds
+    end: int
+    text: str  # dialogue only, without markup
+    style: Optional[str] = None  # of the ASS event
+    # bytes of the text, markup included, in the file; read_cue_texts() reads it back
+    offset: int = 0
+    length: int = 0
+
+
+def iter_cues(subtitle_path: Path, style: str = None) -> Iterator[Cue]:
+    """Yield the dialogue cues of a subtitle file one at a time.
+
+    For .ass files only the events of the given style are yielded, or all of them when style is None.
+    """
     name = subtitle_path.name.lower()
 
     if name.endswith(".ass"):
-        return _parse_ass(subtitle_path, style)
+        return _iter_ass_cues(subtitle_path, style)
     elif name.endswith(".srt"):
-        lines = _parse_srt(subtitle_path)
-        return lines
+        return _iter_srt_cues(subtitle_path)
     else:
         raise ValueError(f"Unsupported subtitle format: {subtitle_path.suffix}")
 
 
-def _parse_ass(subtitle_path: Path, style: str = None) -> tuple[list[str], list[str]]:
-    # TODO detect encoding
-    with open(subtitle_path, encoding="utf_8_sig") as f:
-        doc = ass.parse(f)
+_SRT_TIMING = re.compile(r"(\d+):(\d{2}):(\d{2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{1,3})")
+_ASS_TIME = re.compile(r"(\d+):(\d{2}):(\d{2})[.:](\d{1,2})")
+_ASS_OVERRIDE = re.compile(r"\{([^}]*)\}")
+_ASS_DRAWING = re.compile(r"\\p(\d+)")
+_MARKUP = re.compile(r"<[^>]*>|\{[^}]*\}")
+_ASS_STYLE_SECTIONS = ("[v4+ styles]", "[v4 styles]")
+
+
+def _iter_lines(f) -> Iterator[tuple[int, bytes, str]]:
+    """Yield (offset, raw line, decoded line) for each line of a UTF-8 file opened in binary mode."""
+    offset = 0
+    for raw in f:
+        line = raw.decode("utf-8", errors="replace")
+        if offset == 0 and line.startswith("\ufeff"):
+            line = line[1:]
+            offset, raw = len(codecs.BOM_UTF8), raw[len(codecs.BOM_UTF8) :]
+        yield offset, raw, line
+        offset += len(raw)
+
+
+def _iter_srt_cues(subtitle_path: Path) -> Iterator[Cue]:
+    start = end = None
+    lines = []
+    # where the text of the current cue starts in the file, and where each of its lines ends
+    first = 0
+    ends = []
+
+    with open(subtitle_path, "rb") as f:
+        for offset, raw, line in _iter_lines(f):
+            line = line.strip()
+
+            match = _SRT_TIMING.match(line)
+            if match:
+                # a timing line also ends a cue that wasn't followed by a blank line, whose
+                # last line is then the number of the next cue
+                if start is not None and len(lines) > 1 and lines[-1].isdigit():
+                    lines.pop()
+                    ends.pop()
+                if start is not None and lines:
+                    yield _make_cue(start, end, lines, first, ends[-1])
+                start, end = _srt_time(match.groups()[:4]), _srt_time(match.groups()[4:])
+                lines = []
+                ends = []
+            elif not line:
+                if start is not None and lines:
+                    yield _make_cue(start, end, lines, first, ends[-1])
+                start = None
+                lines = []
+                ends = []
+            elif start is not None:
+                # after a blank line, cue numbers precede the timing line and aren't collected
+                if not lines:
+                    first = offset
+                lines.append(line)
+                ends.append(offset + len(raw.rstrip(b"\r\n")))
+
+    if start is not None and lines:
+        yield _make_cue(start, end, lines, first, ends[-1])
+
+
+def _iter_ass_cues(subtitle_path: Path, style: str = None) -> Iterator[Cue]:
+    styles = []
+    fields = None
+
+    with open(subtitle_path, "rb") as f:
+        for section, key, value, (offset, line) in _iter_ass_lines(f):
+            if section in _ASS_STYLE_SECTIONS:
+                if key == "Style":
+                    styles.append(value.split(",", 1)[0].strip())
+                continue
+
+            if section != "[events]":
+                continue
+
+            if fields is None and key == "Format":
+                fields = [field.strip().lower() for field in value.split(",")]
+                if style is not None and style not in styles:
+                    raise ValueError(f"Style '{style}' not found. Available styles: {styles}")
+            elif fields is not None and key == "Dialogue":
+                # the text is the last field and may contain commas itself
+                values = value.split(",", len(fields) - 1)
+                if len(values) != len(fields):
+                    continue
+
+                event = dict(zip(fields, values))
+                if style is not None and event.get("style", "").strip() != style:
+                    continue
+
+                raw_text = event.get("text", "")
+                text = _clean_ass_text(raw_text)
+                if text:
+                    start, end = _ass_time(event.get("start", "")), _ass_time(event.get("end", ""))
+                    # the text is the last field, so it ends where the stripped line ends
+                    length = len(raw_text.encode("utf-8"))
+                    text_offset = offset + len(line.encode("utf-8")) - length
+                    yield Cue(start, end, text, event.get("style", "").strip(), text_offset, length)
+
+
+def _iter_ass_lines(f) -> Iterator[tuple[str, str, str, tuple[int, str]]]:
+    """Yield (lowercased section, key, value, (offset, stripped line)) for each "Key: value" line of an ASS file.
+
+    f is opened in binary mode; offset is where the stripped line starts in it.
+    """
+    section = None
+    for offset, _, line in _iter_lines(f):
+        stripped = line.strip()
+        if stripped.startswith("["):
+            section = stripped.lower()
+        elif stripped and not stripped.startswith(";"):
+            key, _, value = stripped.partition(":")
+            offset += len(line[: len(line) - len(line.lstrip())].encode("utf-8"))
+            yield section, key.strip(), value.strip(), (offset, stripped)
+
+
+def _make_cue(start: int, end: int, lines: list[str], first: int = 0, last: int = 0) -> Cue:
+    return Cue(start, end, _srt_text(lines), None, first, last - first)
+
+
+def _srt_text(lines: list[str]) -> str:
+    return _MARKUP.sub("", "\n".join(lines)).strip()
+
+
+def read_cue_texts(subtitle_path: Path, spans: Iterable[tuple[int, int]]) -> list[str]:
+    """Read the text of cues back from their (offset, length) in the file, without parsing it."""
+    ass = is_ass(subtitle_path)
+    texts = []
+    with open(subtitle_path, "rb") as f:
+        for offset, length in spans:
+            f.seek(offset)
+            raw = f.read(length).decode("utf-8", errors="replace")
+            if ass:
+                texts.append(_clean_ass_text(raw))
+            else:
+                texts.append(_srt_text([line.strip() for line in raw.splitlines()]))
+
+    return texts
+
+
+def _clean_ass_text(text: str) -> str:
+    parts = []
+    drawing = False
+    position = 0
+
+    for match in _ASS_OVERRIDE.finditer(text):
+        # \p1 and up switch to vector drawing commands until \p0
+        if not drawing:
+            parts.append(text[position : match.start()])
+        for scale in _ASS_DRAWING.findall(match.group(1)):
+            drawing = scale != "0"
+        position = match.end()
+
+    if not drawing:
+        parts.append(text[position:])
 
-    styles = _extract_styles_from_ass_doc(doc)
+    text = "".join(parts).replace("\\N", "\n").replace("\\n", "\n").replace("\\h", " ")
+    return _MARKUP.sub("", text).strip()
 
-    if style is None:
-        return [], styles
 
-    if style not in styles:
-        raise ValueError(f"Style '{style}' not found. Available styles: {styles}")
+def _srt_time(parts) -> int:
+    hours, minutes, seconds, millis = parts
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis.ljust(3, "0"))
 
-    lines = [e.text for e in doc.events if e.style == style]
-    return "\n".join(lines)
 
+def _ass_time(value: str) -> int:
+    match = _ASS_TIME.match(value.strip())
+    if not match:
+        return 0
 
-def _parse_srt(subtitle_path: Path) -> list[str]:
-    with open(subtitle_path, "r", encoding="utf-8") as f:
-        return f.read()
+    hours, minutes, seconds, centis = match.groups()
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(centis.ljust(2, "0")) * 10
 
 
-def _extract_styles_from_ass(content: str) -> list[str]:
-    with io.StringIO(content) as f:
-        doc = ass.parse(f)
-        return _extract_styles_from_ass_doc(doc)
+def _extract_styles_from_ass(subtitle_path: Path) -> list[str]:
+    """Read the style names from the styles section without parsing the events."""
+    styles = []
 
+    with open(subtitle_path, "rb") as f:
+        for section, key, value, _ in _iter_ass_lines(f):
+            if section in _ASS_STYLE_SECTIONS and key == "Style":
+                styles.append(value.split(",", 1)[0].strip())
+            elif section == "[events]":
+                break
 
-def _extract_styles_from_ass_doc(doc) -> list[str]:
-    return [s.name for s in doc.styles]
+    return styles
@@ -1,24 +1,40 @@
 #!/usr/bin/env python3
 """FastAPI main application entry point."""
 
+import asyncio
+import contextlib
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.api import routes
+from app.core import executor, metrics
 from app.core.config import settings, init_directories
-from app.models.database import init_db
+from app.core.logs import setup_logging
+from app.models.database import close_db, init_db
+from app.services.cleanup import run_session_sweeper
+from app.services.session_service import run_job_heartbeat
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup/shutdown events."""
     # Startup
+    setup_logging()
     init_directories()
     await init_db()
+    await executor.start()
+    sweeper = asyncio.create_task(run_session_sweeper()) if settings.SESSION_SWEEP_INTERVAL > 0 else None
+    heartbeat = asyncio.create_task(run_job_heartbeat())
     yield
     # Shutdown
-    pass
+    for task in filter(None, (sweeper, heartbeat)):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    executor.shutdown()
+    await close_db()
 
 
 app = FastAPI(
@@ -33,7 +49,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(metrics.TimingMiddleware)
 
 
 @app.get("/")
@@ -48,4 +66,10 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(routes.router, prefix="/api")
@@ -1,12 +1,28 @@
 #!/usr/bin/env python3
 """Database models for backend."""
 
+import time
 from datetime import datetime
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    UniqueConstraint,
+    event,
+    inspect,
+    text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.schema import CreateColumn
 
+from app.core import metrics
 from app.core.config import settings
 
 Base = declarative_base()
@@ -20,6 +36,8 @@ class Word(Base):
     definition_en = Column(String, nullable=True)
     definition_jp = Column(String, nullable=True)
     definition_zh = Column(String, nullable=True)
+    # the definitions were looked up in the local dictionaries, found or not; see app.core.lexicon
+    enriched = Column(Boolean, nullable=False, default=False, server_default="0")
 
     session_words = relationship("SessionWord", back_populates="word_entry")
     user_words = relationship("UserWord", back_populates="word_entry")
@@ -27,33 +45,126 @@ class Word(Base):
 
 class Session(Base):
     __tablename__ = "sessions"
+    # the sweeper looks sessions up by age
+    __table_args__ = (Index("ix_sessions_created_at", "created_at"),)
 
     id = Column(String, primary_key=True)
     language = Column(String, nullable=False)
     subtitle_filename = Column(String, nullable=False)
     subtitle_path = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True)  # sha256 of the uploaded file
     status = Column(String, default="uploaded")
+    # the server process processing the session, and when it last reported that it still is
+    processing_owner = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    words_version = Column(Integer, nullable=False, default=0, server_default="0")  # latest word update batch
+    # raised by every write to the session or its words; the entity tags of its word lists derive from it
+    revision = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     words = relationship("SessionWord", back_populates="session", cascade="all, delete-orphan")
+    files = relationship("SessionFile", back_populates="session", cascade="all, delete-orphan")
+
+
+class SessionFile(Base):
+    """One of the files of a session uploaded as a batch, e.g. an episode of a season."""
+
+    __tablename__ = "session_files"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, ForeignKey("sessions.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    filename = Column(String, nullable=False)
+    subtitle_path = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True)
+    # breakdown filled in by processing
+    token_count = Column(Integer, nullable=True)
+    word_count = Column(Integer, nullable=True)
+    unknown_count = Column(Integer, nullable=True)
+
+    session = relationship("Session", back_populates="files")
 
 
 class SessionWord(Base):
     __tablename__ = "session_words"
+    __table_args__ = (
+        # word lists in frequency order, and the top words of finalize
+        Index("ix_session_words_session_frequency", "session_id", "frequency"),
+        # updates and joins by word within a session
+        Index("ix_session_words_session_word", "session_id", "word_id"),
+        Index("ix_session_words_word", "word_id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     session_id = Column(String, ForeignKey("sessions.id"), nullable=False)
     word_id = Column(Integer, ForeignKey("words.id"), nullable=False)
     frequency = Column(Integer, nullable=False, default=1)
     is_removed = Column(Boolean, default=False)  # User marked as "learned"
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # update batch that set is_removed
+    # session cue numbers the word occurs in, see app.core.occurrences; NULL for sessions processed before
+    postings = Column(LargeBinary, nullable=True)
 
     session = relationship("Session", back_populates="words")
     word_entry = relationship("Word", back_populates="session_words")
 
 
+class SessionWordCount(Base):
+    """How often a word occurs in a session, known words included: what the session adds to user_word_stats."""
+
+    __tablename__ = "session_word_counts"
+    __table_args__ = (Index("ix_session_word_counts_session_word", "session_id", "word_id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, ForeignKey("sessions.id"), nullable=False)
+    word_id = Column(Integer, ForeignKey("words.id"), nullable=False)
+    frequency = Column(Integer, nullable=False)
+
+
+class UserWordStats(Base):
+    """How often a user met each word, over every session processed, kept up to date as sessions are processed.
+
+    Sessions expire; their contribution stays.
+    """
+
+    __tablename__ = "user_word_stats"
+    __table_args__ = (
+        UniqueConstraint("user_id", "word_id", name="uix_user_word_stats"),
+        # top words, learned or not
+        Index("ix_user_word_stats_user_learned_frequency", "user_id", "learned", "total_frequency"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String, nullable=False)
+    word_id = Column(Integer, ForeignKey("words.id"), nullable=False)
+    total_frequency = Column(Integer, nullable=False, default=0)
+    session_count = Column(Integer, nullable=False, default=0)
+    last_seen_at = Column(DateTime, nullable=True)
+    learned = Column(Boolean, nullable=False, default=False, server_default="0")
+
+
+class SessionCues(Base):
+    """The cue table of one file of a session: the timestamps of its cues and where their text is in the file.
+
+    Cues are numbered across the files of the session, those of this file from first_cue on.
+    """
+
+    __tablename__ = "session_cues"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, ForeignKey("sessions.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    first_cue = Column(Integer, nullable=False)
+    subtitle_path = Column(String, nullable=False)
+    cues = Column(LargeBinary, nullable=False)  # occurrences.CUE_FIELDS uint32 per cue
+
+
 class UserWord(Base):
     __tablename__ = "user_words"
-    __table_args__ = (UniqueConstraint("user_id", "word_id", name="uix_user_word"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "word_id", name="uix_user_word"),
+        # a user's learned words, and the learned-word anti-join of processing
+        Index("ix_user_words_user_status_word", "user_id", "status", "word_id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String, nullable=True, default="default")  # For future user system
@@ -72,6 +183,36 @@ engine = create_async_engine(
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if engine.dialect.name != "sqlite":
+        return
+
+    cursor = dbapi_connection.cursor()
+    # first: it only takes effect in a database without tables that isn't in WAL mode yet, or with the
+    # next VACUUM; see _enable_incremental_vacuum for databases created before
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # readers no longer wait for writers; NORMAL is durable across application crashes in WAL mode
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    # negative: in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics.record_stage("db", time.perf_counter() - conn.info["query_start"].pop())
+
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
@@ -80,3 +221,109 @@ async def get_db():
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+    # commits migration by migration: VACUUM can't run inside a transaction
+    async with engine.connect() as conn:
+        await conn.run_sync(_migrate)
+
+
+async def close_db():
+    async with engine.connect() as conn:
+        # lets SQLite refresh the statistics the query planner uses to pick indexes
+        await conn.execute(text("PRAGMA optimize"))
+    await engine.dispose()
+
+
+def _add_missing_columns(conn):
+    """create_all() leaves existing tables alone, so add the columns introduced since they were created."""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+
+
+def _create_indexes(conn):
+    """Indexes for session and learned-word lookups."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+    # statistics for the query planner to pick the new indexes
+    conn.execute(text("ANALYZE"))
+
+
+def _backfill_word_stats(conn):
+    """Aggregate the sessions processed before user_word_stats existed; they all belong to the default user."""
+    conn.execute(
+        text(
+            "INSERT OR IGNORE INTO user_word_stats (user_id, word_id, total_frequency, session_count, last_seen_at, "
+            "learned) "
+            "SELECT :user_id, session_words.word_id, SUM(session_words.frequency), COUNT(*), MAX(sessions.created_at), "
+            "EXISTS (SELECT 1 FROM user_words WHERE user_words.user_id = :user_id "
+            "AND user_words.word_id = session_words.word_id AND user_words.status = 'learned') "
+            "FROM session_words JOIN sessions ON sessions.id = session_words.session_id "
+            "GROUP BY session_words.word_id"
+        ),
+        {"user_id": settings.DEFAULT_USER},
+    )
+
+
+def _enable_incremental_vacuum(conn):
+    """Switch databases created in WAL mode before auto_vacuum was set to INCREMENTAL, so the sweeper can free pages.
+
+    Rewrites the whole file once; needs no open transaction.
+    """
+    if conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2:
+        return
+
+    conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+    conn.execute(text("VACUUM"))
+
+
+def _backfill_session_word_counts(conn):
+    """Count the sessions processed before session_word_counts existed from their unknown words, all they kept."""
+    conn.execute(
+        text(
+            "INSERT INTO session_word_counts (session_id, word_id, frequency) "
+            "SELECT session_id, word_id, frequency FROM session_words"
+        )
+    )
+
+
+def _retry_unfound_definitions(conn):
+    """Look the words with a hyphen and no definition up again.
+
+    Japanese ones were looked up with the suffix of their UniDic lemma.
+    """
+    conn.execute(text("UPDATE words SET enriched = 0 WHERE definition_en IS NULL AND word LIKE '%-%'"))
+
+
+# migration i brings a database from PRAGMA user_version i to i + 1; never reorder or remove one
+MIGRATIONS = [
+    _create_indexes,
+    _backfill_word_stats,
+    _enable_incremental_vacuum,
+    _backfill_session_word_counts,
+    _retry_unfound_definitions,
+]
+
+
+def _migrate(conn):
+    """Bring a database created by an earlier version up to date, one migration at a time.
+
+    A new database already has the current schema from create_all(); the
+    migrations change what create_all() leaves alone, like the indexes of
+    existing tables.
+    """
+    if conn.dialect.name != "sqlite":
+        return
+
+    version = conn.execute(text("PRAGMA user_version")).scalar()
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(conn)
+        # PRAGMA doesn't take parameters
+        conn.execute(text(f"PRAGMA user_version = {number}"))
+        conn.commit()
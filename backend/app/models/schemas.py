@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Pydantic schemas for request/response validation."""
 
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel
 
@@ -20,11 +21,31 @@ class SessionResponse(BaseModel):
     filename: str
     status: str
     styles: Optional[list[str]] = None  # For .ass files
+    files: Optional[list[str]] = None  # For batch uploads
 
     class Config:
         from_attributes = True
 
 
+class SessionFileItem(BaseModel):
+    """Schema for one file of a batch session and its breakdown."""
+
+    position: int
+    filename: str
+    token_count: Optional[int] = None  # Set once processed
+    word_count: Optional[int] = None
+    unknown_count: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SessionFileListResponse(BaseModel):
+    """Schema for session file list response."""
+
+    files: list[SessionFileItem]
+
+
 class WordItem(BaseModel):
     """Schema for a single word."""
 
@@ -38,24 +59,62 @@ class WordListResponse(BaseModel):
 
     words: list[WordItem]
     total: int
+    next_cursor: Optional[str] = None  # Pass as cursor to get the next page
+
+
+class WordExampleItem(BaseModel):
+    """Schema for a subtitle line a word occurs in."""
+
+    file: int  # Position of the file in the session
+    start: int  # Milliseconds
+    end: int
+    text: str
+
+
+class WordExamplesResponse(BaseModel):
+    """Schema for word examples response."""
+
+    word: str
+    definition: Optional[str] = None  # From the local dictionaries, when built
+    total: int  # Lines the word occurs in
+    examples: list[WordExampleItem]
 
 
 class WordUpdateRequest(BaseModel):
     """Schema for updating word status."""
 
-    removed_words: list[str]
+    removed_words: list[str] = []  # Mark as "learned"
+    restored_words: list[str] = []  # Back to unknown
+    version: Optional[int] = None  # Increasing batch number, makes retries idempotent
+
+
+class WordUpdateResponse(BaseModel):
+    """Schema for word update response."""
+
+    success: bool = True
+    updated: int
+    version: int
 
 
 class ProcessRequest(BaseModel):
     """Schema for processing subtitle."""
 
-    style: Optional[str] = None  # For .ass files
+    style: Optional[str] = None  # For .ass files; same as styles=[style]
+    styles: Optional[list[str]] = None  # For .ass files, e.g. dialogue and signs together; all styles when empty
 
 
 class ProcessResponse(BaseModel):
-    """Schema for process response."""
+    """Schema for process response, the state of the processing job."""
 
-    pass
+    job_id: str
+    session_id: str
+    status: str  # queued, running, done or failed
+    cues: int = 0
+    tokens: int = 0
+    tokens_per_second: float = 0.0
+    cached: bool = False  # Word counts came from an earlier upload of the same file
+    error: Optional[str] = None
+    stages: dict[str, float] = {}  # Seconds spent in each stage; worker stages add up across workers
 
 
 class FinalizeResponse(BaseModel):
@@ -73,6 +132,30 @@ class KnownWordsResponse(BaseModel):
     count: int
 
 
+class VocabularyImportResponse(BaseModel):
+    """Schema for vocabulary import response."""
+
+    lines: int  # Entries read from the word list
+    words: int  # Words they lemmatized to, summed over batches
+    added: int  # Words that weren't known yet
+
+
+class WordStatsItem(BaseModel):
+    """Schema for a user's statistics of one word over all sessions."""
+
+    word: str
+    total_frequency: int  # Occurrences in all processed sessions
+    session_count: int
+    last_seen_at: Optional[datetime] = None  # When a session with the word was last processed
+    learned: bool
+
+
+class WordStatsListResponse(BaseModel):
+    """Schema for top words response."""
+
+    words: list[WordStatsItem]
+
+
 class UserWordItem(BaseModel):
     """Schema for a user's learned word."""
 
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Set-based statements shared by the services."""
+
+from sqlalchemy import literal, true
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import UserWord
+
+# SQLite builds without a raised SQLITE_MAX_VARIABLE_NUMBER accept at most 999 parameters per statement
+SQL_BATCH_SIZE = 900
+
+
+def chunks(items: list, size: int = SQL_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def insert_from_select(table, columns: list, query):
+    """INSERT ... SELECT into table, to finish with on_conflict_do_nothing() or on_conflict_do_update().
+
+    SQLite reads an ON CONFLICT that follows a SELECT without a WHERE clause as
+    part of its join, so the query gets one; WHERE 1 = 1 is left out when it
+    already has one.
+    """
+    return sqlite_insert(table).from_select(columns, query.where(true()))
+
+
+async def insert_user_words(db: AsyncSession, user_id: str, word_ids) -> int:
+    """Mark the words of the word_ids select as learned for the user; returns how many weren't already."""
+    query = word_ids.add_columns(literal(user_id), literal("learned"))
+    result = await db.execute(
+        insert_from_select(UserWord.__table__, ["word_id", "user_id", "status"], query).on_conflict_do_nothing(
+            index_elements=["user_id", "word_id"]
+        )
+    )
+    return result.rowcount
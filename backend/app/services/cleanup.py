@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Background removal of expired sessions, their words and their uploaded files."""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import delete, or_, select, text
+
+from app.core import metrics
+from app.core.config import settings
+from app.models import database
+from app.services.jobs import process_jobs
+
+logger = logging.getLogger(__name__)
+
+RECLAIMED = metrics.Counter("subscout_sweeper_reclaimed_total", "Rows, files and bytes removed with expired sessions.")
+
+
+async def _pause():
+    # gives live requests the database between two statements of the sweep
+    await asyncio.sleep(settings.SESSION_SWEEP_PAUSE)
+
+
+async def _delete_session_rows(db, model, session_ids: list) -> int:
+    """Delete the rows of model, e.g. the words, of the sessions SESSION_SWEEP_CHUNK_ROWS rows at a time.
+
+    Commits after each chunk.
+    """
+    deleted = 0
+    while True:
+        chunk = select(model.id).where(model.session_id.in_(session_ids))
+        result = await db.execute(
+            delete(model)
+            .where(model.id.in_(chunk.limit(settings.SESSION_SWEEP_CHUNK_ROWS).scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < settings.SESSION_SWEEP_CHUNK_ROWS:
+            return deleted
+        await _pause()
+
+
+def _remove_files(paths: set) -> tuple[int, int]:
+    files = 0
+    size = 0
+    for path in paths:
+        try:
+            file_size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        files += 1
+        size += file_size
+
+    return files, size
+
+
+async def _incremental_vacuum(db) -> int:
+    """Return freed pages to the file system, if the database was created with auto_vacuum=INCREMENTAL."""
+    if settings.SESSION_SWEEP_VACUUM_PAGES <= 0:
+        return 0
+
+    if (await db.execute(text("PRAGMA auto_vacuum"))).scalar() != 2:
+        return 0
+
+    free_before = (await db.execute(text("PRAGMA freelist_count"))).scalar()
+    await db.commit()
+    # the pragma frees a page per step and has no result columns: a cursor stops stepping it after the
+    # first page, executescript() runs it to the end
+    connection = await (await db.connection()).get_raw_connection()
+    await connection.driver_connection.executescript(
+        f"PRAGMA incremental_vacuum({settings.SESSION_SWEEP_VACUUM_PAGES})"
+    )
+    free_after = (await db.execute(text("PRAGMA freelist_count"))).scalar()
+    await db.commit()
+
+    return free_before - free_after
+
+
+async def sweep_expired_sessions() -> dict:
+    """Delete the sessions created more than SESSION_EXPIRY_HOURS ago, with their rows and files.
+
+    Works through SESSION_SWEEP_BATCH sessions at a time, pausing between
+    statements, and skips sessions that are being processed. Returns what was
+    reclaimed.
+    """
+    start = time.perf_counter()
+    report = {"sessions": 0, "session_words": 0, "files": 0, "bytes": 0, "vacuumed_pages": 0}
+    expired_before = datetime.utcnow() - timedelta(hours=settings.SESSION_EXPIRY_HOURS)
+    session = database.Session
+    session_file = database.SessionFile
+
+    async with database.AsyncSessionLocal() as db:
+        skipped = []
+        while True:
+            result = await db.execute(
+                select(session.id, session.subtitle_path)
+                .where(
+                    session.created_at < expired_before,
+                    or_(session.status.is_(None), session.status != "processing"),
+                    session.id.not_in(skipped),
+                )
+                .limit(settings.SESSION_SWEEP_BATCH)
+            )
+            rows = result.tuples().all()
+            if not rows:
+                break
+
+            session_ids = []
+            paths = set()
+            for session_id, subtitle_path in rows:
+                if process_jobs.get_active(session_id) is not None:
+                    skipped.append(session_id)
+                    continue
+                session_ids.append(session_id)
+                paths.add(Path(subtitle_path))
+            if not session_ids:
+                continue
+
+            result = await db.execute(
+                select(session_file.subtitle_path).where(session_file.session_id.in_(session_ids))
+            )
+            paths.update(Path(path) for path in result.scalars().all())
+
+            report["session_words"] += await _delete_session_rows(db, database.SessionWord, session_ids)
+            await _delete_session_rows(db, database.SessionWordCount, session_ids)
+            await db.execute(delete(session_file).where(session_file.session_id.in_(session_ids)))
+            await db.execute(delete(database.SessionCues).where(database.SessionCues.session_id.in_(session_ids)))
+            result = await db.execute(delete(session).where(session.id.in_(session_ids)))
+            await db.commit()
+            report["sessions"] += result.rowcount
+
+            files, size = await asyncio.to_thread(_remove_files, paths)
+            report["files"] += files
+            report["bytes"] += size
+            await _pause()
+
+        if report["sessions"]:
+            report["vacuumed_pages"] = await _incremental_vacuum(db)
+
+    for kind in ("sessions", "session_words", "files", "bytes"):
+        RECLAIMED.inc(report[kind], kind=kind)
+    report["seconds"] = round(time.perf_counter() - start, 3)
+
+    return report
+
+
+async def run_session_sweeper():
+    """Sweep expired sessions every SESSION_SWEEP_INTERVAL seconds until cancelled."""
+    while True:
+        try:
+            report = await sweep_expired_sessions()
+            if report["sessions"]:
+                logger.info("expired sessions removed", extra=report)
+        except Exception:
+            logger.exception("sweeping expired sessions failed")
+
+        await asyncio.sleep(settings.SESSION_SWEEP_INTERVAL)
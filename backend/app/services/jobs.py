@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Background processing jobs and their progress."""
+
+import asyncio
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, List, Optional
+
+from app.core import executor
+from app.core.config import settings
+
+# this server process, as the owner of the sessions it processes
+OWNER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class ProcessJob:
+    """Processing of one session, observable while it runs."""
+
+    def __init__(self, session_id: str, styles: Optional[List[str]]):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.styles = styles
+        self.status = "queued"  # queued -> running -> done | failed
+        self.cues = 0
+        self.tokens = 0
+        self.cached = False
+        self.error = None
+        # stage -> seconds, filled in by the metrics of the pipeline while the job runs
+        self.stages = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def start(self):
+        self.status = "running"
+        self.started_at = time.time()
+        self._notify()
+
+    def advance(self, cues: int, tokens: int):
+        self.cues += cues
+        self.tokens += tokens
+        self._notify()
+
+    def finish(self, error: Optional[str] = None):
+        self.status = "failed" if error else "done"
+        self.error = error
+        self.finished_at = time.time()
+        self._notify()
+
+    async def wait_changed(self, timeout: float):
+        """Wait until the job changes, for at most timeout seconds."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def to_dict(self) -> dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+
+        return {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "cues": self.cues,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens / elapsed if elapsed else 0.0,
+            "cached": self.cached,
+            "error": self.error,
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+        }
+
+    def _notify(self):
+        # wake the current waiters; later waiters wait for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class ProcessJobQueue:
+    """Runs processing jobs in the background, at most one per session.
+
+    As many jobs run at a time as the executor has workers, each spreading its
+    batches over all of them; up to WORKER_QUEUE_SIZE more wait for their turn.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._active = {}
+        self._slots = None
+        self._tasks = set()
+
+    def get(self, job_id: str) -> Optional[ProcessJob]:
+        return self._jobs.get(job_id)
+
+    def get_active(self, session_id: str) -> Optional[ProcessJob]:
+        return self._active.get(session_id)
+
+    def active_session_ids(self) -> List[str]:
+        """The sessions of the jobs queued or running in this process."""
+        return list(self._active)
+
+    def check_capacity(self):
+        queued = sum(1 for job in self._active.values() if job.status == "queued")
+        if queued >= settings.WORKER_QUEUE_SIZE:
+            raise executor.ExecutorBusyError(f"{queued} jobs are already queued")
+
+    def submit(
+        self, session_id: str, styles: Optional[List[str]], run: Callable[[ProcessJob], Awaitable[None]]
+    ) -> ProcessJob:
+        """Queue run(job) for the session. run reports progress and failures through the job."""
+        self._prune()
+        self.check_capacity()
+
+        job = ProcessJob(session_id, styles)
+        self._jobs[job.id] = job
+        self._active[session_id] = job
+
+        task = asyncio.create_task(self._run(job, run))
+        # the event loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return job
+
+    async def _run(self, job: ProcessJob, run: Callable[[ProcessJob], Awaitable[None]]):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(executor.parallelism())
+
+        try:
+            async with self._slots:
+                job.start()
+                await run(job)
+        finally:
+            if not job.done:
+                job.finish(error="Processing was interrupted")
+            self._active.pop(job.session_id, None)
+
+    def _prune(self):
+        expired = time.time() - settings.JOB_RETENTION_SECONDS
+        for job_id, job in list(self._jobs.items()):
+            if job.done and job.finished_at < expired:
+                del self._jobs[job_id]
+
+
+process_jobs = ProcessJobQueue()
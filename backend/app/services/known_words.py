@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""In-process index of the words each user has learned."""
+
+from typing import Iterable, Set
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.database import UserWord, Word
+
+
+class KnownWordIndex:
+    """Learned words per user_id, loaded once and then updated incrementally.
+
+    Each lookup compares the count and highest id of the user's rows with the
+    values seen at load time, so rows written by another worker process trigger
+    a reload instead of being missed.
+    """
+
+    def __init__(self):
+        self._words = {}
+        self._versions = {}
+
+    async def get(self, db: AsyncSession, user_id: str) -> Set[str]:
+        """Return the user's learned words. The set is shared: don't modify it."""
+        version = await self.version(db, user_id)
+        if self._versions.get(user_id) != version:
+            result = await db.execute(
+                select(Word.word)
+                .join(UserWord, UserWord.word_id == Word.id)
+                .where(UserWord.user_id == user_id, UserWord.status == "learned")
+            )
+            self._words[user_id] = set(result.scalars().all())
+            self._versions[user_id] = version
+
+        return self._words[user_id]
+
+    def add(self, user_id: str, words: Iterable[str], before: tuple, after: tuple):
+        """Record words that were just committed as learned for the user.
+
+        before and after are the version() of the user's rows read in the
+        transaction that inserted the words, before and after the insert. Unless
+        the index was up to date with before, other processes inserted words it
+        hasn't seen, and the next get() reloads.
+        """
+        if user_id not in self._words:
+            return
+
+        if self._versions.get(user_id) != before:
+            self.invalidate(user_id)
+            return
+
+        self._words[user_id].update(words)
+        self._versions[user_id] = after
+
+    def invalidate(self, user_id: str):
+        self._words.pop(user_id, None)
+        self._versions.pop(user_id, None)
+
+    async def version(self, db: AsyncSession, user_id: str) -> tuple:
+        result = await db.execute(
+            select(func.count(UserWord.id), func.max(UserWord.id)).where(
+                UserWord.user_id == user_id, UserWord.status == "learned"
+            )
+        )
+        return tuple(result.one())
+
+
+known_word_index = KnownWordIndex()
@@ -1,16 +1,295 @@
 #!/usr/bin/env python3
 
-from typing import Set, List, Optional
+import asyncio
+import base64
+import bisect
+import hashlib
+import json
+import logging
+import uuid
+import zipfile
+from array import array
+from datetime import datetime, timedelta
+from collections import Counter
+from itertools import islice
+from typing import AsyncIterator, Dict, Iterator, List, Optional
 from pathlib import Path
 
-from sqlalchemy import select
+from sqlalchemy import and_, case, delete, exists, func, insert, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, UploadFile
 
 from app.models.database import UserWord, Word
 from app.core.config import settings
-from app.core import subtitle
-from app.models import database, schemas
+from app.core import executor, lang, lexicon, metrics, occurrences, subtitle
+from app.models import database
+from app.services.jobs import OWNER_ID, ProcessJob, process_jobs
+from app.services import bulk, word_stats
+from app.services.known_words import known_word_index
+
+logger = logging.getLogger(__name__)
+
+def _encode_cursor(position: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> list:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if not isinstance(position, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    return position
+
+
+def _iter_cue_batches(files: List[tuple]) -> Iterator[tuple]:
+    """Yield (file index, cues) batches of up to PROCESS_BATCH_CUES cues, file after file.
+
+    Every cue is read, whatever the styles asked for: each style gets counted in the same pass.
+    """
+    for index, path in files:
+        cues = subtitle.iter_cues(path)
+        while batch := list(islice(cues, settings.PROCESS_BATCH_CUES)):
+            yield index, batch
+
+
+class _FileAnalysis:
+    """What the batches of one file found so far, in whatever order they finish."""
+
+    def __init__(self):
+        self.cues = array("I")
+        self.cue_styles = array("I")
+        self.styles = {}
+        self.style_counts = {}
+        self.postings = {}
+
+    def add_cues(self, cues: list) -> int:
+        """Number the cues of the next batch of the file; returns the number of the first one."""
+        first = len(self.cue_styles)
+        for cue in cues:
+            self.cues.extend((cue.start, cue.end, cue.offset, cue.length))
+            self.cue_styles.append(self.styles.setdefault(cue.style, len(self.styles)))
+        return first
+
+    def add_words(self, first: int, style_counts: dict, postings: dict):
+        for style, word_counts in style_counts.items():
+            self.style_counts.setdefault(style, Counter()).update(word_counts)
+        for word, numbers in postings.items():
+            self.postings.setdefault(word, []).extend(first + number for number in numbers)
+
+    def add_styles(self, styles):
+        """Styles of the file that no cue uses."""
+        for style in styles:
+            self.styles.setdefault(style, len(self.styles))
+
+    def file_index(self) -> occurrences.FileIndex:
+        return occurrences.FileIndex(
+            self.cues,
+            self.cue_styles,
+            list(self.styles),
+            {word: array("I", sorted(numbers)) for word, numbers in self.postings.items()},
+        )
+
+
+def _session_postings(file_indexes: List[tuple], words, styles: Optional[List[str]]) -> tuple[dict, list]:
+    """Collect the postings of words over the (path, occurrences.FileIndex) files of a session.
+
+    Cues are numbered across the files, one file after the other, and only
+    those of the given ASS styles count. Returns word -> encoded postings and
+    the number of the first cue of each file.
+    """
+    postings = {word: array("I") for word in words}
+    first_cues = []
+    first = 0
+    for path, file_index in file_indexes:
+        first_cues.append(first)
+        selected = file_index.cues_of_styles(styles) if styles and subtitle.is_ass(path) else None
+        for word, word_postings in postings.items():
+            numbers = file_index.postings.get(word)
+            if numbers is None:
+                continue
+            if selected is not None:
+                word_postings.extend(first + number for number in numbers if number in selected)
+            elif first:
+                word_postings.extend(first + number for number in numbers)
+            else:
+                word_postings.extend(numbers)
+        first += file_index.cue_count()
+
+    return {word: occurrences.to_bytes(word_postings) for word, word_postings in postings.items()}, first_cues
+
+
+def _active_job(session_id: str, styles: Optional[List[str]]) -> Optional[ProcessJob]:
+    """The job processing the session in this server process, if it counts the same styles."""
+    job = process_jobs.get_active(session_id)
+    if job is not None and job.styles != styles:
+        raise HTTPException(status_code=409, detail="Session is already being processed with other styles")
+
+    return job
+
+
+def _check_styles(styles: List[str], file_indexes: List[occurrences.FileIndex]):
+    """Reject styles none of the ASS files of a session has; each file counts the styles it lacks as empty."""
+    if not file_indexes:
+        return
+
+    available = set().union(*(file_index.styles for file_index in file_indexes))
+    for style in styles:
+        if style not in available:
+            available = sorted(style for style in available if style is not None)
+            raise HTTPException(status_code=400, detail=f"Style '{style}' not found. Available styles: {available}")
+
+
+async def _run_process_job(job: ProcessJob):
+    async with database.AsyncSessionLocal() as db:
+        try:
+            with metrics.collect_timings(job.stages):
+                await SessionService(db).process_file(job.session_id, job.styles, job)
+        except Exception as e:
+            logger.exception("processing session %s failed", job.session_id)
+            await db.rollback()
+            await db.execute(
+                update(database.Session).where(database.Session.id == job.session_id).values(status="failed")
+            )
+            await db.commit()
+            job.finish(error=e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__)
+            return
+
+    job.finish()
+    logger.info(
+        "session processed",
+        extra={
+            "session_id": job.session_id,
+            "cues": job.cues,
+            "tokens": job.tokens,
+            "cached": job.cached,
+            "stages": {stage: round(seconds, 4) for stage, seconds in job.stages.items()},
+        },
+    )
+
+
+async def fail_interrupted_sessions() -> int:
+    """Mark the sessions in processing whose owner stopped sending heartbeats as failed.
+
+    Sessions other server processes are processing stay as they are. Returns
+    the number of sessions failed.
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    session = database.Session
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(session)
+            .where(
+                session.status == "processing",
+                or_(session.heartbeat_at.is_(None), session.heartbeat_at < stale_before),
+                # the jobs of this process are alive, however late their heartbeat
+                session.id.not_in(process_jobs.active_session_ids()),
+            )
+            .values(status="failed")
+        )
+        await db.commit()
+
+    return result.rowcount
+
+
+async def run_job_heartbeat():
+    """Every JOB_HEARTBEAT_INTERVAL seconds, until cancelled: record that this process is still processing
+    its sessions, and fail those other processes left behind."""
+    while True:
+        try:
+            session_ids = process_jobs.active_session_ids()
+            if session_ids:
+                async with database.AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(database.Session)
+                        .where(database.Session.id.in_(session_ids), database.Session.processing_owner == OWNER_ID)
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    await db.commit()
+
+            failed = await fail_interrupted_sessions()
+            if failed:
+                logger.warning("sessions of a stopped server process marked as failed", extra={"sessions": failed})
+        except Exception:
+            logger.exception("recording the job heartbeat failed")
+
+        await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+
+
+def _bump_revision(session_id: str):
+    """The statement that marks a change of the session, in SQL so that concurrent writers each count."""
+    return (
+        update(database.Session)
+        .where(database.Session.id == session_id)
+        .values(revision=database.Session.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=400, detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
+    )
+
+
+def _check_batch_size(count: int):
+    if count > settings.MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files. Maximum: {settings.MAX_BATCH_FILES}")
+
+
+async def _read_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+async def _read_zip_member(member) -> AsyncIterator[bytes]:
+    # decompressing runs in a thread, keeping the event loop free for other requests
+    while chunk := await asyncio.to_thread(member.read, settings.UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+async def _receive(
+    filename: str, chunks: AsyncIterator[bytes], session_id: str = None, position: int = None
+) -> dict:
+    """Stream one subtitle to disk, rejecting it as soon as it exceeds MAX_UPLOAD_SIZE."""
+    upload = subtitle.Upload(filename, session_id, position)
+    try:
+        with metrics.stage("receive"):
+            async for chunk in chunks:
+                if upload.size + len(chunk) > settings.MAX_UPLOAD_SIZE:
+                    raise _file_too_large()
+                upload.write(chunk)
+
+            uinfo = upload.finish()
+
+        if uinfo["language"] not in lang.LANGUAGE.values():
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported language ({uinfo['language']}) in {filename}. "
+                f"Supported: {', '.join(lang.LANGUAGE.values())}",
+            )
+    except BaseException:
+        upload.abort()
+        raise
+
+    # the name, not the content: a subtitle is far too large for a log line
+    logger.info(
+        "subtitle received",
+        extra={
+            "session_id": uinfo["session_id"],
+            "upload_name": filename,
+            "size": upload.size,
+            "encoding": uinfo["encoding"],
+            "language": uinfo["language"],
+        },
+    )
+
+    uinfo["filename"] = filename
+    return uinfo
 
 
 class SessionService:
@@ -22,24 +301,23 @@ class SessionService:
         if file_ext not in settings.ALLOWED_EXTENSIONS:
             raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed: {settings.ALLOWED_EXTENSIONS}")
 
-        content = await file.read()
+        if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+            raise _file_too_large()
 
-        if len(content) > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(
-                status_code=400, detail=f"File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB"
-            )
+        uinfo = await _receive(file.filename, _read_upload(file))
 
-        uinfo = subtitle.upload(file.filename, content)
         session_id = uinfo["session_id"]
         language = uinfo["language"]
         styles = uinfo["styles"]
         filepath = uinfo["filepath"]
+        content_hash = uinfo["content_hash"]
 
         new_session = database.Session(
             id=session_id,
             language=language,
             subtitle_filename=file.filename,
             subtitle_path=str(filepath),
+            content_hash=content_hash,
             status="uploaded",
         )
 
@@ -54,142 +332,626 @@ class SessionService:
             "styles": styles,
         }
 
-    async def process_file(self, session_id: str, style: str) -> Optional[Word]:
-        result = await self.db.execute(select(database.Session).where(database.Session.id == session_id))
-        session = result.scalar_one_or_none()
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
+    async def upload_batch(self, files: List[UploadFile]) -> dict:
+        """Create one session from several subtitles, e.g. a season, given as files and/or zip archives."""
+        session_id = str(uuid.uuid4())
+        uinfos = []
+
+        try:
+            for file in files:
+                file_ext = Path(file.filename).suffix.lower()
+                if file_ext == ".zip":
+                    await self._receive_zip(file, session_id, uinfos)
+                elif file_ext in settings.ALLOWED_EXTENSIONS:
+                    _check_batch_size(len(uinfos) + 1)
+                    uinfos.append(await _receive(file.filename, _read_upload(file), session_id, len(uinfos)))
+                else:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Invalid file type: {file.filename}. Allowed: {settings.ALLOWED_EXTENSIONS} or .zip",
+                    )
+
+            if not uinfos:
+                raise HTTPException(status_code=400, detail="No subtitle files found")
+
+            languages = {uinfo["language"] for uinfo in uinfos}
+            if len(languages) > 1:
+                raise HTTPException(status_code=400, detail=f"Files are in different languages: {sorted(languages)}")
+        except BaseException:
+            for uinfo in uinfos:
+                uinfo["filepath"].unlink(missing_ok=True)
+            raise
+
+        language = languages.pop()
+        filename = files[0].filename if len(files) == 1 else f"{uinfos[0]['filename']} (+{len(uinfos) - 1} more)"
+        styles = None
+        # any of them can be chosen: the files that lack a style count it as empty
+        if any(uinfo["styles"] is not None for uinfo in uinfos):
+            styles = list(dict.fromkeys(style for uinfo in uinfos for style in uinfo["styles"] or []))
+
+        self.db.add(
+            database.Session(
+                id=session_id,
+                language=language,
+                subtitle_filename=filename,
+                subtitle_path=str(uinfos[0]["filepath"]),
+                status="uploaded",
+            )
+        )
+        self.db.add_all(
+            database.SessionFile(
+                session_id=session_id,
+                position=position,
+                filename=uinfo["filename"],
+                subtitle_path=str(uinfo["filepath"]),
+                content_hash=uinfo["content_hash"],
+            )
+            for position, uinfo in enumerate(uinfos)
+        )
+        await self.db.commit()
+
+        return {
+            "id": session_id,
+            "language": language,
+            "filename": filename,
+            "status": "uploaded",
+            "styles": styles,
+            "files": [uinfo["filename"] for uinfo in uinfos],
+        }
+
+    async def _receive_zip(self, file: UploadFile, session_id: str, uinfos: List[dict]):
+        try:
+            # reads the central directory, from the end of a possibly large spooled file
+            archive = await asyncio.to_thread(zipfile.ZipFile, file.file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail=f"Invalid zip archive: {file.filename}")
+
+        with archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                filename = Path(info.filename).name
+                if info.is_dir() or filename.startswith("."):
+                    continue
+                if Path(filename).suffix.lower() not in settings.ALLOWED_EXTENSIONS:
+                    continue
+
+                _check_batch_size(len(uinfos) + 1)
+                member = await asyncio.to_thread(archive.open, info)
+                with member:
+                    uinfos.append(await _receive(filename, _read_zip_member(member), session_id, len(uinfos)))
+
+    async def get_files(self, session_id: str) -> List[database.SessionFile]:
+        await self.get_session(session_id)
+
+        result = await self.db.execute(
+            select(database.SessionFile)
+            .where(database.SessionFile.session_id == session_id)
+            .order_by(database.SessionFile.position)
+        )
+        return list(result.scalars().all())
 
-        subtitle_path = Path(session.subtitle_path)
-        current_words = subtitle.get_words_from_subtitle(subtitle_path, style)
-        unknown_words = await self._filter_known_words(current_words)
+    async def start_processing(self, session_id: str, styles: Optional[List[str]]) -> ProcessJob:
+        """Queue the processing of a session, or return the job that is already processing it.
 
-        for idx, word in enumerate(unknown_words):
-            frequency = current_words.count(word)
+        styles selects the ASS styles whose words are counted, all of them when None or empty.
+        """
+        styles = list(dict.fromkeys(styles)) if styles else None
+        job = _active_job(session_id, styles)
+        if job is not None:
+            return job
 
-            result = await self.db.execute(select(database.Word).where(database.Word.word == word))
-            word_obj = result.scalar_one_or_none()
-            if word_obj is None:
-                word_obj = database.Word(word=word)
-                self.db.add(word_obj)
-                await self.db.flush()
+        session = await self.get_session(session_id)
+        previous_status = session.status
 
-            session_word = database.SessionWord(
-                session_id=session_id, word_id=word_obj.id, frequency=frequency, is_removed=False
+        # claimed in the database as well, so that other worker processes don't start the same session
+        result = await self.db.execute(
+            update(database.Session)
+            .where(database.Session.id == session_id, database.Session.status != "processing")
+            .values(status="processing", processing_owner=OWNER_ID, heartbeat_at=datetime.utcnow())
+        )
+        await self.db.commit()
+        if result.rowcount == 0:
+            # a request for the same session may have claimed it while this one awaited the database
+            job = _active_job(session_id, styles)
+            if job is not None:
+                return job
+            raise HTTPException(status_code=409, detail="Session is already being processed")
+
+        try:
+            return process_jobs.submit(session_id, styles, _run_process_job)
+        except executor.ExecutorBusyError:
+            await self.db.execute(
+                update(database.Session).where(database.Session.id == session_id).values(status=previous_status)
             )
-            self.db.add(session_word)
+            await self.db.commit()
+            raise HTTPException(status_code=503, detail="Too many files are being processed, please retry later")
+
+    async def process_file(self, session_id: str, styles: Optional[List[str]], job: Optional[ProcessJob] = None):
+        session = await self.get_session(session_id)
+
+        # a batch session counts each of its files, a single upload just its own
+        result = await self.db.execute(
+            select(database.SessionFile)
+            .where(database.SessionFile.session_id == session_id)
+            .order_by(database.SessionFile.position)
+        )
+        files = list(result.scalars().all())
+        sources = [(Path(file.subtitle_path), file.content_hash) for file in files]
+        if not sources:
+            sources = [(Path(session.subtitle_path), session.content_hash)]
+
+        analyses = await self._count_words(sources, session.language, styles, job)
+        if styles:
+            ass_indexes = [file_index for (path, _), (_, file_index) in zip(sources, analyses) if subtitle.is_ass(path)]
+            _check_styles(styles, ass_indexes)
+        file_counts = [word_counts for word_counts, _ in analyses]
+        word_counts = file_counts[0] if len(file_counts) == 1 else subtitle.merge_counts(file_counts)
+
+        user_id = settings.DEFAULT_USER
+
+        # replaces the words of an earlier run instead of adding duplicates
+        with metrics.stage("db_write"):
+            await word_stats.remove_session(self.db, user_id, session_id)
+        await self.db.execute(delete(database.SessionWord).where(database.SessionWord.session_id == session_id))
+        await self.db.execute(
+            delete(database.SessionWordCount).where(database.SessionWordCount.session_id == session_id)
+        )
+        await self.db.execute(delete(database.SessionCues).where(database.SessionCues.session_id == session_id))
+        if settings.KNOWN_WORDS_FILTER == "sql":
+            # the anti-join drops the learned words while resolving ids, nothing is loaded into Python
+            with metrics.stage("db_write"):
+                word_ids = await self._upsert_words(list(word_counts), unknown_for=user_id)
+        else:
+            with metrics.stage("filter"):
+                unknown_words = await self._filter_known_words(word_counts, user_id)
+            with metrics.stage("db_write"):
+                word_ids = await self._upsert_words(unknown_words)
+
+        if settings.ENRICH_DEFINITIONS:
+            with metrics.stage("enrich"):
+                await self._enrich_words(word_ids, session.language)
+
+        with metrics.stage("occurrences"):
+            file_indexes = [(path, file_index) for (path, _), (_, file_index) in zip(sources, analyses)]
+            postings, first_cues = _session_postings(file_indexes, word_ids, styles)
+
+        session_words = [
+            {
+                "session_id": session_id,
+                "word_id": word_id,
+                "frequency": word_counts[word],
+                "is_removed": False,
+                "postings": postings[word],
+            }
+            for word, word_id in word_ids.items()
+        ]
+        session_cues = [
+            {
+                "session_id": session_id,
+                "position": position,
+                "first_cue": first_cue,
+                "subtitle_path": str(path),
+                "cues": occurrences.to_bytes(file_index.cues),
+            }
+            for position, ((path, file_index), first_cue) in enumerate(zip(file_indexes, first_cues))
+            # no postings point into an empty file, and its first cue number is the next file's
+            if file_index.cue_count()
+        ]
+        with metrics.stage("db_write"):
+            # the statistics count the known words too, the ones left out of word_ids
+            known_ids = await self._upsert_words([word for word in word_counts if word not in word_ids])
+            counted_ids = {**known_ids, **word_ids}
+            if counted_ids:
+                await self.db.execute(
+                    insert(database.SessionWordCount),
+                    [
+                        {"session_id": session_id, "word_id": word_id, "frequency": word_counts[word]}
+                        for word, word_id in counted_ids.items()
+                    ],
+                )
+                await word_stats.add_session(self.db, user_id, session_id)
+            if session_words:
+                await self.db.execute(insert(database.SessionWord), session_words)
+            if session_cues:
+                await self.db.execute(insert(database.SessionCues), session_cues)
+
+        for file, counts in zip(files, file_counts):
+            file.token_count = sum(counts.values())
+            file.word_count = len(counts)
+            file.unknown_count = sum(1 for word in counts if word in word_ids)
 
         session.status = "processed"
+        # the word list changed, which invalidates its entity tags
+        await self.db.execute(_bump_revision(session_id))
         await self.db.commit()
 
         return
 
-    async def get_words(self, session_id: str) -> Optional[Word]:
+    async def get_session(self, session_id: str) -> database.Session:
         result = await self.db.execute(select(database.Session).where(database.Session.id == session_id))
         session = result.scalar_one_or_none()
-
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
 
+        return session
+
+    def get_words_etag(self, session: database.Session, *params) -> str:
+        """Entity tag of a word list page, derived from the session state instead of the rows.
+
+        It changes with the revision, which every write raises, not with
+        words_version: clients choose the versions of their batches.
+        """
+        key = json.dumps([session.id, session.status, session.revision, *params], default=str)
+        return f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+
+    async def get_words(
+        self,
+        session_id: str,
+        order: str = "frequency",
+        removed: Optional[bool] = None,
+        prefix: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> dict:
+        """Return one page of (word, frequency, is_removed) rows in keyset order.
+
+        order is "frequency" (descending, ties alphabetical) or "alphabetical". The
+        returned next_cursor continues after the last row, or is None on the last page.
+        """
+        session_word = database.SessionWord
+        filters = [session_word.session_id == session_id]
+        if removed is not None:
+            filters.append(session_word.is_removed.is_(removed))
+        if prefix:
+            filters.append(Word.word.startswith(prefix, autoescape=True))
+
         result = await self.db.execute(
-            select(database.SessionWord, database.Word)
-            .join(database.Word, database.SessionWord.word_id == database.Word.id)
-            .where(database.SessionWord.session_id == session_id)
+            select(func.count(session_word.id)).join(Word, session_word.word_id == Word.id).where(*filters)
         )
-        rows = result.all()
+        total = result.scalar_one()
 
-        word_items = [
-            schemas.WordItem(word=word.word, frequency=session_word.frequency, is_removed=session_word.is_removed)
-            for session_word, word in rows
-        ]
+        query = (
+            select(Word.word, session_word.frequency, session_word.is_removed)
+            .join(Word, session_word.word_id == Word.id)
+            .where(*filters)
+        )
+        if order == "frequency":
+            query = query.order_by(session_word.frequency.desc(), Word.word)
+        else:
+            query = query.order_by(Word.word)
+
+        if cursor is not None:
+            position = _decode_cursor(cursor)
+            if order == "frequency" and len(position) == 2:
+                frequency, word = position
+                query = query.where(
+                    or_(
+                        session_word.frequency < frequency,
+                        and_(session_word.frequency == frequency, Word.word > word),
+                    )
+                )
+            elif order != "frequency" and len(position) == 1:
+                query = query.where(Word.word > position[0])
+            else:
+                raise HTTPException(status_code=400, detail="Cursor does not match the requested order")
+
+        if limit is not None:
+            # one extra row tells whether there is a next page
+            query = query.limit(limit + 1)
+
+        result = await self.db.execute(query)
+        words = result.tuples().all()
+
+        next_cursor = None
+        if limit is not None and len(words) > limit:
+            words = words[:limit]
+            word, frequency, _ = words[-1]
+            next_cursor = _encode_cursor([frequency, word] if order == "frequency" else [word])
+
+        return {"words": words, "total": total, "next_cursor": next_cursor}
+
+    async def get_examples(self, session_id: str, word: str, limit: int = 5) -> dict:
+        """Return the first limit cues the word occurs in, read from the subtitle files at their recorded offsets.
+
+        Needs only the postings of the word and the cue tables of the files those
+        cues are in; nothing is parsed or tokenized again.
+        """
+        session_word = database.SessionWord
+        result = await self.db.execute(
+            select(session_word.postings, Word.definition_en)
+            .join(Word, session_word.word_id == Word.id)
+            .where(session_word.session_id == session_id, Word.word == word)
+        )
+        row = result.one_or_none()
+        if row is None:
+            await self.get_session(session_id)
+            raise HTTPException(status_code=404, detail="Word not found in session")
+
+        # sessions processed before postings were recorded have none
+        postings = occurrences.from_bytes(row.postings or b"")
+        numbers = postings[:limit]
+
+        session_cues = database.SessionCues
+        result = await self.db.execute(
+            select(session_cues.id, session_cues.first_cue)
+            .where(session_cues.session_id == session_id)
+            .order_by(session_cues.first_cue)
+        )
+        tables = result.tuples().all()
+        first_cues = [first_cue for _, first_cue in tables]
+
+        # table id -> (number, cue number in its file) of the examples in that file
+        by_table = {}
+        for number in numbers:
+            table = bisect.bisect_right(first_cues, number) - 1
+            if table >= 0:
+                table_id, first_cue = tables[table]
+                by_table.setdefault(table_id, []).append((number, number - first_cue))
+
+        examples = {}
+        for table_id, cues in by_table.items():
+            result = await self.db.execute(
+                select(session_cues.position, session_cues.subtitle_path, session_cues.cues).where(
+                    session_cues.id == table_id
+                )
+            )
+            position, subtitle_path, table = result.one()
+            fields = [occurrences.read_cue(table, cue) for _, cue in cues]
+            try:
+                texts = await asyncio.to_thread(
+                    subtitle.read_cue_texts, Path(subtitle_path), [(offset, length) for _, _, offset, length in fields]
+                )
+            except FileNotFoundError:
+                raise HTTPException(status_code=410, detail="The subtitle file is no longer available")
+            for (number, _), (start, end, _, _), text in zip(cues, fields, texts):
+                examples[number] = {"file": position, "start": start, "end": end, "text": text}
+
+        return {
+            "word": word,
+            "definition": row.definition_en,
+            "total": len(postings),
+            "examples": [examples[number] for number in numbers if number in examples],
+        }
 
-        return word_items
+    async def update_words(
+        self, session_id: str, removed_words: List[str], restored_words: List[str] = (), version: Optional[int] = None
+    ) -> dict:
+        """Mark words as removed (learned) or restore them, as of the given batch version.
 
-    async def update_words(self, session_id: str, removed_words) -> Optional[Word]:
+        Each session word remembers the version of the last batch that changed it and
+        ignores batches with a version that isn't higher, so a batch sent twice or
+        arriving after a newer one changes nothing. Without a version the batch is
+        applied after everything received so far.
+        """
         result = await self.db.execute(select(database.Session).where(database.Session.id == session_id))
         session = result.scalar_one_or_none()
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        result = await self.db.execute(
-            select(database.SessionWord, database.Word)
-            .join(database.Word, database.SessionWord.word_id == database.Word.id)
-            .where(database.SessionWord.session_id == session_id)
-        )
-        rows = result.all()
-
-        for session_word, word in rows:
-            if word.word in removed_words:
-                session_word.is_removed = True
+        removed_words = set(removed_words)
+        restored_words = set(restored_words)
+        if removed_words & restored_words:
+            raise HTTPException(status_code=400, detail="A word cannot be removed and restored in the same batch")
+
+        if version is None:
+            version = session.words_version + 1
+
+        updated = 0
+        for is_removed, words in ((True, removed_words), (False, restored_words)):
+            for chunk in bulk.chunks(list(words)):
+                result = await self.db.execute(
+                    update(database.SessionWord)
+                    .where(
+                        database.SessionWord.session_id == session_id,
+                        database.SessionWord.version < version,
+                        database.SessionWord.word_id.in_(select(Word.id).where(Word.word.in_(chunk))),
+                    )
+                    .values(is_removed=is_removed, version=version)
+                    .execution_options(synchronize_session=False)
+                )
+                updated += result.rowcount
 
+        session.words_version = max(session.words_version, version)
+        await self.db.execute(_bump_revision(session_id))
         await self.db.commit()
 
-        return
+        return {"updated": updated, "version": session.words_version}
 
-    async def finalize(self, session_id: str) -> Optional[Word]:
+    async def finalize(self, session_id: str, top_n: int = 20) -> dict:
         result = await self.db.execute(select(database.Session).where(database.Session.id == session_id))
         session = result.scalar_one_or_none()
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        result = await self.db.execute(
-            select(database.SessionWord, database.Word)
-            .join(database.Word, database.SessionWord.word_id == database.Word.id)
-            .where(database.SessionWord.session_id == session_id)
+        user_id = settings.DEFAULT_USER
+        learned = (database.SessionWord.session_id == session_id, database.SessionWord.is_removed.is_(True))
+        known_before = await known_word_index.version(self.db, user_id)
+
+        inserted_count = await bulk.insert_user_words(
+            self.db, user_id, select(database.SessionWord.word_id).where(*learned)
         )
-        rows = result.all()
+        await word_stats.mark_learned(self.db, user_id, select(database.SessionWord.word_id).where(*learned))
 
-        learned_words = set()
-        learned_word_ids = []
-        unknown_words = []
+        result = await self.db.execute(
+            select(Word.word)
+            .join(database.SessionWord, database.SessionWord.word_id == Word.id)
+            .where(database.SessionWord.session_id == session_id, database.SessionWord.is_removed.is_(False))
+            .order_by(database.SessionWord.frequency.desc())
+            .limit(top_n)
+        )
+        top_words = list(result.scalars().all())
 
-        for session_word, word in rows:
-            if session_word.is_removed:
-                learned_words.add(word.word)
-                learned_word_ids.append(word.id)
-            else:
-                unknown_words.append((word.word, session_word.frequency))
+        result = await self.db.execute(
+            select(
+                func.count(database.SessionWord.id),
+                func.count(case((database.SessionWord.is_removed.is_(True), 1))),
+            ).where(database.SessionWord.session_id == session_id)
+        )
+        total_count, learned_count = result.one()
 
-        user_id = settings.DEFAULT_USER
-        for word_id in learned_word_ids:
+        learned_words = []
+        if inserted_count:
             result = await self.db.execute(
-                select(database.UserWord).where(
-                    database.UserWord.user_id == user_id, database.UserWord.word_id == word_id
-                )
+                select(Word.word).join(database.SessionWord, database.SessionWord.word_id == Word.id).where(*learned)
             )
-            existing = result.scalar_one_or_none()
-
-            if existing is None:
-                user_word = database.UserWord(user_id=user_id, word_id=word_id, status="learned")
-                self.db.add(user_word)
-
-        unknown_words.sort(key=lambda x: x[1], reverse=True)
-        top_words = [w[0] for w in unknown_words[:20]]
+            learned_words = result.scalars().all()
+        known_after = await known_word_index.version(self.db, user_id)
 
         session.status = "finalized"
+        await self.db.execute(_bump_revision(session_id))
         await self.db.commit()
 
+        if inserted_count:
+            known_word_index.add(user_id, learned_words, known_before, known_after)
+
         return {
             "top_words": top_words,
-            "learned_words": learned_words,
-            "rows": rows,
+            "learned_count": learned_count,
+            "total_count": total_count,
         }
 
-    async def _load_all_words(self) -> Set[str]:
-        result = await self.db.execute(
-            select(Word.word)
-            .join(UserWord, UserWord.word_id == Word.id)
-            .where(UserWord.user_id == settings.DEFAULT_USER, UserWord.status == "learned")
+    async def _count_words(
+        self, sources: List[tuple], language: str, styles: Optional[List[str]], job: Optional[ProcessJob] = None
+    ) -> List[tuple]:
+        """Count the words of the given styles (every cue when None) in each (path, content hash) source.
+
+        Returns (word counts, occurrences.FileIndex) per source. Sources analysed
+        before come from the analysis cache, which keeps each ASS style apart. The
+        cues of the others are sent to the executor in batches, file after file,
+        keeping every worker busy, and counted per style in one pass.
+        """
+        results = []
+        missing = []
+        with metrics.stage("analysis_cache"):
+            for index, (path, content_hash) in enumerate(sources):
+                # the index tells which of the styles the file has; the others count as empty
+                file_index = subtitle.get_cached_index(content_hash)
+                word_counts = None
+                if file_index is not None and styles and subtitle.is_ass(path):
+                    present = [style for style in styles if style in file_index.styles]
+                    word_counts = subtitle.get_cached_words(content_hash, present) if present else {}
+                elif file_index is not None:
+                    word_counts = subtitle.get_cached_words(content_hash)
+                if word_counts is None:
+                    missing.append(index)
+                results.append((word_counts, file_index))
+        metrics.record_cache("analysis", len(sources) - len(missing), len(missing))
+
+        if job is not None:
+            job.cached = not missing
+
+        analyses = {index: _FileAnalysis() for index in missing}
+        batches = _iter_cue_batches([(index, sources[index][0]) for index in missing])
+        pending = {}
+        exhausted = False
+
+        try:
+            while True:
+                while not exhausted and len(pending) < executor.parallelism():
+                    with metrics.stage("parse"):
+                        batch = await asyncio.to_thread(next, batches, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    index, cues = batch
+                    first = analyses[index].add_cues(cues)
+                    texts = [cue.text for cue in cues]
+                    groups = [cue.style for cue in cues]
+                    task = asyncio.ensure_future(executor.submit(lang.index_words, language, texts, groups))
+                    pending[task] = (index, len(cues), first)
+
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index, cue_count, first = pending.pop(task)
+                    (batch_counts, postings), report = task.result()
+                    analyses[index].add_words(first, batch_counts, postings)
+                    token_count = sum(sum(word_counts.values()) for word_counts in batch_counts.values())
+
+                    # the stages ran in a worker, possibly next to other batches: their sum can exceed the wall time
+                    for stage, seconds in report["stages"].items():
+                        metrics.record_stage(stage, seconds)
+                    for cache, lookups in report["caches"].items():
+                        metrics.record_cache(cache, lookups["hits"], lookups["misses"])
+                    metrics.CUES.inc(cue_count, language=language)
+                    metrics.TOKENS.inc(token_count, language=language)
+
+                    if job is not None:
+                        job.advance(cue_count, token_count)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        for index in missing:
+            path, content_hash = sources[index]
+            analysis = analyses[index]
+            counts = {style: dict(word_counts.most_common()) for style, word_counts in analysis.style_counts.items()}
+            with metrics.stage("analysis_cache"):
+                word_counts = await asyncio.to_thread(subtitle.finish_analysis, path, counts, content_hash, styles)
+                # finish_analysis added the styles the file declares without using them
+                analysis.add_styles(counts)
+                file_index = analysis.file_index()
+                await asyncio.to_thread(subtitle.cache_index, file_index, content_hash)
+            results[index] = (word_counts, file_index)
+
+        return results
+
+    async def _enrich_words(self, word_ids: Dict[str, int], language: str):
+        """Fill in the definitions of the words that were never looked up, a chunk of rows at a time.
+
+        Each word is looked up once, whether its definition is found or not, and
+        the words table keeps the result for every later session. Words stay
+        pending until the dictionary of their language is built.
+        """
+        definitions = lexicon.get_definitions(language)
+        if definitions is None:
+            return
+
+        for chunk in bulk.chunks(list(word_ids.values())):
+            result = await self.db.execute(
+                select(Word.id, Word.word).where(Word.id.in_(chunk), Word.enriched.is_(False))
+            )
+            rows = result.tuples().all()
+            if not rows:
+                continue
+
+            # both dictionaries give English glosses, also for Japanese words
+            found = await asyncio.to_thread(
+                lambda: [(word_id, definitions.get(lexicon.definition_key(language, word))) for word_id, word in rows]
+            )
+            await self.db.execute(
+                update(Word),
+                [{"id": word_id, "definition_en": definition, "enriched": True} for word_id, definition in found],
+            )
+
+    async def _filter_known_words(self, word_counts: Dict[str, int], user_id: str) -> List[str]:
+        known = await known_word_index.get(self.db, user_id)
+        return list(word_counts.keys() - known)
+
+    async def _upsert_words(self, words: List[str], unknown_for: Optional[str] = None) -> Dict[str, int]:
+        """Insert the words missing from the words table and return word -> id for all of them.
+
+        With unknown_for, the ids of words that user has learned are left out.
+        """
+        if not words:
+            return {}
+
+        await self.db.execute(
+            sqlite_insert(Word).on_conflict_do_nothing(index_elements=["word"]), [{"word": word} for word in words]
         )
-        words = set(result.scalars().all())
-        return words
 
-    async def _filter_known_words(self, words: List[str]) -> List[str]:
-        known = await self._load_all_words()
-        unknown = []
+        query = select(Word.word, Word.id)
+        if unknown_for is not None:
+            query = query.where(
+                ~exists().where(
+                    UserWord.word_id == Word.id, UserWord.user_id == unknown_for, UserWord.status == "learned"
+                )
+            )
 
-        for word in words:
-            if word not in known:
-                unknown.append(word)
+        word_ids = {}
+        for chunk in bulk.chunks(words):
+            result = await self.db.execute(query.where(Word.word.in_(chunk)))
+            word_ids.update(result.tuples().all())
 
-        return unknown
+        return word_ids
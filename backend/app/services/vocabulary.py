@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Bulk import and export of the words a user knows, e.g. from Anki exports or plain word lists."""
+
+import codecs
+import csv
+import io
+import logging
+import re
+from typing import AsyncIterator, List
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+
+from app.core import executor, lang, metrics
+from app.core.config import settings
+from app.models import database
+from app.models.database import UserWord, Word
+from app.services import bulk, word_stats
+from app.services.known_words import known_word_index
+
+logger = logging.getLogger(__name__)
+
+_HTML = re.compile(r"<[^>]*>|&nbsp;")
+
+
+async def _iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a UTF-8 body as it arrives and yield its lines."""
+    decoder = codecs.getincrementaldecoder("utf_8_sig")(errors="replace")
+    rest = ""
+    async for chunk in chunks:
+        lines = (rest + decoder.decode(chunk)).split("\n")
+        rest = lines.pop()
+        for line in lines:
+            yield line
+
+    rest += decoder.decode(b"", final=True)
+    if rest:
+        yield rest
+
+
+def _entry(line: str, format: str) -> str:
+    """The word of one line: its first field, without the HTML Anki keeps in note fields."""
+    line = line.strip()
+    # Anki writes "#separator:tab"-style headers; plain lists may have comments
+    if not line or line.startswith("#"):
+        return ""
+
+    if format == "csv":
+        fields = next(csv.reader([line]), [""])
+        line = fields[0] if fields else ""
+    else:
+        line = line.split("\t", 1)[0]
+
+    return _HTML.sub(" ", line).strip()
+
+
+def _encode_export_rows(rows: list, format: str) -> str:
+    if format != "csv":
+        return "".join(f"{word}\n" for word, _ in rows)
+
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(rows)
+    return buffer.getvalue()
+
+
+class VocabularyService:
+    """A user's known words in bulk, a batch at a time so that memory stays bounded whatever the size."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def import_words(self, user_id: str, language: str, chunks: AsyncIterator[bytes], format: str) -> dict:
+        """Mark the words of a word list as learned for the user.
+
+        Each line holds one entry, the first field of a tab-separated line
+        (format "text", e.g. a plain list or an Anki notes export) or of a CSV
+        row. Entries go through the analyzer of the language in batches of
+        VOCABULARY_IMPORT_BATCH lines, so "running" imports "run" just like
+        processing a subtitle would count it, and entries that aren't words
+        are dropped. Each batch is committed on its own.
+        """
+        if language not in lang.LANGUAGE.values():
+            raise HTTPException(status_code=400, detail=f"Unsupported language: {language}")
+
+        report = {"lines": 0, "words": 0, "added": 0}
+        batch = []
+        async for line in _iter_lines(chunks):
+            entry = _entry(line, format)
+            if not entry:
+                continue
+            batch.append(entry)
+            if len(batch) >= settings.VOCABULARY_IMPORT_BATCH:
+                await self._import_batch(user_id, language, batch, report)
+                batch = []
+
+        if batch:
+            await self._import_batch(user_id, language, batch, report)
+
+        logger.info("vocabulary imported", extra={"user_id": user_id, "language": language, **report})
+        return report
+
+    async def _import_batch(self, user_id: str, language: str, entries: List[str], report: dict):
+        report["lines"] += len(entries)
+        try:
+            word_counts, worker_report = await executor.run(lang.count_words, language, {None: entries})
+        except executor.ExecutorBusyError:
+            raise HTTPException(status_code=503, detail="Too many files are being processed, please retry later")
+        for stage, seconds in worker_report["stages"].items():
+            metrics.record_stage(stage, seconds)
+
+        words = list(word_counts.get(None, {}))
+        report["words"] += len(words)
+        if not words:
+            return
+
+        with metrics.stage("db_write"):
+            known_before = await known_word_index.version(self.db, user_id)
+            await self.db.execute(
+                sqlite_insert(Word).on_conflict_do_nothing(index_elements=["word"]), [{"word": word} for word in words]
+            )
+            for chunk in bulk.chunks(words):
+                word_ids = select(Word.id).where(Word.word.in_(chunk))
+                report["added"] += await bulk.insert_user_words(self.db, user_id, word_ids)
+                await word_stats.mark_learned(self.db, user_id, word_ids)
+            known_after = await known_word_index.version(self.db, user_id)
+            await self.db.commit()
+
+        known_word_index.add(user_id, words, known_before, known_after)
+
+
+async def export_words(user_id: str, format: str) -> AsyncIterator[str]:
+    """Yield the user's known words in alphabetical order, as one word per line or "word,status" CSV rows.
+
+    Rows are read from a database cursor VOCABULARY_EXPORT_BATCH at a time. The
+    generator opens its own database session: it runs while the response is
+    sent, after the request's session is closed.
+    """
+    if format == "csv":
+        yield _encode_export_rows([("word", "status")], format)
+
+    async with database.AsyncSessionLocal() as db:
+        result = await db.stream(
+            select(Word.word, UserWord.status)
+            .join(UserWord, UserWord.word_id == Word.id)
+            .where(UserWord.user_id == user_id)
+            .order_by(Word.word)
+            .execution_options(yield_per=settings.VOCABULARY_EXPORT_BATCH)
+        )
+        async for rows in result.partitions():
+            yield _encode_export_rows(rows, format)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Cross-session word statistics per user, maintained in user_word_stats as sessions are processed and finalized.
+
+Sessions contribute every word they count, known ones included, from
+session_word_counts. The learned flag follows user_words: it is set as words
+are learned and read from user_words when a word is first counted.
+
+The write functions run set-based statements in the caller's transaction and leave committing to it.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import delete, exists, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+
+from app.models.database import SessionWordCount, UserWord, UserWordStats, Word
+from app.services import bulk
+
+
+async def remove_session(db: AsyncSession, user_id: str, session_id: str):
+    """Take the words the session counted out of the statistics, before it is processed again."""
+    stats = UserWordStats
+    counts = SessionWordCount
+    await db.execute(
+        update(stats)
+        .where(stats.user_id == user_id, stats.word_id == counts.word_id, counts.session_id == session_id)
+        .values(total_frequency=stats.total_frequency - counts.frequency, session_count=stats.session_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(stats)
+        .where(stats.user_id == user_id, stats.session_count <= 0)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def add_session(db: AsyncSession, user_id: str, session_id: str):
+    """Add the words a processed session counted to the statistics."""
+    stats = UserWordStats
+    counts = SessionWordCount
+    learned = exists().where(
+        UserWord.user_id == user_id, UserWord.word_id == counts.word_id, UserWord.status == "learned"
+    )
+    insert = bulk.insert_from_select(
+        stats,
+        ["user_id", "word_id", "total_frequency", "session_count", "last_seen_at", "learned"],
+        select(
+            literal(user_id), counts.word_id, counts.frequency, literal(1), literal(datetime.utcnow()), learned
+        ).where(counts.session_id == session_id),
+    )
+    await db.execute(
+        insert.on_conflict_do_update(
+            index_elements=["user_id", "word_id"],
+            set_={
+                "total_frequency": stats.total_frequency + insert.excluded.total_frequency,
+                "session_count": stats.session_count + 1,
+                "last_seen_at": insert.excluded.last_seen_at,
+            },
+        )
+    )
+
+
+async def mark_learned(db: AsyncSession, user_id: str, word_ids):
+    """Flag words the user has learned; word_ids is a list of ids or a select of them."""
+    await db.execute(
+        update(UserWordStats)
+        .where(UserWordStats.user_id == user_id, UserWordStats.word_id.in_(word_ids))
+        .values(learned=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _to_dict(word: str, stats: UserWordStats) -> dict:
+    return {
+        "word": word,
+        "total_frequency": stats.total_frequency,
+        "session_count": stats.session_count,
+        "last_seen_at": stats.last_seen_at,
+        "learned": stats.learned,
+    }
+
+
+class WordStatsService:
+    """Reads of the statistics; each is an index lookup, however many sessions were processed."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def top_words(self, user_id: str, limit: int, learned: bool = False) -> list[dict]:
+        """The words the user met most often over all sessions, not learned yet by default."""
+        stats = UserWordStats
+        result = await self.db.execute(
+            select(Word.word, stats)
+            .join(Word, stats.word_id == Word.id)
+            .where(stats.user_id == user_id, stats.learned.is_(learned))
+            .order_by(stats.total_frequency.desc())
+            .limit(limit)
+        )
+        return [_to_dict(word, word_stats) for word, word_stats in result.tuples().all()]
+
+    async def get_word(self, user_id: str, word: str) -> dict:
+        stats = UserWordStats
+        result = await self.db.execute(
+            select(stats).join(Word, stats.word_id == Word.id).where(stats.user_id == user_id, Word.word == word)
+        )
+        word_stats = result.scalar_one_or_none()
+        if word_stats is None:
+            raise HTTPException(status_code=404, detail="Word not seen in any session")
+
+        return _to_dict(word, word_stats)
@@ -0,0 +1 @@
+"""Benchmarks for the tokenize -> filter -> persist pipeline."""
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compare two baselines written by benchmarks.run, stage by stage.
+
+    python -m benchmarks.compare before.json after.json
+
+Prints the seconds of both runs and their ratio for every stage of every case
+the two baselines have in common. A ratio below 1 means the second run is faster.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _cases(baseline: dict) -> dict:
+    return {(case["language"], case["format"], case["cues"], case["learned"]): case for case in baseline["cases"]}
+
+
+def _describe(baseline: dict) -> str:
+    commit = (baseline.get("commit") or "unknown")[:10]
+    return f"{commit}{' (dirty)' if baseline.get('dirty') else ''} {baseline['created']}"
+
+
+def compare(before: dict, after: dict, threshold: float) -> list[str]:
+    lines = [f"before: {_describe(before)}", f"after:  {_describe(after)}", ""]
+    before_cases = _cases(before)
+    after_cases = _cases(after)
+
+    for key, after_case in after_cases.items():
+        before_case = before_cases.get(key)
+        if before_case is None:
+            continue
+
+        language, file_format, cues, learned = key
+        learned = "api" if learned is None else f"learned={learned}"
+        lines.append(f"{language} {file_format} cues={cues} {learned}")
+        for stage, seconds in after_case["stages"].items():
+            previous = before_case["stages"].get(stage)
+            if previous is None:
+                lines.append(f"  {stage:<18} {'-':>10} {seconds:>10.4f}")
+                continue
+
+            ratio = seconds / previous if previous else float("inf")
+            marker = ""
+            if ratio > 1 + threshold:
+                marker = "  slower"
+            elif ratio < 1 - threshold:
+                marker = "  faster"
+            lines.append(f"  {stage:<18} {previous:>10.4f} {seconds:>10.4f} {ratio:>7.2f}x{marker}")
+        lines.append("")
+
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before", type=Path)
+    parser.add_argument("after", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change to flag, default 0.1")
+    args = parser.parse_args(argv)
+
+    before = json.loads(args.before.read_text())
+    after = json.loads(args.after.read_text())
+    print("\n".join(compare(before, after, args.threshold)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
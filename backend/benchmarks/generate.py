@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Synthetic subtitles and vocabularies for the benchmarks.
+
+Words are drawn from small built-in vocabularies with a Zipf-like distribution,
+so that, like real dialogue, a few words repeat a lot and most are rare. The
+output only depends on the seed.
+"""
+
+import random
+from pathlib import Path
+
+ENGLISH_WORDS = """
+the be to of and a in that have it for not on with he as you do at this but his by from they we say her she
+or an will my one all would there their what so up out if about who get which go me when make can like time no
+just him know take people into year your good some could them see other than then now look only come its over
+think also back after use two how our work first well way even new want because any these give day most us is
+was are were been has had did said went made knew took came saw looked wanted used worked called tried asked
+needed felt became left put meant kept let began seemed helped talked turned started showed heard played ran
+moved lived believed brought happened wrote provided sat stood lost paid met included continued set learned
+changed led understood watched followed stopped created spoke read allowed added spent grew opened walked won
+offered remembered loved considered appeared bought waited served died sent expected built stayed fell cut
+reached killed remained suggested raised passed sold required reported decided pulled running eating sleeping
+thinking talking walking looking trying getting making taking coming going seeing knowing feeling leaving
+house houses car cars dog dogs city cities child children woman women man men friend friends family families
+school schools problem problems hand hands eye eyes night nights word words home water room mother father
+money story stories fact month lot right study book books job business issue side kind head service power
+hour game line end member law war history party result change morning reason research girl guy moment air
+teacher force education foot feet boy age policy process music market sense nation plan college interest
+death experience effect class control care field development role effort rate heart drug show leader light
+voice wife police mind price report decision son view relationship town road arm difference value building
+action model season society tax director position player record paper space ground form event official matter
+center couple site project activity star table need court oil situation cost industry figure street image
+phone data picture practice piece land product doctor wall patient worker news test movie north love support
+technology step baby computer type attention film tree source organization hair window evidence population
+happy sad angry quick quickly slow slowly bright dark strange beautiful terrible wonderful important possible
+really actually probably finally suddenly certainly simply clearly nearly easily exactly recently seriously
+""".split()
+
+JAPANESE_WORDS = """
+私 あなた 彼 彼女 僕 君 先生 学生 友達 家族 母 父 子供 人 男 女 犬 猫 家 学校 会社 電車 駅 町 国 世界 時間
+今日 明日 昨日 朝 夜 水 ご飯 お茶 本 映画 音楽 仕事 問題 気持ち 心 夢 話 声 目 手 顔 名前 言葉 部屋 道
+行く 来る 見る 食べる 飲む 話す 聞く 読む 書く 思う 知る 分かる 待つ 帰る 作る 使う 持つ 死ぬ 生きる 戦う
+守る 信じる 忘れる 覚える 始める 終わる 走る 歩く 遊ぶ 働く 勉強 大丈夫 本当 一緒 大切 好き 嫌い 新しい
+古い 大きい 小さい 高い 安い 強い 弱い 早い 遅い 楽しい 悲しい 怖い 優しい 美しい 寂しい 嬉しい 痛い
+""".split()
+
+JAPANESE_PARTICLES = "は が を に で と も へ の から まで よ ね か".split()
+
+
+def zipf_sampler(words: list[str], rng: random.Random):
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+
+    def sample(count: int) -> list[str]:
+        return rng.choices(words, weights=weights, k=count)
+
+    return sample
+
+
+def english_line(sample, rng: random.Random) -> str:
+    words = sample(rng.randint(3, 12))
+    text = " ".join(words)
+    return text[0].upper() + text[1:] + rng.choice([".", "!", "?", "...", ","])
+
+
+def japanese_line(sample, rng: random.Random) -> str:
+    words = sample(rng.randint(2, 6))
+    return "".join(word + rng.choice(JAPANESE_PARTICLES) for word in words) + rng.choice(["。", "！", "？", "…"])
+
+
+def _lines(language: str, cues: int, seed: int):
+    rng = random.Random(seed)
+    if language == "en":
+        sample = zipf_sampler(ENGLISH_WORDS, rng)
+        make_line = english_line
+    else:
+        sample = zipf_sampler(JAPANESE_WORDS, rng)
+        make_line = japanese_line
+
+    for _ in range(cues):
+        # a fifth of the cues have a second line
+        lines = [make_line(sample, rng)]
+        if rng.random() < 0.2:
+            lines.append(make_line(sample, rng))
+        yield lines
+
+
+def _srt_time(ms: int) -> str:
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def _ass_time(ms: int) -> str:
+    return f"{ms // 3600000}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000 // 10:02d}"
+
+
+def write_srt(path: Path, language: str, cues: int, seed: int = 0) -> Path:
+    with open(path, "w", encoding="utf-8") as f:
+        for index, lines in enumerate(_lines(language, cues, seed)):
+            start = index * 2500
+            f.write(f"{index + 1}\n{_srt_time(start)} --> {_srt_time(start + 2000)}\n")
+            f.write("\n".join(lines) + "\n\n")
+
+    return path
+
+
+def write_ass(path: Path, language: str, cues: int, seed: int = 0) -> Path:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[Script Info]\nScriptType: v4.00+\n\n")
+        f.write("[V4+ Styles]\nFormat: Name, Fontname, Fontsize\nStyle: Default,Arial,20\nStyle: Signs,Arial,18\n\n")
+        f.write("[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+        for index, lines in enumerate(_lines(language, cues, seed)):
+            start = index * 2500
+            # every tenth event is a sign, with override tags like real typesetting
+            if index % 10 == 9:
+                style, text = "Signs", "{\\an8\\pos(640,50)}" + lines[0]
+            else:
+                style, text = "Default", "{\\i1}" + "\\N".join(lines) + "{\\i0}"
+            f.write(f"Dialogue: 0,{_ass_time(start)},{_ass_time(start + 2000)},{style},,0,0,0,,{text}\n")
+
+    return path
+
+
+def write_subtitle(path: Path, language: str, cues: int, seed: int = 0) -> Path:
+    if path.suffix == ".ass":
+        return write_ass(path, language, cues, seed)
+    return write_srt(path, language, cues, seed)
+
+
+def learned_vocabulary(language: str, count: int) -> list[str]:
+    """count distinct words for the learned-word table: the benchmark vocabulary first, then filler words."""
+    words = list(dict.fromkeys(ENGLISH_WORDS if language == "en" else JAPANESE_WORDS))[: count // 2]
+    return words + [f"filler{index}" for index in range(count - len(words))]
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""Latency of session lookups as session_words grows.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.lookup --rows 10000 100000 1000000 --output lookup.json
+    python -m benchmarks.lookup --rows 10000 100000 1000000 --no-indexes
+
+Fills session_words with sessions of --session-words rows each until it holds
+the next size of --rows, then times the lookups of one session: word pages
+(by frequency, by prefix, removed words only), a word update, the learned-word
+load and finalize. Each lookup reports the median of --repeat runs in
+milliseconds; with indexes they should stay flat as the table grows.
+--no-indexes drops the lookup indexes first, for comparison.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.run import _configure, _git_commit
+
+
+async def _median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return round(statistics.median(samples), 3)
+
+
+async def _fill_words(db, count: int):
+    from sqlalchemy import text
+
+    await db.execute(
+        text(
+            "INSERT INTO words (word) WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :count) "
+            "SELECT 'word' || i FROM n"
+        ),
+        {"count": count},
+    )
+    await db.commit()
+
+
+async def _add_sessions(db, first: int, count: int, session_words: int, vocabulary: int):
+    from sqlalchemy import insert, text
+
+    from app.models import database
+
+    for number in range(first, first + count):
+        session_id = f"session{number}"
+        await db.execute(
+            insert(database.Session),
+            {
+                "id": session_id,
+                "language": "en",
+                "subtitle_filename": f"{session_id}.srt",
+                "subtitle_path": f"/nonexistent/{session_id}.srt",
+                "status": "processed",
+            },
+        )
+        # a window of the vocabulary with Zipf-like frequencies
+        start = number * 7919 % max(vocabulary - session_words, 1)
+        await db.execute(
+            text(
+                "INSERT INTO session_words (session_id, word_id, frequency, is_removed, version) "
+                "SELECT :session_id, id, 1000 / (id - :start) + 1, 0, 0 FROM words WHERE id > :start LIMIT :count"
+            ),
+            {"session_id": session_id, "start": start, "count": session_words},
+        )
+    await db.commit()
+
+
+async def bench(rows: list[int], session_words: int, vocabulary: int, learned: int, repeat: int, indexes: bool):
+    from sqlalchemy import func, insert, literal, select, text
+
+    from app.core.config import settings
+    from app.models import database
+    from app.services.known_words import KnownWordIndex
+    from app.services.session_service import SessionService
+
+    await database.init_db()
+    results = []
+
+    async with database.AsyncSessionLocal() as db:
+        if not indexes:
+            for model in (database.Session, database.SessionWord, database.UserWord):
+                for index in model.__table__.indexes:
+                    await db.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+            await db.execute(text("ANALYZE"))
+
+        await _fill_words(db, vocabulary)
+        # learned words spread over the vocabulary
+        step = max(vocabulary // max(learned, 1), 1)
+        learned_ids = select(literal(settings.DEFAULT_USER), database.Word.id, literal("learned"))
+        await db.execute(
+            insert(database.UserWord.__table__).from_select(
+                ["user_id", "word_id", "status"], learned_ids.where(database.Word.id % step == 0).limit(learned)
+            )
+        )
+        await db.commit()
+
+        service = SessionService(db)
+        sessions = 0
+        for target in sorted(rows):
+            missing = -(-(target - sessions * session_words) // session_words)
+            if missing > 0:
+                print(f"filling session_words to {target} rows", file=sys.stderr)
+                await _add_sessions(db, sessions, missing, session_words, vocabulary)
+                sessions += missing
+
+            result = await db.execute(select(func.count(database.SessionWord.id)))
+            total_rows = result.scalar_one()
+
+            # a session in the middle of the table
+            session_id = f"session{sessions // 2}"
+            page = await service.get_words(session_id, limit=20)
+            some_words = [word for word, _, _ in page["words"]]
+
+            timings = {
+                "words_page": await _median_ms(lambda: service.get_words(session_id, limit=100), repeat),
+                "words_prefix": await _median_ms(
+                    lambda: service.get_words(session_id, "alphabetical", prefix="word1", limit=100), repeat
+                ),
+                "words_removed": await _median_ms(lambda: service.get_words(session_id, removed=True), repeat),
+                "update_words": await _median_ms(lambda: service.update_words(session_id, some_words), repeat),
+                "known_words": await _median_ms(lambda: KnownWordIndex().get(db, settings.DEFAULT_USER), repeat),
+                "finalize": await _median_ms(lambda: service.finalize(session_id), repeat),
+            }
+            results.append({"rows": total_rows, "sessions": sessions, "milliseconds": timings})
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--session-words", type=int, default=5000, help="session_words rows per session")
+    parser.add_argument("--vocabulary", type=int, default=50_000, help="rows of the words table")
+    parser.add_argument("--learned", type=int, default=10_000, help="learned words of the user")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-indexes", action="store_true", help="drop the lookup indexes before filling the tables")
+    parser.add_argument("--output", type=Path, help="write the results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="subscout-bench-") as tmp:
+        home = Path(tmp)
+        _configure(home, 0)
+
+        from app.core.config import init_directories
+
+        init_directories()
+        results = asyncio.run(
+            bench(args.rows, args.session_words, args.vocabulary, args.learned, args.repeat, not args.no_indexes)
+        )
+
+    baseline = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        **_git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "indexes": not args.no_indexes,
+        "session_words": args.session_words,
+        "vocabulary": args.vocabulary,
+        "learned": args.learned,
+        "repeat": args.repeat,
+        "results": results,
+    }
+
+    output = json.dumps(baseline, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
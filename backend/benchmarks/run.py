@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""Time each stage of the subtitle pipeline on synthetic data and write a JSON baseline.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.run --cues 1000 10000 --learned 0 10000 --output baseline.json
+    python -m benchmarks.compare before.json after.json
+
+Every case generates a subtitle with the given number of cues and a learned-word
+table of the given size, then times parse, tokenize, pos_tag, lemmatize, count
+(the whole language pipeline, with a cold and a warm lemma memo), filter,
+db_write, update_words and finalize separately, and the whole API end to end
+through an in-process ASGI client. Each stage reports the best of --repeat runs
+in seconds. Everything runs against a temporary home directory with its own
+SQLite database, uploads and caches.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks import generate
+
+
+def _configure(home: Path, workers: int):
+    # app settings are read from the environment when app.core.config is first imported
+    os.environ.update(
+        HOME_DIR=str(home),
+        UPLOAD_DIR=str(home / "uploads"),
+        CACHE_DIR=str(home / "cache"),
+        DATABASE_URL=f"sqlite+aiosqlite:///{home}/subscout.db",
+        WORKER_PROCESSES=str(workers),
+        LEMMA_CACHE_PERSIST="false",
+    )
+
+
+def _best(fn, repeat: int):
+    """Return (best time in seconds, result of the last call)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+async def _best_async(fn, repeat: int):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, result
+
+
+def bench_language(path: Path, language: str, repeat: int) -> tuple[dict, dict]:
+    """Time the in-process analysis stages; returns (stage timings, word counts)."""
+    import nltk
+
+    from app.core import lang, subtitle
+    from app.core.cache import LRUCache
+    from app.core.config import settings
+
+    stages = {}
+    stages["parse"], cues = _best(lambda: list(subtitle.iter_cues(path)), repeat)
+    texts = [cue.text for cue in cues]
+
+    resources = lang.get_resources(language)
+    if language == "en":
+        stages["tokenize"], sentences = _best(lambda: [nltk.tokenize.word_tokenize(text) for text in texts], repeat)
+        tagger = resources["tagger"]
+        if tagger is not None:
+            stages["pos_tag"], tagged = _best(lambda: tagger.tag_sents(sentences), repeat)
+        else:
+            # the fast analyzer looks lemmas up without tags
+            tagged = [[(token, None) for token in sentence] for sentence in sentences]
+
+        english = lang.init_language(language)
+
+        def lemmatize():
+            for sentence in tagged:
+                for token, tag in sentence:
+                    english.is_word(english.lemmatize(token.lower(), tag))
+
+        stages["lemmatize"], _ = _best(lemmatize, repeat)
+
+        def count_cold():
+            resources["lemma_cache"] = LRUCache(settings.LEMMA_CACHE_SIZE)
+            return lang.init_language(language).count_words(texts)
+
+        stages["count_cold"], _ = _best(count_cold, repeat)
+    else:
+        # fugashi tags while it tokenizes
+        tagger = resources["tagger"]
+        stages["tokenize"], _ = _best(lambda: [list(tagger(text)) for text in texts], repeat)
+
+    stages["count"], word_counts = _best(lambda: lang.init_language(language).count_words(texts), repeat)
+
+    return stages, word_counts
+
+
+async def bench_database(path: Path, language: str, word_counts: dict, learned: int, repeat: int) -> dict:
+    from sqlalchemy import insert, literal, select
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    from app.core import lang, subtitle
+    from app.core.config import settings
+    from app.models import database
+    from app.services.known_words import KnownWordIndex
+    from app.services.session_service import SessionService, _FileAnalysis
+
+    user_id = settings.DEFAULT_USER
+
+    async with database.engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.drop_all)
+    await database.init_db()
+
+    async with database.AsyncSessionLocal() as db:
+        vocabulary = generate.learned_vocabulary(language, learned)
+        if vocabulary:
+            await db.execute(
+                sqlite_insert(database.Word).on_conflict_do_nothing(), [{"word": word} for word in vocabulary]
+            )
+            await db.execute(
+                insert(database.UserWord.__table__).from_select(
+                    ["user_id", "word_id", "status"],
+                    select(literal(user_id), database.Word.id, literal("learned")).where(database.Word.id > 0),
+                )
+            )
+        await db.commit()
+
+    stages = {}
+    async with database.AsyncSessionLocal() as db:
+        service = SessionService(db)
+
+        async def filter_memory():
+            known = await KnownWordIndex().get(db, user_id)
+            return word_counts.keys() - known
+
+        stages["filter"], _ = await _best_async(filter_memory, repeat)
+
+        async def filter_sql():
+            word_ids = await service._upsert_words(list(word_counts), unknown_for=user_id)
+            await db.rollback()
+            return word_ids
+
+        stages["filter_sql"], _ = await _best_async(filter_sql, repeat)
+
+        # with the counts and occurrences in the analysis cache, process_file only does the database work
+        content_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+        cues = list(subtitle.iter_cues(path))
+        analysis = _FileAnalysis()
+        first = analysis.add_cues(cues)
+        analysis.add_words(
+            first, *lang.init_language(language).index_words([cue.text for cue in cues], [cue.style for cue in cues])
+        )
+        style_counts = {style: dict(counts) for style, counts in analysis.style_counts.items()}
+        subtitle.finish_analysis(path, style_counts, content_hash)
+        subtitle.cache_index(analysis.file_index(), content_hash)
+        session_id = "benchmark"
+        db.add(
+            database.Session(
+                id=session_id,
+                language=language,
+                subtitle_filename=path.name,
+                subtitle_path=str(path),
+                content_hash=content_hash,
+            )
+        )
+        await db.commit()
+
+        stages["db_write"], _ = await _best_async(lambda: service.process_file(session_id, None), repeat)
+
+        page = await service.get_words(session_id)
+        removed = [word for index, (word, _, _) in enumerate(page["words"]) if index % 3 == 0]
+        stages["update_words"], _ = await _best_async(lambda: service.update_words(session_id, removed), repeat)
+        stages["finalize"], _ = await _best_async(lambda: service.finalize(session_id), repeat)
+
+    return stages
+
+
+async def bench_api(directory: Path, language: str, suffix: str, cues: int, repeat: int) -> dict:
+    import httpx
+
+    from app.main import app
+
+    timings = {}
+
+    def record(stage: str, elapsed: float):
+        timings[stage] = min(timings.get(stage, elapsed), elapsed)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for run in range(repeat):
+                # a new seed each run, so the analysis cache never answers
+                path = generate.write_subtitle(directory / f"api_{run}{suffix}", language, cues, seed=1000 + run)
+                total_start = start = time.perf_counter()
+
+                with open(path, "rb") as f:
+                    response = await client.post("/api/upload", files={"file": (path.name, f)})
+                response.raise_for_status()
+                session_id = response.json()["id"]
+                record("api_upload", time.perf_counter() - start)
+
+                start = time.perf_counter()
+                response = await client.post(f"/api/session/{session_id}/process", json={"style": None})
+                response.raise_for_status()
+                job = response.json()
+                while job["status"] not in ("done", "failed"):
+                    await asyncio.sleep(0.01)
+                    job = (await client.get(f"/api/jobs/{job['job_id']}")).json()
+                if job["status"] == "failed":
+                    raise RuntimeError(f"processing failed: {job['error']}")
+                record("api_process", time.perf_counter() - start)
+
+                start = time.perf_counter()
+                response = await client.get(f"/api/session/{session_id}/words")
+                response.raise_for_status()
+                words = [item["word"] for item in response.json()["words"]]
+                record("api_words", time.perf_counter() - start)
+
+                start = time.perf_counter()
+                response = await client.patch(f"/api/session/{session_id}/words", json={"removed_words": words[::3]})
+                response.raise_for_status()
+                record("api_update_words", time.perf_counter() - start)
+
+                start = time.perf_counter()
+                response = await client.post(f"/api/session/{session_id}/finalize")
+                response.raise_for_status()
+                record("api_finalize", time.perf_counter() - start)
+
+                record("api_total", time.perf_counter() - total_start)
+
+    return timings
+
+
+def _git_commit() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--language", nargs="+", choices=["en", "jp"], default=["en", "jp"])
+    parser.add_argument("--format", nargs="+", choices=["srt", "ass"], default=["srt"])
+    parser.add_argument("--cues", nargs="+", type=int, default=[1000])
+    parser.add_argument("--learned", nargs="+", type=int, default=[0, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=0, help="WORKER_PROCESSES for the end-to-end runs")
+    parser.add_argument("--skip-api", action="store_true", help="don't run the end-to-end API benchmark")
+    parser.add_argument("--output", type=Path, help="write the results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="subscout-bench-") as tmp:
+        home = Path(tmp)
+        _configure(home, args.workers)
+
+        from app.core.config import init_directories
+
+        init_directories()
+
+        cases = []
+        for language in args.language:
+            for file_format in args.format:
+                for cues in args.cues:
+                    path = generate.write_subtitle(home / f"{language}_{cues}.{file_format}", language, cues)
+                    language_stages, word_counts = bench_language(path, language, args.repeat)
+
+                    for learned in args.learned:
+                        print(f"{language} {file_format} cues={cues} learned={learned}", file=sys.stderr)
+                        stages = dict(language_stages)
+                        stages.update(
+                            asyncio.run(bench_database(path, language, word_counts, learned, args.repeat))
+                        )
+                        cases.append(
+                            {
+                                "language": language,
+                                "format": file_format,
+                                "cues": cues,
+                                "learned": learned,
+                                "tokens": sum(word_counts.values()),
+                                "distinct_words": len(word_counts),
+                                "stages": stages,
+                            }
+                        )
+
+                    if not args.skip_api:
+                        api_stages = asyncio.run(bench_api(home, language, f".{file_format}", cues, args.repeat))
+                        cases.append(
+                            {
+                                "language": language,
+                                "format": file_format,
+                                "cues": cues,
+                                "learned": None,
+                                "stages": api_stages,
+                            }
+                        )
+
+    baseline = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        **_git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "cases": cases,
+    }
+
+    output = json.dumps(baseline, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
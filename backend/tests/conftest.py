@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Settings pointing at a temporary home directory, set before any app module is imported, and database fixtures."""
+
+import io
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_home = tempfile.mkdtemp(prefix="subscout-tests-")
+os.environ.update(
+    HOME_DIR=_home,
+    UPLOAD_DIR=os.path.join(_home, "uploads"),
+    CACHE_DIR=os.path.join(_home, "cache"),
+    DATABASE_URL=f"sqlite+aiosqlite:///{_home}/subscout.db",
+    # analyses run in a thread of the test process
+    WORKER_PROCESSES="0",
+)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """A session on a new database, migrated like the server's on startup."""
+    from app.core.config import init_directories, settings
+    from app.models import database
+    from app.services.known_words import known_word_index
+
+    init_directories()
+    # the index of the last test's database could pass for up to date
+    known_word_index.invalidate(settings.DEFAULT_USER)
+    await database.engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{_home}/subscout.db{suffix}").unlink(missing_ok=True)
+    await database.init_db()
+
+    async with database.AsyncSessionLocal() as session:
+        yield session
+
+    await database.engine.dispose()
+
+
+@pytest.fixture
+def upload(db):
+    """Upload a subtitle as the upload endpoint does; returns the new session id."""
+    from fastapi import UploadFile
+
+    from app.services.session_service import SessionService
+
+    async def upload(text: str, filename: str = "episode.srt") -> str:
+        file = UploadFile(io.BytesIO(text.encode("utf-8")), filename=filename)
+        return (await SessionService(db).upload_file(file))["id"]
+
+    return upload
+
+
+@pytest.fixture
+async def client(db):
+    """An HTTP client of the app, on the database of the test; the app's startup tasks don't run."""
+    import httpx
+
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
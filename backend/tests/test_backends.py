@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.core import lang
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_the_app_imports_no_language_backend():
+    code = "import sys, app.main; print(sorted({'fugashi', 'nltk', 'enchant'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=BACKEND_DIR)
+
+    assert result.stdout.strip() == "[]"
+
+
+def test_warm_up_reports_what_loading_cost():
+    pytest.importorskip("fugashi")
+
+    report = lang.warm_up(["jp"])
+
+    assert set(report["backends"]["jp"]) == {"import_seconds", "load_seconds", "rss_bytes"}
+    assert report["rss_bytes"] > 0
+    # loaded once per process
+    assert lang.get_resources("jp") is lang.get_resources("jp")
+
+
+def test_unknown_languages_are_refused():
+    with pytest.raises(Exception, match="invalid language"):
+        lang.get_language_class("xx")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import io
+import zipfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+FORMAT = "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
+
+
+def _ass(styles: list[str], events: list[tuple[str, str]]) -> str:
+    lines = ["[Script Info]", "ScriptType: v4.00+", "", "[V4+ Styles]", "Format: Name, Fontname, Fontsize"]
+    lines += [f"Style: {style},Arial,20" for style in styles]
+    lines += ["", "[Events]", FORMAT]
+    for i, (style, text) in enumerate(events):
+        lines.append(f"Dialogue: 0,0:00:0{i}.00,0:00:0{i + 1}.00,{style},,0,0,0,,{text}")
+    return "\n".join(lines) + "\n"
+
+
+# the second episode has no signs
+EPISODE_1 = _ass(["Default", "Signs"], [("Default", "猫が走る。" * 20), ("Signs", "看板を見る。" * 20)])
+EPISODE_2 = _ass(["Default"], [("Default", "犬が寝る。" * 20)])
+
+
+def _zip(files: dict) -> UploadFile:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, text in files.items():
+            archive.writestr(name, text)
+        archive.writestr("__MACOSX/", "")
+        archive.writestr("notes.txt", "not a subtitle")
+    buffer.seek(0)
+    return UploadFile(buffer, filename="season.zip")
+
+
+async def _frequencies(service, session_id: str) -> dict:
+    page = await service.get_words(session_id)
+    return {word: frequency for word, frequency, _ in page["words"]}
+
+
+async def test_a_season_in_a_zip(db):
+    service = SessionService(db)
+    result = await service.upload_batch([_zip({"e02.ass": EPISODE_2, "e01.ass": EPISODE_1})])
+
+    assert result["files"] == ["e01.ass", "e02.ass"]
+    assert result["styles"] == ["Default", "Signs"]
+    assert result["language"] == "jp"
+
+    await service.process_file(result["id"], None)
+    assert await _frequencies(service, result["id"]) == {"猫": 20, "走る": 20, "看板": 20, "見る": 20, "犬": 20, "寝る": 20}
+    files = await service.get_files(result["id"])
+    assert [(file.filename, file.word_count, file.token_count) for file in files] == [
+        ("e01.ass", 4, 80),
+        ("e02.ass", 2, 40),
+    ]
+
+
+async def test_a_style_only_some_files_have(db):
+    service = SessionService(db)
+    files = [
+        UploadFile(io.BytesIO(text.encode("utf-8")), filename=name)
+        for name, text in (("e01.ass", EPISODE_1), ("e02.ass", EPISODE_2))
+    ]
+    session_id = (await service.upload_batch(files))["id"]
+
+    await service.process_file(session_id, ["Signs"])
+    assert await _frequencies(service, session_id) == {"看板": 20, "見る": 20}
+
+    with pytest.raises(HTTPException) as error:
+        await service.process_file(session_id, ["Songs"])
+    assert error.value.status_code == 400
+    assert "Songs" in error.value.detail
+
+
+async def test_too_many_files(db, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_BATCH_FILES", 1)
+    uploads = set(settings.UPLOAD_DIR.iterdir())
+
+    with pytest.raises(HTTPException) as error:
+        await SessionService(db).upload_batch([_zip({"e01.ass": EPISODE_1, "e02.ass": EPISODE_2})])
+
+    assert error.value.status_code == 400
+    # the files received before are removed
+    assert set(settings.UPLOAD_DIR.iterdir()) == uploads
+
+
+async def test_files_in_different_languages(db):
+    english = UploadFile(io.BytesIO(b"1\n00:00:01,000 --> 00:00:02,000\nHello there\n"), filename="en.srt")
+    japanese = UploadFile(io.BytesIO(EPISODE_2.encode("utf-8")), filename="jp.ass")
+
+    with pytest.raises(HTTPException) as error:
+        await SessionService(db).upload_batch([english, japanese])
+
+    assert error.value.status_code == 400
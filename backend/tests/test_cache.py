@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import uuid
+
+import pytest
+
+from app.core import executor
+from app.core.cache import AnalysisCache
+from app.services.jobs import ProcessJob
+from app.services.session_service import SessionService
+
+
+def _directory_size(directory) -> int:
+    return sum(path.stat().st_size for path in directory.glob("*.bin"))
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = AnalysisCache(tmp_path, 1024 * 1024)
+    word_counts = {"run": 3, "猫": 2, "cat": 1}
+
+    cache.put(word_counts, "hash", None, "en")
+    assert cache.get("hash", None, "en") == word_counts
+    assert cache.get("hash", "style", "Default", "en") is None
+
+    cache.put({}, "empty")
+    assert cache.get("empty") == {}
+
+
+def test_bytes_round_trip(tmp_path):
+    cache = AnalysisCache(tmp_path, 1024 * 1024)
+
+    cache.put_bytes(b"\x00\x01occurrences", "hash", "occurrences")
+    assert cache.get_bytes("hash", "occurrences") == b"\x00\x01occurrences"
+    # other data under another key isn't word counts
+    assert cache.get("hash", "occurrences") is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    # room for six entries: 500 random bytes don't compress
+    cache = AnalysisCache(tmp_path, 3100)
+    for key in range(10):
+        cache.put_bytes(os.urandom(500), key)
+        # eviction orders by mtime
+        time.sleep(0.01)
+        if key == 4:
+            cache.get_bytes(0)
+
+    assert _directory_size(tmp_path) <= 3100
+    assert [key for key in range(10) if cache.get_bytes(key) is not None] == [0, 5, 6, 7, 8, 9]
+
+
+def test_running_total(tmp_path):
+    cache = AnalysisCache(tmp_path, 1024 * 1024)
+    for key in range(5):
+        cache.put_bytes(os.urandom(200), key)
+    # replacing an entry doesn't count it twice
+    cache.put_bytes(os.urandom(300), 0)
+
+    assert cache._total == _directory_size(tmp_path)
+
+
+def test_running_total_counts_files_of_other_processes(tmp_path):
+    cache = AnalysisCache(tmp_path, 3000)
+    other = AnalysisCache(tmp_path, 3000)
+    for key in range(5):
+        cache.put_bytes(os.urandom(500), "cache", key)
+        other.put_bytes(os.urandom(500), "other", key)
+
+    # each cache lists the directory once its own total is over the limit
+    assert _directory_size(tmp_path) <= 3000 + 2 * 600
+
+
+
+async def _process(db, session_id: str) -> tuple[ProcessJob, list]:
+    service = SessionService(db)
+    job = ProcessJob(session_id, None)
+    await service.process_file(session_id, None, job)
+    return job, (await service.get_words(session_id))["words"]
+
+
+@pytest.mark.anyio
+async def test_a_reupload_is_counted_from_the_cache(db, upload, monkeypatch):
+    # new content for this run: the cache directory outlives the test database
+    text = (
+        f"1\n00:00:01,000 --> 00:00:02,000\n猫が走っていた。{uuid.uuid4().hex}\n\n"
+        "2\n00:00:03,000 --> 00:00:04,000\n猫は寝る。\n"
+    )
+    job, words = await _process(db, await upload(text))
+    assert not job.cached
+    assert ("猫", 2, False) in words
+
+    async def no_analysis(*args, **kwargs):
+        raise AssertionError("analysed again")
+
+    monkeypatch.setattr(executor, "submit", no_analysis)
+    session_id = await upload(text, "copy.srt")
+    job, cached_words = await _process(db, session_id)
+
+    assert job.cached
+    assert cached_words == words
+    examples = await SessionService(db).get_examples(session_id, "猫", 5)
+    assert [example["text"] for example in examples["examples"]][1] == "猫は寝る。"
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select, text
+
+from app.core.config import settings
+from app.models import database
+from app.services import cleanup
+
+pytestmark = pytest.mark.anyio
+
+
+async def _add_session(db, session_id: str, age: timedelta, words: int):
+    path = settings.UPLOAD_DIR / f"{session_id}.srt"
+    path.write_text("1\n00:00:01,000 --> 00:00:02,000\nHello\n", encoding="utf-8")
+    db.add(
+        database.Session(
+            id=session_id,
+            language="en",
+            subtitle_filename="episode.srt",
+            subtitle_path=str(path),
+            status="processed",
+            created_at=datetime.utcnow() - age,
+        )
+    )
+    await db.flush()
+    await db.execute(
+        insert(database.Word).prefix_with("OR IGNORE"),
+        [{"id": word_id + 1, "word": f"word{word_id}"} for word_id in range(words)],
+    )
+    await db.execute(
+        insert(database.SessionWord),
+        [
+            {"session_id": session_id, "word_id": word_id + 1, "frequency": 1, "postings": bytes(200)}
+            for word_id in range(words)
+        ],
+    )
+    await db.commit()
+
+
+async def test_sweep_removes_expired_sessions_and_frees_their_pages(db, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_SWEEP_PAUSE", 0)
+    assert (await db.execute(text("PRAGMA auto_vacuum"))).scalar() == 2
+
+    await _add_session(db, "old", timedelta(hours=settings.SESSION_EXPIRY_HOURS + 1), 3000)
+    await _add_session(db, "new", timedelta(0), 10)
+
+    report = await cleanup.sweep_expired_sessions()
+
+    assert report["sessions"] == 1
+    assert report["session_words"] == 3000
+    assert report["files"] == 1
+    assert report["vacuumed_pages"] > 0
+    assert (await db.execute(text("PRAGMA freelist_count"))).scalar() == 0
+    result = await db.execute(select(database.Session.id))
+    assert result.scalars().all() == ["new"]
+    result = await db.execute(select(func.count(database.SessionWord.id)))
+    assert result.scalar() == 10
+    assert not (settings.UPLOAD_DIR / "old.srt").exists()
+    assert (settings.UPLOAD_DIR / "new.srt").exists()
+
+
+async def test_sweep_skips_sessions_being_processed(db, monkeypatch):
+    monkeypatch.setattr(settings, "SESSION_SWEEP_PAUSE", 0)
+    await _add_session(db, "busy", timedelta(hours=settings.SESSION_EXPIRY_HOURS + 1), 1)
+    await db.execute(text("UPDATE sessions SET status = 'processing'"))
+    await db.commit()
+
+    report = await cleanup.sweep_expired_sessions()
+
+    assert report["sessions"] == 0
+    assert report["vacuumed_pages"] == 0
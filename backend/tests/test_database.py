@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app.core.config import settings
+from app.models import database
+
+pytestmark = pytest.mark.anyio
+
+
+def _path() -> Path:
+    return Path(settings.DATABASE_URL.split("///", 1)[1])
+
+
+async def _pragma(name: str):
+    async with database.engine.connect() as conn:
+        return (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+
+
+async def test_a_new_database(db):
+    assert await _pragma("journal_mode") == "wal"
+    assert await _pragma("auto_vacuum") == 2
+    assert await _pragma("user_version") == len(database.MIGRATIONS)
+
+    async with database.engine.connect() as conn:
+        indexes = await conn.run_sync(lambda conn: inspect(conn).get_indexes("session_words"))
+    assert "ix_session_words_session_frequency" in {index["name"] for index in indexes}
+
+
+async def test_a_database_of_an_earlier_version_is_migrated():
+    await database.engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{_path()}{suffix}").unlink(missing_ok=True)
+    # created in WAL mode before auto_vacuum was set: SQLite ignored the setting from then on
+    conn = sqlite3.connect(_path())
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE words (id INTEGER PRIMARY KEY, word VARCHAR NOT NULL UNIQUE)")
+    conn.execute("INSERT INTO words (word) VALUES ('cat')")
+    conn.commit()
+    conn.close()
+
+    await database.init_db()
+
+    assert await _pragma("auto_vacuum") == 2
+    assert await _pragma("user_version") == len(database.MIGRATIONS)
+    async with database.engine.connect() as conn:
+        assert (await conn.execute(text("SELECT word, enriched FROM words"))).all() == [("cat", False)]
+    await database.engine.dispose()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+import pytest
+from sqlalchemy import select
+
+from app.core import lexicon
+from app.core.config import settings
+from app.models.database import Word
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n私はテレビを見る。\n"
+
+
+@pytest.fixture
+def definitions(monkeypatch):
+    """Point the Japanese definitions table at a path of the test, not built yet."""
+    path = settings.CACHE_DIR / "definitions_jp_test.bin"
+    path.unlink(missing_ok=True)
+    monkeypatch.setattr(lexicon, "_definitions_path", lambda directory, language: path)
+    monkeypatch.setattr(lexicon, "_definitions", {})
+    monkeypatch.setattr(settings, "ENRICH_DEFINITIONS", True)
+    return path
+
+
+async def _words(db) -> dict:
+    result = await db.execute(select(Word.word, Word.definition_en, Word.enriched))
+    return {word: (definition, enriched) for word, definition, enriched in result.tuples().all()}
+
+
+def test_definition_key_drops_the_unidic_suffix_of_japanese_lemmas():
+    assert lexicon.definition_key("jp", "テレビ-television") == "テレビ"
+    assert lexicon.definition_key("jp", "私-代名詞") == "私"
+    assert lexicon.definition_key("jp", "見る") == "見る"
+    assert lexicon.definition_key("en", "well-being") == "well-being"
+
+
+async def test_japanese_words_get_their_jmdict_definitions(db, upload, definitions):
+    lexicon.Lexicon.write(definitions, {"テレビ": "television, TV", "私": "I, me"})
+    session_id = await upload(SRT)
+
+    await SessionService(db).process_file(session_id, None)
+
+    words = await _words(db)
+    assert words["テレビ-television"] == ("television, TV", True)
+    assert words["私-代名詞"] == ("I, me", True)
+    # looked up and not found: not looked up again
+    assert words["見る"] == (None, True)
+
+
+async def test_words_stay_pending_until_the_table_is_built(db, upload, definitions):
+    session_id = await upload(SRT)
+    await SessionService(db).process_file(session_id, None)
+    assert {enriched for _, enriched in (await _words(db)).values()} == {False}
+
+    lexicon.Lexicon.write(definitions, {"テレビ": "television, TV"})
+    await SessionService(db).process_file(session_id, None)
+
+    assert (await _words(db))["テレビ-television"] == ("television, TV", True)
+
+
+async def test_migration_retries_the_japanese_words_looked_up_before(db):
+    from app.models import database
+
+    db.add_all(
+        [
+            Word(word="テレビ-television", enriched=True),
+            Word(word="見る", enriched=True),
+            Word(word="私-代名詞", definition_en="I, me", enriched=True),
+        ]
+    )
+    await db.commit()
+
+    async with database.engine.connect() as conn:
+        await conn.run_sync(database._retry_unfound_definitions)
+        await conn.commit()
+
+    words = await _words(db)
+    assert words["テレビ-television"] == (None, False)
+    assert words["見る"] == (None, True)
+    assert words["私-代名詞"] == ("I, me", True)
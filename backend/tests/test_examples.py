@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+EPISODE_1 = (
+    "1\n00:00:01,000 --> 00:00:02,000\n猫が走っていた。\n\n"
+    "2\n00:00:03,000 --> 00:00:04,500\n犬も走る。\n\n"
+    "3\n00:00:05,000 --> 00:00:06,000\n猫は寝る。\n"
+)
+EPISODE_2 = "1\n00:00:01,000 --> 00:00:02,000\n猫がいる。\n"
+
+
+async def test_examples_are_the_cues_the_word_occurs_in(db, upload):
+    session_id = await upload(EPISODE_1)
+    service = SessionService(db)
+    await service.process_file(session_id, None)
+
+    result = await service.get_examples(session_id, "猫", 5)
+
+    assert result["total"] == 2
+    assert result["examples"] == [
+        {"file": 0, "start": 1000, "end": 2000, "text": "猫が走っていた。"},
+        {"file": 0, "start": 5000, "end": 6000, "text": "猫は寝る。"},
+    ]
+    result = await service.get_examples(session_id, "猫", 1)
+    assert (result["total"], len(result["examples"])) == (2, 1)
+
+
+async def test_examples_of_a_batch_name_their_file(db):
+    files = [
+        UploadFile(io.BytesIO(text.encode("utf-8")), filename=name)
+        for name, text in (("e1.srt", EPISODE_1), ("e2.srt", EPISODE_2))
+    ]
+    service = SessionService(db)
+    session_id = (await service.upload_batch(files))["id"]
+    await service.process_file(session_id, None)
+
+    result = await service.get_examples(session_id, "猫", 5)
+
+    assert [(example["file"], example["text"]) for example in result["examples"]] == [
+        (0, "猫が走っていた。"),
+        (0, "猫は寝る。"),
+        (1, "猫がいる。"),
+    ]
+
+
+async def test_examples_of_a_word_not_in_the_session(db, upload):
+    session_id = await upload(EPISODE_1)
+    service = SessionService(db)
+    await service.process_file(session_id, None)
+
+    with pytest.raises(HTTPException) as error:
+        await service.get_examples(session_id, "象", 5)
+
+    assert error.value.status_code == 404
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.models.database import UserWord, Word
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+SRT = (
+    "1\n00:00:01,000 --> 00:00:02,000\n猫と犬と鳥。\n\n"
+    "2\n00:00:03,000 --> 00:00:04,000\n猫と犬。\n\n"
+    "3\n00:00:05,000 --> 00:00:06,000\n猫。\n"
+)
+
+
+async def _learned(db) -> set:
+    result = await db.execute(
+        select(Word.word).join(UserWord, UserWord.word_id == Word.id).where(UserWord.status == "learned")
+    )
+    return set(result.scalars().all())
+
+
+async def test_finalize_learns_the_removed_words(db, upload):
+    service = SessionService(db)
+    session_id = await upload(SRT)
+    await service.process_file(session_id, None)
+    await service.update_words(session_id, ["猫", "鳥"])
+
+    result = await service.finalize(session_id)
+
+    assert result == {"top_words": ["犬"], "learned_count": 2, "total_count": 3}
+    assert await _learned(db) == {"猫", "鳥"}
+    session = await service.get_session(session_id)
+    assert session.status == "finalized"
+
+    # a second time adds nothing
+    assert await service.finalize(session_id) == result
+    result = await db.execute(select(UserWord.id))
+    assert len(result.scalars().all()) == 2
+
+
+@pytest.mark.parametrize("known_words_filter", ["sql", "memory"])
+async def test_learned_words_are_left_out_of_the_next_sessions(db, upload, monkeypatch, known_words_filter):
+    monkeypatch.setattr(settings, "KNOWN_WORDS_FILTER", known_words_filter)
+    service = SessionService(db)
+    first = await upload(SRT)
+    await service.process_file(first, None)
+    await service.update_words(first, ["犬"])
+    await service.finalize(first)
+
+    second = await upload(SRT, "copy.srt")
+    await service.process_file(second, None)
+
+    page = await service.get_words(second)
+    assert {word: frequency for word, frequency, _ in page["words"]} == {"猫": 3, "鳥": 1}
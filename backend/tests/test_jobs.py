@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from app.api import routes
+from app.core.config import settings
+from app.models import database
+from app.services import session_service
+from app.services.jobs import ProcessJob, process_jobs
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n猫が走っていた。\n"
+
+
+async def _wait(job: ProcessJob):
+    while not job.done:
+        await job.wait_changed(1)
+
+
+async def _status(db, session_id: str) -> str:
+    result = await db.execute(select(database.Session.status).where(database.Session.id == session_id))
+    return result.scalar_one()
+
+
+async def test_identical_requests_share_one_job(db, upload):
+    session_id = await upload(SRT)
+
+    async def start():
+        async with database.AsyncSessionLocal() as request_db:
+            return await SessionService(request_db).start_processing(session_id, None)
+
+    # both read no active job; the one that loses the claim gets the job of the other
+    first, second = await asyncio.gather(start(), start())
+    await _wait(first)
+
+    assert first is second
+    assert first.status == "done"
+    assert await _status(db, session_id) == "processed"
+
+
+async def test_a_request_with_other_styles_conflicts(db, upload):
+    session_id = await upload(SRT)
+    job = await SessionService(db).start_processing(session_id, None)
+
+    with pytest.raises(HTTPException) as error:
+        await SessionService(db).start_processing(session_id, ["Default"])
+    await _wait(job)
+
+    assert error.value.status_code == 409
+
+
+async def test_only_sessions_without_a_recent_heartbeat_fail(db, upload, monkeypatch):
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.JOB_STALE_SECONDS + 1)
+    heartbeats = {"no_heartbeat": None, "stale": stale, "alive": now, "own": stale}
+    session_ids = {name: await upload(SRT) for name in [*heartbeats, "processed"]}
+    for name, heartbeat_at in heartbeats.items():
+        await db.execute(
+            update(database.Session)
+            .where(database.Session.id == session_ids[name])
+            .values(status="processing", heartbeat_at=heartbeat_at)
+        )
+    await db.commit()
+
+    monkeypatch.setattr(process_jobs, "active_session_ids", lambda: [session_ids["own"]])
+    failed = await session_service.fail_interrupted_sessions()
+
+    assert failed == 2
+    db.expire_all()
+    statuses = {name: await _status(db, session_id) for name, session_id in session_ids.items()}
+    assert statuses == {
+        "no_heartbeat": "failed",
+        "stale": "failed",
+        "alive": "processing",
+        "own": "processing",
+        "processed": "uploaded",
+    }
+
+
+class _Request:
+    async def is_disconnected(self):
+        return False
+
+
+async def test_job_events_end_with_the_final_state(monkeypatch):
+    job = ProcessJob("session", None)
+    monkeypatch.setitem(process_jobs._jobs, job.id, job)
+    job.start()
+
+    response = await routes.stream_job_events(job.id, _Request())
+    events = response.body_iterator
+    first = await anext(events)
+    # finishes while the first event is being sent
+    job.finish()
+    last = await asyncio.wait_for(anext(events), 1)
+
+    assert json.loads(first.removeprefix("data: "))["status"] == "running"
+    assert json.loads(last.removeprefix("data: "))["status"] == "done"
+    with pytest.raises(StopAsyncIteration):
+        await anext(events)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import pytest
+from sqlalchemy import insert
+
+from app.models.database import UserWord, Word
+from app.services.known_words import KnownWordIndex
+
+pytestmark = pytest.mark.anyio
+
+USER = "user"
+
+
+async def _learn(db, *words: str):
+    """Insert learned words the way another worker process would: without telling the index."""
+    for word in words:
+        result = await db.execute(insert(Word).values(word=word).returning(Word.id))
+        await db.execute(insert(UserWord).values(user_id=USER, word_id=result.scalar_one(), status="learned"))
+    await db.commit()
+
+
+async def test_words_written_elsewhere_are_loaded(db):
+    index = KnownWordIndex()
+    await _learn(db, "猫")
+    assert await index.get(db, USER) == {"猫"}
+    assert await index.get(db, "other") == set()
+
+    await _learn(db, "犬")
+
+    assert await index.get(db, USER) == {"猫", "犬"}
+
+
+async def test_own_inserts_are_added_without_a_reload(db):
+    index = KnownWordIndex()
+    await _learn(db, "猫")
+    words = await index.get(db, USER)
+
+    before = await index.version(db, USER)
+    await _learn(db, "犬")
+    index.add(USER, ["犬"], before, await index.version(db, USER))
+
+    assert index._words[USER] is words
+    assert await index.get(db, USER) == {"猫", "犬"}
+    assert index._words[USER] is words
+
+
+async def test_inserts_of_others_in_between_drop_the_entry(db):
+    index = KnownWordIndex()
+    await _learn(db, "猫")
+    await index.get(db, USER)
+
+    # another process learns a word; this one inserts after it, so its before is newer than the index
+    await _learn(db, "鳥")
+    before = await index.version(db, USER)
+    await _learn(db, "犬")
+    index.add(USER, ["犬"], before, await index.version(db, USER))
+
+    assert USER not in index._words
+    assert await index.get(db, USER) == {"猫", "鳥", "犬"}
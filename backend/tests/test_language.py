@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from app.core import lang
+
+pytestmark = pytest.mark.anyio
+
+HEADER = "[Script Info]\nScriptType: v4.00+\nPlayResX: 1920\nPlayResY: 1080\n\n[V4+ Styles]\n" * 20
+
+
+@pytest.mark.parametrize(
+    "content, language",
+    [
+        ("Hello there, General Kenobi.\n" * 50, "en"),
+        ("猫が走っていた。\n" * 50, "jp"),
+        ("我们走吧。\n" * 50, "zh"),
+        ("안녕하세요.\n" * 50, "ko"),
+        ("Привет, как дела?\n" * 50, "ru"),
+        ("1\n00:00:01,000 --> 00:00:02,000\n♪ ♪\n" * 50, "en"),
+        ("", "en"),
+    ],
+)
+def test_check_language(content, language):
+    assert lang.check_language(content) == language
+
+
+def test_a_latin_header_doesnt_decide():
+    assert lang.check_language(HEADER + "Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,猫が走っていた。\n" * 30) == "jp"
+
+
+def test_script_table():
+    assert "aÉ猫ガーー한д".translate(lang.SCRIPT_TABLE) == "".join(
+        [lang.LATIN, lang.LATIN, lang.HAN, lang.KANA, lang.KANA, lang.KANA, lang.HANGUL, lang.CYRILLIC]
+    )
+    # characters beyond the table are left as they are
+    assert "1 。😀".translate(lang.SCRIPT_TABLE) == lang.OTHER * 3 + "😀"
+
+
+def test_japanese_keeps_content_words():
+    pytest.importorskip("fugashi")
+    japanese = lang.init_language("jp")
+
+    [tokens] = japanese.get_tokens(["私は三匹の猫を見た。ABCテレビ!"])
+
+    # particles, numerals, punctuation and romaji are left out; words are lemmatized
+    assert "は" not in tokens and "三" not in tokens and "ABC" not in tokens and "。" not in tokens
+    assert "猫" in tokens
+    assert "見る" in tokens
+
+
+async def test_an_unsupported_language_is_rejected(client):
+    response = await client.post("/api/upload", files={"file": ("episode.srt", "Привет, как дела?\n".encode() * 20)})
+
+    assert response.status_code == 400
+    assert "Unsupported language (ru)" in response.json()["detail"]
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from app.core import lang
+from app.core.cache import LRUCache
+from app.core.config import settings
+
+
+def test_lru_cache_evicts_the_least_recently_used_entry():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_cache_survives_a_restart_in_its_file(tmp_path):
+    path = tmp_path / "memo.pickle"
+    cache = LRUCache(3, path)
+    for key in ("a", "b", "c", "d"):
+        cache.put((key, None), (key.upper(), True))
+    cache.save()
+
+    restarted = LRUCache(2, path)
+    restarted.load()
+
+    # the most recently used entries, as many as fit
+    assert len(restarted) == 2
+    assert restarted.get(("d", None)) == ("D", True)
+    assert restarted.get(("b", None)) is None
+
+
+def test_lemma_memo_file_changes_with_the_analyzer(monkeypatch):
+    english = pytest.importorskip("app.core.languages.english", exc_type=ImportError)
+    monkeypatch.setattr(settings, "LEMMA_CACHE_PERSIST", True)
+
+    path = english._lemma_cache_path()
+    monkeypatch.setattr(lang, "ANALYZER_VERSION", lang.ANALYZER_VERSION + 1)
+    assert english._lemma_cache_path() != path
+    monkeypatch.setattr(settings, "ENGLISH_ANALYZER", "fast")
+    assert english._lemma_cache_path() not in (path, None)
+
+    monkeypatch.setattr(settings, "LEMMA_CACHE_PERSIST", False)
+    assert english._lemma_cache_path() is None
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import io
+
+import pytest
+
+from app.core import lexicon
+from app.core.lexicon import Lexicon
+
+
+def test_write_get_round_trip(tmp_path):
+    table = {"ran": "run", "geese": "goose", "走った": "走る", "b": "", "a b": "c d"}
+    path = tmp_path / "lexicon.bin"
+    Lexicon.write(path, table)
+
+    lexicon = Lexicon(path)
+    assert len(lexicon) == len(table)
+    for key, value in table.items():
+        assert lexicon.get(key) == value
+
+
+def test_missing_keys(tmp_path):
+    path = tmp_path / "lexicon.bin"
+    Lexicon.write(path, {"b": "1", "d": "2"})
+
+    lexicon = Lexicon(path)
+    # before the first key, between two keys, after the last one, and a prefix of one
+    for key in ("a", "c", "e", "", "dd"):
+        assert lexicon.get(key) is None
+
+
+def test_empty_table(tmp_path):
+    path = tmp_path / "lexicon.bin"
+    Lexicon.write(path, {})
+
+    lexicon = Lexicon(path)
+    assert len(lexicon) == 0
+    assert lexicon.get("run") is None
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a lexicon at all")
+
+    with pytest.raises(ValueError):
+        Lexicon(path)
+
+
+class _WordNet:
+    """The parts of the NLTK WordNet reader the builder uses, over a handful of lemmas."""
+
+    LEMMAS = {
+        "n": {"cat", "goose", "saw", "box", "man"},
+        "v": {"run", "see", "saw", "leave"},
+        "a": {"tall", "left"},
+        "r": set(),
+    }
+    EXCEPTIONS = {"n": "geese goose\n", "v": "ran run\nsaw see\nleft leave\n", "a": "", "r": ""}
+    COUNTS = {("see", "v"): 10, ("saw", "v"): 1, ("saw", "n"): 2, ("leave", "v"): 3, ("left", "a"): 5}
+
+    def all_lemma_names(self, pos):
+        return iter(self.LEMMAS[pos])
+
+    def open(self, filename):
+        pos = next(pos for pos, name in lexicon.EXCEPTION_FILES.items() if name == filename)
+        return io.StringIO(self.EXCEPTIONS[pos])
+
+    def lemmas(self, lemma, pos):
+        count = self.COUNTS.get((lemma, pos), 0)
+        return [type("Lemma", (), {"count": lambda self: count})()] if lemma in self.LEMMAS[pos] else []
+
+
+def test_english_lemmas_from_the_morphy_rules():
+    lemmas = lexicon.build_english_lemmas(_WordNet())
+
+    assert lemmas["cats"] == "cat"
+    assert lemmas["boxes"] == "box"
+    assert lemmas["men"] == "man"
+    assert lemmas["geese"] == "goose"
+    assert lemmas["ran"] == "run"
+    assert lemmas["runs"] == "run"
+    assert lemmas["taller"] == "tall"
+    # several lemmas: the one used most often wins, the form itself on a tie
+    assert lemmas["saw"] == "see"
+    assert "left" not in lemmas
+    # forms that are their own lemma aren't stored
+    assert "cat" not in lemmas
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from app.core import metrics
+
+pytestmark = pytest.mark.anyio
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n猫が走っていた。\n".encode("utf-8")
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("test_seconds", "Test.", buckets=(0.1, 1.0))
+    try:
+        histogram.observe(0.05, stage="a")
+        histogram.observe(0.5, stage="a")
+        histogram.observe(5, stage="a")
+
+        assert histogram.render() == [
+            "# HELP test_seconds Test.",
+            "# TYPE test_seconds histogram",
+            'test_seconds_bucket{stage="a",le="0.1"} 1',
+            'test_seconds_bucket{stage="a",le="1.0"} 2',
+            'test_seconds_bucket{stage="a",le="+Inf"} 3',
+            'test_seconds_sum{stage="a"} 5.55',
+            'test_seconds_count{stage="a"} 3',
+        ]
+    finally:
+        metrics._registry.remove(histogram)
+
+
+def test_label_values_are_escaped():
+    assert metrics._format_labels((("path", 'a"b\\c\nd'),)) == '{path="a\\"b\\\\c\\nd"}'
+
+
+def test_timings_are_collected_per_context():
+    with metrics.collect_timings() as timings:
+        metrics.record_stage("parse", 0.25)
+        metrics.record_stage("parse", 0.5)
+        metrics.record_stage("db", 0.125)
+    metrics.record_stage("parse", 1)
+
+    assert timings == {"parse": 0.75, "db": 0.125}
+    assert metrics.server_timing(timings, 1) == "parse;dur=750.0, db;dur=125.0, total;dur=1000.0"
+
+
+async def test_responses_report_their_stages(client):
+    response = await client.post("/api/upload", files={"file": ("episode.srt", SRT)})
+
+    entries = dict(entry.split(";dur=") for entry in response.headers["server-timing"].split(", "))
+    assert {"receive", "db", "total"} <= entries.keys()
+    assert all(float(duration) >= 0 for duration in entries.values())
+
+
+async def test_metrics_endpoint(client):
+    await client.get("/health")
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'subscout_request_seconds_count{method="GET",route="/health",status="200"}' in response.text
+    assert "# TYPE subscout_stage_seconds histogram" in response.text
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+from array import array
+
+import pytest
+
+from app.core import occurrences
+from app.core.occurrences import CUE_FIELDS, FileIndex
+
+
+def _index(styles, cue_styles, postings) -> FileIndex:
+    cues = array("I")
+    for number in range(len(cue_styles)):
+        cues.extend((number * 1000, number * 1000 + 900, number * 40, 30))
+    postings = {word: array("I", numbers) for word, numbers in postings.items()}
+    return FileIndex(cues, array("I", cue_styles), styles, postings)
+
+
+@pytest.mark.parametrize(
+    "index",
+    [
+        # an SRT file: every cue has the style None
+        _index([None], [0, 0, 0], {"run": [0, 2], "cat": [1]}),
+        _index(["Default", "Signs"], [0, 1, 0, 0], {"猫": [0, 3], "看板": [1], "走る": [0, 2, 3]}),
+        # a style no cue uses
+        _index(["Default", "Unused"], [0, 0], {"dog": [1]}),
+        _index([], [], {}),
+        _index([None], [0], {}),
+    ],
+)
+def test_encode_decode_round_trip(index):
+    decoded = occurrences.decode(occurrences.encode(index))
+
+    assert decoded.cues == index.cues
+    assert decoded.cue_styles == index.cue_styles
+    assert decoded.styles == index.styles
+    assert decoded.postings == index.postings
+    assert decoded.cue_count() == len(index.cue_styles)
+
+
+def test_decode_rejects_other_data():
+    with pytest.raises(ValueError):
+        occurrences.decode(b"")
+    with pytest.raises(ValueError):
+        occurrences.decode(b"SSWC" + bytes(12))
+
+
+def test_decode_rejects_truncated_data():
+    data = occurrences.encode(_index(["Default"], [0, 0], {"run": [0, 1], "cat": [1]}))
+
+    for size in (occurrences.HEADER.size + 4, len(data) - 4):
+        with pytest.raises(ValueError):
+            occurrences.decode(data[:size])
+
+
+def test_bytes_are_little_endian():
+    assert occurrences.to_bytes(array("I", [1, 256])) == b"\x01\x00\x00\x00\x00\x01\x00\x00"
+    assert occurrences.from_bytes(b"\x01\x00\x00\x00\x00\x01\x00\x00") == array("I", [1, 256])
+
+
+def test_read_cue():
+    index = _index([None], [0, 0, 0], {})
+    table = occurrences.to_bytes(index.cues)
+
+    assert list(occurrences.read_cue(table, 2)) == list(index.cues[2 * CUE_FIELDS : 3 * CUE_FIELDS])
+
+
+def test_cues_of_styles():
+    index = _index(["Default", "Signs"], [0, 1, 0, 1], {})
+
+    assert index.cues_of_styles(["Signs"]) == {1, 3}
+    assert index.cues_of_styles(["Default", "Signs"]) == {0, 1, 2, 3}
+    assert index.cues_of_styles(["Missing"]) == set()
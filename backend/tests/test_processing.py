@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.models import database
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+SRT = (
+    "1\n00:00:01,000 --> 00:00:02,000\n猫と犬と鳥。\n\n"
+    "2\n00:00:03,000 --> 00:00:04,000\n猫と犬。\n\n"
+    "3\n00:00:05,000 --> 00:00:06,000\n猫。\n"
+)
+
+
+async def _frequencies(db, session_id: str) -> dict:
+    page = await SessionService(db).get_words(session_id)
+    return {word: frequency for word, frequency, _ in page["words"]}
+
+
+async def _count(db, model) -> int:
+    return (await db.execute(select(func.count(model.id)))).scalar()
+
+
+@pytest.mark.parametrize("known_words_filter", ["sql", "memory"])
+async def test_words_are_stored_once_with_their_frequency(db, upload, monkeypatch, known_words_filter):
+    monkeypatch.setattr(settings, "KNOWN_WORDS_FILTER", known_words_filter)
+    service = SessionService(db)
+    first = await upload(SRT)
+    await service.process_file(first, None)
+    await service.process_file(first, None)
+    await service.process_file(await upload(SRT, "copy.srt"), None)
+
+    assert await _frequencies(db, first) == {"猫": 3, "犬": 2, "鳥": 1}
+    # processing again replaces the rows of the session; sessions share the words table
+    assert await _count(db, database.SessionWord) == 6
+    assert await _count(db, database.Word) == 3
+
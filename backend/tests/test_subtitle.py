@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+import codecs
+import uuid
+
+import pytest
+
+from app.core import subtitle
+from app.services.jobs import ProcessJob
+from app.services.session_service import SessionService
+
+SRT = (
+    "1\r\n"
+    "00:00:01,000 --> 00:00:02,500\r\n"
+    "<i>Hello</i> there,\r\n"
+    "General Kenobi.\r\n"
+    "\r\n"
+    "2\r\n"
+    "00:00:03,000 --> 00:00:04,000\r\n"
+    "猫が走っていた。\r\n"
+    "\r\n"
+    "3\r\n"
+    "00:00:05,000 --> 00:00:06,000\r\n"
+    "No blank line after this one\r\n"
+    "4\r\n"
+    "00:00:07,000 --> 00:00:08,000\r\n"
+    "Last\r\n"
+)
+
+ASS = """[Script Info]
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize
+Style: Default,Arial,20
+Style: Signs,Arial,20
+Style: Unused,Arial,20
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,{\\i1}Hello{\\i0}, there\\Nfriend
+Comment: 0,0:00:02.00,0:00:03.00,Default,,0,0,0,,not dialogue
+Dialogue: 0,0:00:03.00,0:00:04.00,Signs,,0,0,0,,看板
+  Dialogue: 0,0:00:05.00,0:00:06.00,Default,,0,0,0,,猫, 犬
+Dialogue: 0,0:00:07.00,0:00:08.00,Default,,0,0,0,,{\\p1}m 0 0 l 10 10{\\p0}
+"""
+
+
+@pytest.fixture
+def srt_path(tmp_path):
+    path = tmp_path / "episode.srt"
+    path.write_bytes(codecs.BOM_UTF8 + SRT.encode("utf-8"))
+    return path
+
+
+@pytest.fixture
+def ass_path(tmp_path):
+    path = tmp_path / "episode.ass"
+    path.write_bytes(ASS.encode("utf-8"))
+    return path
+
+
+def _read_back(path, cues) -> list[str]:
+    return subtitle.read_cue_texts(path, [(cue.offset, cue.length) for cue in cues])
+
+
+def test_srt_cues(srt_path):
+    cues = list(subtitle.iter_cues(srt_path))
+
+    assert [(cue.start, cue.end, cue.text, cue.style) for cue in cues] == [
+        (1000, 2500, "Hello there,\nGeneral Kenobi.", None),
+        (3000, 4000, "猫が走っていた。", None),
+        (5000, 6000, "No blank line after this one", None),
+        (7000, 8000, "Last", None),
+    ]
+
+
+def test_srt_offsets(srt_path):
+    cues = list(subtitle.iter_cues(srt_path))
+    data = srt_path.read_bytes()
+
+    # the span covers the text lines, markup included, and nothing else
+    assert data[cues[0].offset : cues[0].offset + cues[0].length] == b"<i>Hello</i> there,\r\nGeneral Kenobi."
+    assert data[cues[1].offset : cues[1].offset + cues[1].length] == "猫が走っていた。".encode("utf-8")
+    assert data[cues[2].offset : cues[2].offset + cues[2].length] == b"No blank line after this one"
+    assert _read_back(srt_path, cues) == [cue.text for cue in cues]
+
+
+def test_ass_cues(ass_path):
+    cues = list(subtitle.iter_cues(ass_path))
+
+    assert [(cue.start, cue.end, cue.text, cue.style) for cue in cues] == [
+        (1000, 2500, "Hello, there\nfriend", "Default"),
+        (3000, 4000, "看板", "Signs"),
+        (5000, 6000, "猫, 犬", "Default"),
+    ]
+
+
+def test_ass_offsets(ass_path):
+    cues = list(subtitle.iter_cues(ass_path))
+    data = ass_path.read_bytes()
+
+    assert data[cues[0].offset : cues[0].offset + cues[0].length] == b"{\\i1}Hello{\\i0}, there\\Nfriend"
+    assert data[cues[2].offset : cues[2].offset + cues[2].length] == "猫, 犬".encode("utf-8")
+    assert _read_back(ass_path, cues) == [cue.text for cue in cues]
+
+
+def test_ass_style_filter(ass_path):
+    assert [cue.text for cue in subtitle.iter_cues(ass_path, "Signs")] == ["看板"]
+    assert list(subtitle.iter_cues(ass_path, "Unused")) == []
+    with pytest.raises(ValueError):
+        list(subtitle.iter_cues(ass_path, "Missing"))
+
+
+
+@pytest.mark.anyio
+async def test_processing_reports_the_cues_it_counted(db, upload):
+    session_id = await upload(SRT.replace("General Kenobi.", "猫と犬。"))
+    job = ProcessJob(session_id, None)
+    service = SessionService(db)
+
+    await service.process_file(session_id, None, job)
+
+    assert job.cues == 4
+    words = (await service.get_words(session_id))["words"]
+    assert {word: frequency for word, frequency, _ in words} == {"猫": 2, "犬": 1, "走る": 1, "居る": 1}
+
+
+def test_ass_styles(ass_path):
+    assert subtitle._extract_styles_from_ass(ass_path) == ["Default", "Signs", "Unused"]
+
+
+def test_finish_analysis_styles(ass_path):
+    style_counts = {"Default": {"猫": 2, "犬": 1}, "Signs": {"看板": 1}}
+
+    assert subtitle.finish_analysis(ass_path, style_counts, None) == {"猫": 2, "犬": 1, "看板": 1}
+    assert subtitle.finish_analysis(ass_path, style_counts, None, ["Signs"]) == {"看板": 1}
+    # declared without a cue
+    assert subtitle.finish_analysis(ass_path, style_counts, None, ["Unused"]) == {}
+    # the files of a batch needn't share their styles
+    assert subtitle.finish_analysis(ass_path, style_counts, None, ["Signs", "Other"]) == {"看板": 1}
+
+
+@pytest.mark.anyio
+async def test_each_style_is_counted_once(db, upload):
+    # new content for this run: the cache directory outlives the test database
+    text = (
+        ASS.split("[Events]")[0]
+        + "[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+        + "Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,猫が犬を見る。\n"
+        + "Dialogue: 0,0:00:03.00,0:00:04.00,Signs,,0,0,0,,看板\n"
+        # enough Japanese for the header not to make the file English
+        + "Dialogue: 0,0:00:05.00,0:00:06.00,Default,,0,0,0,,猫は寝る。猫と犬と鳥と魚と虎と象と馬と牛と羊と\n"
+        + "Dialogue: 0,0:00:07.00,0:00:08.00,Default,,0,0,0,,兎と鹿と熊と狐と狸と猿と鶏と豚と鼠がいる。\n"
+        + f"Comment: 0,0:00:09.00,0:00:10.00,Default,,0,0,0,,{uuid.uuid4().hex}\n"
+    )
+    session_id = await upload(text, "episode.ass")
+    service = SessionService(db)
+
+    first = ProcessJob(session_id, ["Signs"])
+    await service.process_file(session_id, ["Signs"], first)
+    assert [word for word, _, _ in (await service.get_words(session_id))["words"]] == ["看板"]
+
+    # the pass for Signs counted every style
+    second = ProcessJob(session_id, ["Default"])
+    await service.process_file(session_id, ["Default"], second)
+    words = (await service.get_words(session_id))["words"]
+
+    assert (first.cached, second.cached) == (False, True)
+    counts = {word: frequency for word, frequency, _ in words}
+    assert (counts["猫"], counts["犬"], counts["見る"]) == (3, 2, 1)
+    assert "看板" not in counts
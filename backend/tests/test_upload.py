@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import io
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n猫が走っていた。\n".encode("utf-8")
+
+
+async def test_upload(client):
+    response = await client.post("/api/upload", files={"file": ("episode.srt", SRT)})
+
+    assert response.status_code == 200
+    assert response.json()["language"] == "jp"
+    assert response.json()["styles"] is None
+
+
+async def test_a_file_over_the_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1000)
+    uploads = set(settings.UPLOAD_DIR.iterdir())
+
+    response = await client.post("/api/upload", files={"file": ("episode.srt", SRT * 20)})
+
+    assert response.status_code == 400
+    assert "File too large" in response.json()["detail"]
+    # nothing is left of the part received
+    assert set(settings.UPLOAD_DIR.iterdir()) == uploads
+
+
+async def test_other_file_types_are_rejected(client):
+    response = await client.post("/api/upload", files={"file": ("episode.txt", SRT)})
+
+    assert response.status_code == 400
+
+
+async def test_a_file_of_unknown_size_is_rejected_once_it_is_over_the_limit(db, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1000)
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_SIZE", 256)
+    uploads = set(settings.UPLOAD_DIR.iterdir())
+    body = io.BytesIO(SRT * 20)
+    # without a size, as from a client that streams its request body
+    file = UploadFile(body, filename="episode.srt")
+
+    with pytest.raises(HTTPException) as error:
+        await SessionService(db).upload_file(file)
+
+    assert error.value.status_code == 400
+    # stopped reading at the chunk over the limit
+    assert body.tell() <= 1000 + 256
+    assert set(settings.UPLOAD_DIR.iterdir()) == uploads
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import pytest
+
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_import_then_export(client):
+    body = "#separator:tab\n猫\tcat\n<b>犬</b>\tdog\n走っていた\n\n# a comment\n123\n猫\n"
+
+    response = await client.post("/api/vocabulary/import", params={"language": "jp"}, content=body.encode("utf-8"))
+
+    # "走っていた" counts as its lemma, as in a subtitle; a number isn't a word
+    assert response.json() == {"lines": 5, "words": 4, "added": 4}
+    response = await client.get("/api/vocabulary/export")
+    assert sorted(response.text.splitlines()) == sorted(["犬", "猫", "走る", "居る"])
+    response = await client.get("/api/vocabulary/export", params={"format": "csv"})
+    assert response.text.splitlines()[0] == "word,status"
+    assert "猫,learned" in response.text.splitlines()
+
+
+async def test_imports_in_batches(client, monkeypatch):
+    monkeypatch.setattr(settings, "VOCABULARY_IMPORT_BATCH", 2)
+    body = "猫,cat\n犬,dog\n鳥,bird\n猫,cat\n"
+
+    response = await client.post(
+        "/api/vocabulary/import", params={"language": "jp", "format": "csv"}, content=body.encode("utf-8")
+    )
+
+    assert response.json() == {"lines": 4, "words": 4, "added": 3}
+
+
+async def test_imported_words_are_known_to_processing(client, db, upload):
+    from app.services.session_service import SessionService
+
+    await client.post("/api/vocabulary/import", params={"language": "jp"}, content="猫\n".encode("utf-8"))
+    session_id = await upload("1\n00:00:01,000 --> 00:00:02,000\n猫と犬。\n")
+    await SessionService(db).process_file(session_id, None)
+
+    page = await SessionService(db).get_words(session_id)
+    assert [word for word, _, _ in page["words"]] == ["犬"]
+
+
+async def test_unsupported_language(client):
+    response = await client.post("/api/vocabulary/import", params={"language": "xx"}, content=b"word\n")
+
+    assert response.status_code == 400
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import json
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+SRT = (
+    "1\n00:00:01,000 --> 00:00:02,000\n猫と犬と鳥と魚。\n\n"
+    "2\n00:00:03,000 --> 00:00:04,000\n猫と犬と鳥。\n\n"
+    "3\n00:00:05,000 --> 00:00:06,000\n猫と犬。\n\n"
+    "4\n00:00:07,000 --> 00:00:08,000\n猫。\n"
+)
+
+
+@pytest.fixture
+async def session_id(db, upload):
+    from app.services.session_service import SessionService
+
+    session_id = await upload(SRT)
+    await SessionService(db).process_file(session_id, None)
+    return session_id
+
+
+async def _pages(client, session_id: str, **params) -> list[list[str]]:
+    pages = []
+    while True:
+        response = await client.get(f"/api/session/{session_id}/words", params=params)
+        page = json.loads(response.content)
+        assert page["total"] == 4
+        pages.append([item["word"] for item in page["words"]])
+        if page["next_cursor"] is None:
+            return pages
+        params["cursor"] = page["next_cursor"]
+
+
+async def test_pages_follow_each_other_in_order(client, session_id):
+    assert await _pages(client, session_id, limit=3) == [["猫", "犬", "鳥"], ["魚"]]
+    assert await _pages(client, session_id, limit=2, order="alphabetical") == [["犬", "猫"], ["魚", "鳥"]]
+    assert await _pages(client, session_id) == [["猫", "犬", "鳥", "魚"]]
+
+
+async def test_filters(client, session_id):
+    await client.patch(f"/api/session/{session_id}/words", json={"removed_words": ["犬"]})
+
+    response = await client.get(f"/api/session/{session_id}/words", params={"removed": True})
+    page = json.loads(response.content)
+    assert page == {"words": [{"word": "犬", "frequency": 3, "is_removed": True}], "total": 1, "next_cursor": None}
+
+    response = await client.get(f"/api/session/{session_id}/words", params={"prefix": "猫"})
+    assert [item["word"] for item in json.loads(response.content)["words"]] == ["猫"]
+
+
+async def test_unchanged_lists_are_not_sent_again(client, session_id):
+    url = f"/api/session/{session_id}/words"
+    etag = (await client.get(url)).headers["etag"]
+
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    # another page is another entity
+    assert (await client.get(url, params={"limit": 1}, headers={"If-None-Match": etag})).status_code == 200
+
+    # the client picks batch versions: a batch older than the latest can still change words
+    await client.patch(url, json={"removed_words": ["猫"], "version": 5})
+    etag = (await client.get(url)).headers["etag"]
+    await client.patch(url, json={"removed_words": ["犬"], "version": 3})
+
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert [item["is_removed"] for item in json.loads(response.content)["words"]][:2] == [True, True]
+    assert (await client.get(url, headers={"If-None-Match": response.headers["etag"]})).status_code == 304
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select
+
+from app.core.config import settings
+from app.models import database
+from app.services.session_service import SessionService
+from app.services.vocabulary import VocabularyService
+from app.services.word_stats import WordStatsService
+
+pytestmark = pytest.mark.anyio
+
+USER = settings.DEFAULT_USER
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n猫と犬。\n\n2\n00:00:03,000 --> 00:00:04,000\n猫。\n"
+
+
+async def _stats(db, word: str) -> tuple:
+    result = await WordStatsService(db).get_word(USER, word)
+    return result["total_frequency"], result["session_count"], result["learned"]
+
+
+async def _process(db, session_id: str):
+    await SessionService(db).process_file(session_id, None)
+
+
+async def test_sessions_add_up(db, upload):
+    first = await upload(SRT)
+    await _process(db, first)
+    await _process(db, await upload(SRT, "copy.srt"))
+    # processing a session again replaces what it added
+    await _process(db, first)
+
+    assert await _stats(db, "猫") == (4, 2, False)
+    assert await _stats(db, "犬") == (2, 2, False)
+    top = await WordStatsService(db).top_words(USER, 10)
+    assert [word["word"] for word in top] == ["猫", "犬"]
+    with pytest.raises(HTTPException):
+        await WordStatsService(db).get_word(USER, "象")
+
+
+async def test_learned_words_are_still_counted(db, upload):
+    service = SessionService(db)
+    first = await upload(SRT)
+    await _process(db, first)
+    await service.update_words(first, ["猫"])
+    await service.finalize(first)
+    assert await _stats(db, "猫") == (2, 1, True)
+
+    # known now, so not in the word list of the next sessions, but still met
+    await _process(db, first)
+    second = await upload(SRT, "copy.srt")
+    await _process(db, second)
+
+    assert await _stats(db, "猫") == (4, 2, True)
+    assert [word["word"] for word in await WordStatsService(db).top_words(USER, 10, learned=True)] == ["猫"]
+    assert [word["word"] for word in await WordStatsService(db).top_words(USER, 10)] == ["犬"]
+
+
+async def test_words_learned_before_they_are_met(db, upload):
+    async def lines():
+        yield "犬\n".encode("utf-8")
+
+    await VocabularyService(db).import_words(USER, "jp", lines(), "text")
+    await _process(db, await upload(SRT))
+
+    assert await _stats(db, "犬") == (1, 1, True)
+    assert await _stats(db, "猫") == (2, 1, False)
+
+
+async def test_backfill_of_the_sessions_processed_before(db):
+    created_at = datetime(2026, 1, 1)
+    await db.execute(insert(database.Word), [{"id": 1, "word": "猫"}, {"id": 2, "word": "犬"}])
+    for session_id, frequencies in (("a", {1: 3, 2: 1}), ("b", {1: 2})):
+        db.add(
+            database.Session(
+                id=session_id, language="jp", subtitle_filename="e.srt", subtitle_path="e.srt", created_at=created_at
+            )
+        )
+        await db.flush()
+        await db.execute(
+            insert(database.SessionWord),
+            [{"session_id": session_id, "word_id": word_id, "frequency": n} for word_id, n in frequencies.items()],
+        )
+    await db.execute(insert(database.UserWord).values(user_id=USER, word_id=2, status="learned"))
+    await db.execute(delete(database.UserWordStats))
+    await db.commit()
+
+    async with database.engine.connect() as conn:
+        await conn.run_sync(database._backfill_word_stats)
+        await conn.run_sync(database._backfill_session_word_counts)
+        await conn.commit()
+
+    assert await _stats(db, "猫") == (5, 2, False)
+    assert await _stats(db, "犬") == (1, 1, True)
+    # what processing the sessions again takes out
+    result = await db.execute(select(func.count(database.SessionWordCount.id)))
+    assert result.scalar() == 3
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.session_service import SessionService
+
+pytestmark = pytest.mark.anyio
+
+SRT = (
+    "1\n00:00:01,000 --> 00:00:02,000\n猫と犬と鳥と魚。\n\n"
+    "2\n00:00:03,000 --> 00:00:04,000\n猫と犬と鳥。\n\n"
+    "3\n00:00:05,000 --> 00:00:06,000\n猫と犬。\n\n"
+    "4\n00:00:07,000 --> 00:00:08,000\n猫。\n"
+)
+
+
+@pytest.fixture
+async def session_id(db, upload):
+    session_id = await upload(SRT)
+    await SessionService(db).process_file(session_id, None)
+    return session_id
+
+
+async def _removed(db, session_id: str) -> set:
+    page = await SessionService(db).get_words(session_id, removed=True)
+    return {word for word, _, _ in page["words"]}
+
+
+async def test_batches_apply_in_version_order(db, session_id):
+    service = SessionService(db)
+
+    assert await service.update_words(session_id, ["猫", "犬"], [], 2) == {"updated": 2, "version": 2}
+    # sent again, or overtaken by the batch above: changes nothing
+    assert await service.update_words(session_id, ["猫", "犬"], [], 2) == {"updated": 0, "version": 2}
+    assert await service.update_words(session_id, [], ["猫"], 1) == {"updated": 0, "version": 2}
+    assert await _removed(db, session_id) == {"猫", "犬"}
+
+    # without a version: after everything so far
+    assert await service.update_words(session_id, ["鳥"], ["犬"]) == {"updated": 2, "version": 3}
+    assert await _removed(db, session_id) == {"猫", "鳥"}
+
+
+async def test_words_not_in_the_session_are_left_out(db, session_id):
+    result = await SessionService(db).update_words(session_id, ["猫", "象"], [])
+
+    assert result["updated"] == 1
+
+
+async def test_a_word_cannot_be_removed_and_restored_at_once(db, session_id):
+    with pytest.raises(HTTPException) as error:
+        await SessionService(db).update_words(session_id, ["猫"], ["猫"])
+
+    assert error.value.status_code == 400
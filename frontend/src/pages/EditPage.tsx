@@ -69,7 +69,10 @@ export default function EditPage() {
 
     setLoading(true);
     try {
-      await updateSessionWords(sessionId, Array.from(removedWords));
+      const restoredWords = words
+        .filter((w) => w.is_removed && !removedWords.has(w.word))
+        .map((w) => w.word);
+      await updateSessionWords(sessionId, Array.from(removedWords), restoredWords);
 
       const result = await finalizeSession(sessionId);
 
@@ -2,7 +2,7 @@ import { useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { Upload, Button, Card, Typography, Select, message, Spin } from "antd";
 import { InboxOutlined } from "@ant-design/icons";
-import { uploadSubtitle, processSession } from "../services/api";
+import { uploadSubtitle, processSession, waitForJob } from "../services/api";
 import type { Session } from "../types";
 
 const { Title, Paragraph } = Typography;
@@ -13,6 +13,7 @@ export default function UploadPage() {
   const [loading, setLoading] = useState(false);
   const [session, setSession] = useState<Session | null>(null);
   const [selectedStyle, setSelectedStyle] = useState<string>("");
+  const [progress, setProgress] = useState<string>("");
 
   const handleFileUpload = async (file: File) => {
     setLoading(true);
@@ -42,12 +43,17 @@ export default function UploadPage() {
   const handleProcess = async (sessionId: string, style?: string) => {
     setLoading(true);
     try {
-      await processSession(sessionId, style);
+      const job = await processSession(sessionId, style ? [style] : undefined);
+      await waitForJob(job.job_id, (state) =>
+        setProgress(`${state.cues} lines, ${Math.round(state.tokens_per_second)} words/s`),
+      );
       // Navigate to edit page after processing
       navigate(`/session/${sessionId}/edit`);
     } catch (error: any) {
-      message.error(error.response?.data?.detail || "Processing failed");
+      message.error(error.response?.data?.detail || error.message || "Processing failed");
       setLoading(false);
+    } finally {
+      setProgress("");
     }
   };
 
@@ -67,7 +73,7 @@ export default function UploadPage() {
       </div>
 
       <Card style={{ maxWidth: 600, margin: "0 auto" }}>
-        <Spin spinning={loading}>
+        <Spin spinning={loading} tip={progress || undefined}>
           <Dragger
             name="file"
             multiple={false}
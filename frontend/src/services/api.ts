@@ -1,5 +1,13 @@
 import axios from 'axios';
-import type { Session, ProcessResponse, WordListResponse, FinalizeResponse, KnownWordsResponse } from '../types';
+import type {
+  Session,
+  ProcessResponse,
+  WordListResponse,
+  WordExamplesResponse,
+  WordStats,
+  FinalizeResponse,
+  KnownWordsResponse,
+} from '../types';
 
 const api = axios.create({
   baseURL: '/api',
@@ -21,18 +29,56 @@ export const uploadSubtitle = async (file: File): Promise<Session> => {
   return response.data;
 };
 
-export const processSession = async (sessionId: string, style?: string): Promise<ProcessResponse> => {
-  const response = await api.post<ProcessResponse>(`/session/${sessionId}/process`, { style });
+// styles of an .ass file to count together, all of them when empty
+export const processSession = async (sessionId: string, styles?: string[]): Promise<ProcessResponse> => {
+  const response = await api.post<ProcessResponse>(`/session/${sessionId}/process`, { styles });
   return response.data;
 };
 
+// Resolves with the final job state once processing is done, reporting progress on the way
+export const waitForJob = (
+  jobId: string,
+  onProgress?: (job: ProcessResponse) => void,
+): Promise<ProcessResponse> =>
+  new Promise((resolve, reject) => {
+    const source = new EventSource(`/api/jobs/${jobId}/events`);
+
+    source.onmessage = (event) => {
+      const job: ProcessResponse = JSON.parse(event.data);
+      onProgress?.(job);
+      if (job.status === 'done') {
+        source.close();
+        resolve(job);
+      } else if (job.status === 'failed') {
+        source.close();
+        reject(new Error(job.error || 'Processing failed'));
+      }
+    };
+    source.onerror = () => {
+      source.close();
+      reject(new Error('Lost connection while processing'));
+    };
+  });
+
 export const getSessionWords = async (sessionId: string): Promise<WordListResponse> => {
   const response = await api.get<WordListResponse>(`/session/${sessionId}/words`);
   return response.data;
 };
 
-export const updateSessionWords = async (sessionId: string, removedWords: string[]): Promise<void> => {
-  await api.patch(`/session/${sessionId}/words`, { removed_words: removedWords });
+export const getWordExamples = async (sessionId: string, word: string, limit = 5): Promise<WordExamplesResponse> => {
+  const response = await api.get<WordExamplesResponse>(
+    `/session/${sessionId}/words/${encodeURIComponent(word)}/examples`,
+    { params: { limit } },
+  );
+  return response.data;
+};
+
+export const updateSessionWords = async (
+  sessionId: string,
+  removedWords: string[],
+  restoredWords: string[] = [],
+): Promise<void> => {
+  await api.patch(`/session/${sessionId}/words`, { removed_words: removedWords, restored_words: restoredWords });
 };
 
 export const finalizeSession = async (sessionId: string): Promise<FinalizeResponse> => {
@@ -45,4 +91,14 @@ export const getKnownWords = async (language: string): Promise<KnownWordsRespons
   return response.data;
 };
 
+export const getTopWords = async (limit = 50, learned = false): Promise<WordStats[]> => {
+  const response = await api.get<{ words: WordStats[] }>('/stats/words', { params: { limit, learned } });
+  return response.data.words;
+};
+
+export const getWordStats = async (word: string): Promise<WordStats> => {
+  const response = await api.get<WordStats>(`/stats/words/${encodeURIComponent(word)}`);
+  return response.data;
+};
+
 export default api;
@@ -8,12 +8,20 @@ export interface Session {
   id: string;
   language: 'en' | 'jp';
   filename: string;
-  status: 'uploaded' | 'processed' | 'finalized';
+  status: 'uploaded' | 'processing' | 'processed' | 'failed' | 'finalized';
   styles?: string[];
 }
 
 export interface ProcessResponse {
-  words: WordItem[];
+  job_id: string;
+  session_id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  cues: number;
+  tokens: number;
+  tokens_per_second: number;
+  cached: boolean;
+  error?: string | null;
+  stages?: Record<string, number>; // seconds per pipeline stage
 }
 
 export interface WordListResponse {
@@ -21,6 +29,28 @@ export interface WordListResponse {
   total: number;
 }
 
+export interface WordExample {
+  file: number;
+  start: number; // milliseconds
+  end: number;
+  text: string;
+}
+
+export interface WordExamplesResponse {
+  word: string;
+  definition?: string | null;
+  total: number;
+  examples: WordExample[];
+}
+
+export interface WordStats {
+  word: string;
+  total_frequency: number;
+  session_count: number;
+  last_seen_at: string | null;
+  learned: boolean;
+}
+
 export interface FinalizeResponse {
   top_words: string[];
   learned_count: number;